@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+共享的 agent 注册表
+
+expert_main / expert_competition / final_evaluation / comprehensive_evaluation 原先各自
+扫描 players/ 与 bots/ 目录并对每个文件 exec_module，generate_bots 甚至每个补位 bot
+都重新执行一次 simple.py。注册表对每个模块只导入一次，缓存 CustomAgent 类和队伍
+文件内容；PlayerSpec 记录构造参数，直到对局真正需要时才实例化 Player（并登录）。
+
+用法:
+    from agent_registry import REGISTRY, PlayerSpec
+
+    for name, agent_class in REGISTRY.player_classes().items():
+        ...
+    spec = PlayerSpec(REGISTRY.bot_class("simple"), "simple-1", team=REGISTRY.team("uber"))
+    player = spec.create()
+"""
+
+import importlib.util
+import os
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Collection, Dict, Optional
+
+from poke_env import AccountConfiguration
+from poke_env.player.player import Player
+
+SCRIPTS_DIR = Path(__file__).parent
+
+
+class PlayerSpec:
+    """延迟构造的玩家：保存类与参数，第一次 create() 时才实例化"""
+
+    def __init__(self, agent_class: type, username: str, **kwargs: Any):
+        self.agent_class = agent_class
+        self.username = username
+        self.kwargs = kwargs
+        self._player: Optional[Player] = None
+
+    @property
+    def created(self) -> bool:
+        return self._player is not None
+
+    def create(self) -> Player:
+        if self._player is None:
+            self._player = self.agent_class(
+                account_configuration=AccountConfiguration(self.username, None),
+                **self.kwargs,
+            )
+        return self._player
+
+    def rebuild(self) -> Player:
+        """丢弃已有实例，用同样的参数重新构造（并重新登录）一个 Player"""
+        self._player = None
+        return self.create()
+
+    def __repr__(self):
+        return f"PlayerSpec({self.agent_class.__module__}.{self.agent_class.__name__}, {self.username})"
+
+
+class AgentRegistry:
+    """按路径缓存已导入的 agent 模块、CustomAgent 类和 bot 队伍"""
+
+    def __init__(self, root: Path = SCRIPTS_DIR):
+        self.players_dir = root / "players"
+        self.bots_dir = root / "bots"
+        self.teams_dir = self.bots_dir / "teams"
+        self._modules: Dict[Path, ModuleType] = {}
+        self._teams: Optional[Dict[str, str]] = None
+
+    @staticmethod
+    def module_files(folder: Path) -> Dict[str, Path]:
+        """目录下的 agent 文件：名称（去掉 .py）-> 路径，不导入；以下划线开头的辅助模块不算 agent"""
+        if not folder.exists():
+            return {}
+        return {
+            file_name[:-3]: folder / file_name
+            for file_name in os.listdir(folder)
+            if file_name.endswith(".py") and not file_name.startswith("_")
+        }
+
+    def load_module(self, path: Path) -> ModuleType:
+        """导入 agent 文件；同一路径只执行一次"""
+        path = Path(path).resolve()
+        module = self._modules.get(path)
+        if module is None:
+            # 与原有加载方式一致：以文件名作为模块名注册到 sys.modules
+            spec = importlib.util.spec_from_file_location(path.name, path)
+            if spec is None or spec.loader is None:
+                raise ImportError(f"Could not load module {path.name}. Please check the file path.")
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[path.name] = module
+            spec.loader.exec_module(module)
+            self._modules[path] = module
+        return module
+
+    def agent_class(self, path: Path) -> Optional[type]:
+        return getattr(self.load_module(path), "CustomAgent", None)
+
+    def _classes(self, folder: Path, include: Optional[Collection[str]] = None) -> Dict[str, type]:
+        classes = {}
+        for name, path in self.module_files(folder).items():
+            if include is not None and name not in include:
+                continue
+            agent_class = self.agent_class(path)
+            if agent_class is not None:
+                classes[name] = agent_class
+        return classes
+
+    def player_classes(self, include: Optional[Collection[str]] = None) -> Dict[str, type]:
+        """players/ 下的 CustomAgent 类；include 限定只导入这些名称"""
+        return self._classes(self.players_dir, include)
+
+    def bot_classes(self, include: Optional[Collection[str]] = None) -> Dict[str, type]:
+        """bots/ 下的 CustomAgent 类"""
+        return self._classes(self.bots_dir, include)
+
+    def bot_class(self, name: str) -> type:
+        agent_class = self.agent_class(self.bots_dir / f"{name}.py")
+        if agent_class is None:
+            raise ImportError(f"{name}.py does not define CustomAgent")
+        return agent_class
+
+    def bot_teams(self) -> Dict[str, str]:
+        """bots/teams/*.txt：队伍名 -> 队伍文本（只读一次）"""
+        if self._teams is None:
+            self._teams = {}
+            if self.teams_dir.exists():
+                for team_file in os.listdir(self.teams_dir):
+                    if team_file.endswith(".txt"):
+                        with open(self.teams_dir / team_file, "r", encoding="utf-8") as file:
+                            self._teams[team_file[:-4]] = file.read()
+        return self._teams
+
+    def team(self, name: str) -> str:
+        return self.bot_teams()[name]
+
+
+# 进程内共享的注册表
+REGISTRY = AgentRegistry()
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Agent 决策路径离线基准测试
+
+从 replays/rename/*.html 中保存的对战记录重建 Battle 快照，并混入用 agent 自己队伍
+合成的对局（对战记录只有单只宝可梦的队伍，既没有换人也用不到 agent 的配置），
+在不连接 Showdown 服务器的情况下分别计时：
+1. choose_move - 完整决策
+2. evaluate_all_actions - 批量动作评分
+3. calculate_damage - 伤害计算（每次调用前清空当回合缓存）
+4. evaluate_switch - 换人评估
+
+支持预热、多次重复，并用 Mann-Whitney U 检验与保存的基线比较，发现决策吞吐量回退。
+请求的基准若没有任何计时样本则报错退出。
+
+用法:
+    python benchmark_agent.py                         # 与基线比较（若存在）
+    python benchmark_agent.py --save-baseline         # 保存为新基线
+    python benchmark_agent.py --synthetic --repetitions 20   # 只用合成对局
+    python benchmark_agent.py --no-synthetic                  # 只用对战记录
+"""
+
+import argparse
+import asyncio
+import copy
+import html
+import importlib.util
+import inspect
+import json
+import logging
+import platform
+import random
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from types import ModuleType
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import stats
+
+from poke_env import AccountConfiguration
+from poke_env.battle import Battle
+from poke_env.data.normalize import to_id_str
+from poke_env.teambuilder import Teambuilder
+
+SCRIPT_DIR = Path(__file__).parent
+DEFAULT_AGENT = SCRIPT_DIR / "players" / "ajhz632.py"
+DEFAULT_REPLAYS = SCRIPT_DIR / "replays" / "rename"
+DEFAULT_BASELINE = SCRIPT_DIR / "results" / "benchmark_baseline.json"
+
+# 基线中每个基准最多保存的样本数
+MAX_BASELINE_SAMPLES = 2000
+
+LOG_DATA_PATTERN = re.compile(r'<script type="text/plain" class="battle-log-data">(.*?)</script>', re.S)
+
+def load_agent(agent_path: Path, decision_mode: Optional[str] = None):
+    """按 runner 的方式加载 agent 模块并创建不监听服务器、不写日志/决策轨迹/性能数据库的实例"""
+    module_name = agent_path.name
+    spec = importlib.util.spec_from_file_location(module_name, agent_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+
+    kwargs = {"decision_mode": decision_mode} if decision_mode else {}
+    agent = module.CustomAgent(
+        account_configuration=AccountConfiguration(f"bench-{agent_path.stem}", None),
+        battle_format="gen9ubers",
+        start_listening=False,
+        write_logs=False,
+        **kwargs
+    )
+    return module, agent
+
+def prepare_snapshot(battle: Battle) -> Optional[Battle]:
+    """补全服务器 request 才会提供的可用招式/可换人，无法决策的快照返回 None"""
+    active = battle.active_pokemon
+    opponent = battle.opponent_active_pokemon
+    if not active or active.fainted or not opponent or opponent.fainted:
+        return None
+
+    moves = [move for move in active.moves.values() if move.current_pp > 0]
+    if not moves:
+        return None
+    battle._available_moves = moves
+    battle._available_switches = [mon for mon in battle.team.values() if not mon.active and not mon.fainted]
+    return battle
+
+def load_replay_snapshots(replay_dir: Path) -> List[Battle]:
+    """逐行回放对战记录，在每个 |turn| 处保存一份 Battle 快照（以 p1 视角）"""
+    snapshots = []
+    logger = logging.getLogger("benchmark_agent")
+
+    for replay_path in sorted(replay_dir.glob("*.html")):
+        match = LOG_DATA_PATTERN.search(replay_path.read_text(encoding="utf-8"))
+        if not match:
+            continue
+        lines = html.unescape(match.group(1)).strip().splitlines()
+        if not lines:
+            continue
+
+        battle_tag = lines[0].lstrip(">").split("|")[0] if lines[0].startswith(">") else replay_path.stem
+        player = next((line.split("|")[3] for line in lines if line.startswith("|player|p1|")), "p1")
+        battle = Battle(battle_tag, player, logger, gen=9)
+        battle._player_role = "p1"
+
+        for line in lines:
+            if not line.startswith("|"):
+                continue
+            message = line.split("|")
+            if len(message) < 2 or not message[1]:
+                continue
+            try:
+                if message[1] == "poke" and message[2] == "p1":
+                    # 队伍预览中的我方宝可梦作为可换人的替补登记进队伍
+                    species = message[3].split(",")[0]
+                    battle.get_pokemon(f"p1: {species}", details=message[3])
+                else:
+                    battle.parse_message(message)
+            except (NotImplementedError, KeyError, ValueError) as e:
+                logger.debug(f"跳过无法解析的消息 {line!r}: {e}")
+                continue
+            if message[1] == "turn":
+                snapshot = prepare_snapshot(copy.deepcopy(battle))
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+
+    return snapshots
+
+def build_synthetic_snapshots(team: str) -> List[Battle]:
+    """用 agent 自己的队伍构造镜像对局：我方每只宝可梦对阵对方每只宝可梦"""
+    sets = Teambuilder.parse_showdown_team(team)
+    logger = logging.getLogger("benchmark_agent")
+    snapshots = []
+
+    for i, our_set in enumerate(sets):
+        for j, opp_set in enumerate(sets):
+            battle = Battle(f"battle-gen9ubers-synthetic-{i}-{j}", "bench", logger, gen=9)
+            battle._player_role = "p1"
+            battle.parse_message(["", "player", "p1", "bench", "", ""])
+            battle.parse_message(["", "player", "p2", "opponent", "", ""])
+            for pokemon_set in sets:
+                if pokemon_set is not our_set:
+                    battle.get_pokemon(f"p1: {pokemon_set.nickname}", details=f"{pokemon_set.nickname}, L100")
+            battle.parse_message(["", "switch", f"p1a: {our_set.nickname}", f"{our_set.nickname}, L100", "100/100"])
+            battle.parse_message(["", "switch", f"p2a: {opp_set.nickname}", f"{opp_set.nickname}, L100", "100/100"])
+
+            for move in our_set.moves:
+                battle.active_pokemon._add_move(to_id_str(move))
+            for move in opp_set.moves:
+                battle.opponent_active_pokemon._add_move(to_id_str(move))
+            battle.parse_message(["", "turn", "1"])
+
+            snapshot = prepare_snapshot(battle)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+
+    return snapshots
+
+# rollout 模式的 choose_move 返回协程，像 poke_env 一样在事件循环中等待它
+BENCH_LOOP = asyncio.new_event_loop()
+
+def bench_choose_move(agent, battle: Battle):
+    choice = agent.choose_move(battle)
+    if inspect.isawaitable(choice):
+        BENCH_LOOP.run_until_complete(choice)
+
+def bench_evaluate_all_actions(agent, battle: Battle):
+    agent.evaluate_all_actions(battle)
+
+def bench_calculate_damage(agent, battle: Battle):
+    attacker, defender = battle.active_pokemon, battle.opponent_active_pokemon
+    for move in battle.available_moves:
+        agent.calculate_damage(move, defender, attacker, battle)
+
+def bench_evaluate_switch(agent, battle: Battle):
+    for switch in battle.available_switches:
+        agent.evaluate_switch(switch, battle, battle.opponent_active_pokemon)
+
+# 名称 -> (计时函数, 快照是否适用)；适用性判断用 agent 模块自己的谓词（如 is_damaging）
+BENCHMARKS: Dict[str, Tuple[Callable, Callable[[ModuleType, Battle], bool]]] = {
+    "choose_move": (bench_choose_move, lambda module, battle: True),
+    "evaluate_all_actions": (bench_evaluate_all_actions, lambda module, battle: True),
+    "calculate_damage": (bench_calculate_damage, lambda module, battle: any(module.is_damaging(move) for move in battle.available_moves)),
+    "evaluate_switch": (bench_evaluate_switch, lambda module, battle: bool(battle.available_switches)),
+}
+
+def run_benchmark(agent, snapshots: List[Battle], fn: Callable, warmup: int, repetitions: int) -> np.ndarray:
+    """预热后重复遍历所有快照，返回每次调用的耗时（秒）
+
+    每次调用前清空该对战的伤害缓存，使每个样本都和实战中每回合第一次决策一样是冷缓存。
+    """
+    for _ in range(warmup):
+        for battle in snapshots:
+            agent.damage_cache.invalidate(battle.battle_tag)
+            fn(agent, battle)
+
+    samples = np.empty(repetitions * len(snapshots))
+    index = 0
+    for _ in range(repetitions):
+        for battle in snapshots:
+            agent.damage_cache.invalidate(battle.battle_tag)
+            start = time.perf_counter()
+            fn(agent, battle)
+            samples[index] = time.perf_counter() - start
+            index += 1
+    return samples
+
+def summarize(samples: np.ndarray) -> Dict[str, float]:
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        "n": int(samples.size),
+        "mean": float(samples.mean()),
+        "median": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "std": float(samples.std(ddof=1)) if samples.size > 1 else 0.0,
+        "ops_per_sec": float(1.0 / samples.mean()) if samples.mean() > 0 else 0.0,
+    }
+
+def compare_with_baseline(results: Dict[str, np.ndarray], baseline: Dict, alpha: float, threshold: float) -> Dict[str, Dict]:
+    """单侧 Mann-Whitney U 检验 + 中位数变化幅度，同时显著且超过阈值才算回退/提升"""
+    comparison = {}
+    for name, samples in results.items():
+        entry = baseline.get("benchmarks", {}).get(name)
+        if not entry or not entry.get("samples"):
+            continue
+        baseline_samples = np.asarray(entry["samples"])
+        ratio = float(np.median(samples) / np.median(baseline_samples))
+        p_slower = float(stats.mannwhitneyu(samples, baseline_samples, alternative="greater").pvalue)
+        p_faster = float(stats.mannwhitneyu(samples, baseline_samples, alternative="less").pvalue)
+
+        if p_slower < alpha and ratio > 1 + threshold:
+            verdict = "regression"
+        elif p_faster < alpha and ratio < 1 - threshold:
+            verdict = "improvement"
+        else:
+            verdict = "unchanged"
+        comparison[name] = {"median_ratio": ratio, "p_slower": p_slower, "p_faster": p_faster, "verdict": verdict}
+    return comparison
+
+def save_baseline(path: Path, results: Dict[str, np.ndarray], source: str, snapshot_count: int, seed: int):
+    """保存基线：汇总统计 + 至多 MAX_BASELINE_SAMPLES 个随机抽样的原始样本"""
+    rng = np.random.default_rng(seed)
+    benchmarks = {}
+    for name, samples in results.items():
+        kept = samples if samples.size <= MAX_BASELINE_SAMPLES else rng.choice(samples, MAX_BASELINE_SAMPLES, replace=False)
+        benchmarks[name] = {"summary": summarize(samples), "samples": kept.tolist()}
+
+    baseline = {
+        "created": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "source": source,
+        "snapshots": snapshot_count,
+        "benchmarks": benchmarks,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2, ensure_ascii=False)
+
+def print_results(results: Dict[str, np.ndarray], comparison: Dict[str, Dict]):
+    print(f"\n{'基准':<22}{'样本':>8}{'中位数(ms)':>12}{'p95(ms)':>10}{'p99(ms)':>10}{'ops/s':>10}{'对比基线':>24}")
+    print("-" * 96)
+    for name, samples in results.items():
+        summary = summarize(samples)
+        verdict = ""
+        if name in comparison:
+            entry = comparison[name]
+            marker = {"regression": "❌", "improvement": "✅", "unchanged": "➖"}[entry["verdict"]]
+            verdict = f"{marker} x{entry['median_ratio']:.2f} (p={min(entry['p_slower'], entry['p_faster']):.3g})"
+        print(f"{name:<22}{summary['n']:>8}{summary['median'] * 1e3:>12.3f}{summary['p95'] * 1e3:>10.3f}"
+              f"{summary['p99'] * 1e3:>10.3f}{summary['ops_per_sec']:>10.0f}{verdict:>24}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent 决策路径离线基准测试")
+    parser.add_argument("--agent", type=Path, default=DEFAULT_AGENT, help="agent 文件路径")
+    parser.add_argument("--replays", type=Path, default=DEFAULT_REPLAYS, help="对战记录 (*.html) 目录")
+    parser.add_argument("--synthetic", action="store_true", help="只用合成对局，不读对战记录")
+    parser.add_argument("--no-synthetic", action="store_true", help="只用对战记录，不混入合成对局")
+    parser.add_argument("--decision-mode", type=str, default=None, help="agent 决策模式 (greedy/search/rollout)")
+    parser.add_argument("--benchmarks", type=str, default=",".join(BENCHMARKS), help="逗号分隔的基准名称")
+    parser.add_argument("--warmup", type=int, default=2, help="预热轮数")
+    parser.add_argument("--repetitions", type=int, default=10, help="计时轮数")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="基线文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--alpha", type=float, default=0.01, help="显著性水平")
+    parser.add_argument("--threshold", type=float, default=0.05, help="中位数变化超过该比例才判定回退/提升")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子（agent 内部随机与基线抽样）")
+    parser.add_argument("--output", type=Path, default=None, help="把本次结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.benchmarks.split(",") if name.strip()]
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知基准: {unknown}，可选: {list(BENCHMARKS)}")
+    if args.synthetic and args.no_synthetic:
+        parser.error("--synthetic 与 --no-synthetic 不能同时使用")
+
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+
+    print(f"🔧 加载 agent: {args.agent}")
+    module, agent = load_agent(args.agent, args.decision_mode)
+
+    snapshots, sources = [], []
+    if not args.synthetic:
+        if args.replays.is_dir():
+            snapshots += load_replay_snapshots(args.replays)
+            sources.append(str(args.replays))
+        else:
+            print(f"⚠️  找不到对战记录目录 {args.replays}")
+    if not args.no_synthetic:
+        snapshots += build_synthetic_snapshots(module.team)
+        sources.append("synthetic")
+    source = " + ".join(sources)
+    if not snapshots:
+        print("❌ 没有可用的对局快照")
+        sys.exit(1)
+    print(f"📦 {len(snapshots)} 个对局快照（来源: {source}），预热 {args.warmup} 轮，计时 {args.repetitions} 轮")
+
+    results = {}
+    for name in names:
+        fn, applicable = BENCHMARKS[name]
+        selected = [battle for battle in snapshots if applicable(module, battle)]
+        print(f"⏱️  {name}: {len(selected)} 个快照...")
+        results[name] = run_benchmark(agent, selected, fn, args.warmup, args.repetitions)
+
+    empty = [name for name, samples in results.items() if samples.size == 0]
+    if empty:
+        print(f"❌ 以下基准没有任何计时样本（没有适用的快照或 --repetitions 为 0）: {', '.join(empty)}")
+        sys.exit(1)
+
+    comparison = {}
+    if args.save_baseline:
+        save_baseline(args.baseline, results, source, len(snapshots), args.seed)
+        print(f"💾 基线已保存: {args.baseline}")
+    elif args.baseline.exists():
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("source") != source:
+            print(f"⚠️  基线来源 ({baseline.get('source')}) 与本次 ({source}) 不同，比较结果仅供参考")
+        comparison = compare_with_baseline(results, baseline, args.alpha, args.threshold)
+
+    print_results(results, comparison)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "created": datetime.now().isoformat(),
+                "source": source,
+                "snapshots": len(snapshots),
+                "results": {name: summarize(samples) for name, samples in results.items()},
+                "comparison": comparison,
+            }, f, indent=2, ensure_ascii=False)
+
+    regressions = [name for name, entry in comparison.items() if entry["verdict"] == "regression"]
+    if regressions:
+        print(f"\n❌ 性能回退: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
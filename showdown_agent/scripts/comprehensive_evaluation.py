@@ -12,36 +12,43 @@ Pokémon Showdown 专家系统综合评测实验
 """
 
 import asyncio
+import contextlib
 import csv
-import importlib.util
 import json
 import logging
-import math
 import os
-import random
-import statistics
-import sys
 import time
 from collections import defaultdict
 from dataclasses import dataclass, asdict
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, Iterator, List, Tuple, Optional, Any
 from scipy import stats
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+# pyarrow 可选：未安装时结果以 CSV 追加写入
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pq = None
+
 # 设置中文字体
 plt.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS', 'DejaVu Sans']
 plt.rcParams['axes.unicode_minus'] = False
 
-import poke_env as pke
 from poke_env import AccountConfiguration
+from poke_env.battle import AbstractBattle
 from poke_env.player.player import Player
 from bots.random import CustomAgent as RandomPlayer
 from bots.max_damage import CustomAgent as MaxBasePowerPlayer
 from bots.simple import CustomAgent as SimpleHeuristicsPlayer
+import offline_simulator
+from agent_registry import REGISTRY
+from experiment_config import ExperimentSettings
 
 # 配置日志
 logging.basicConfig(
@@ -71,6 +78,36 @@ class BattleResult:
     battle_log: Dict[str, Any]
     timestamp: float
 
+@dataclass
+class BattleJob:
+    """调度队列中的一局对战：agent × 对手 × tier × 种子 × 重复序号"""
+    agent: Player
+    opponent: Player
+    tier: str
+    seed: int
+    repetition: int
+    attempts: int = 0
+    
+    @property
+    def agent_first(self) -> bool:
+        """先手/后手对称：偶数局由agent发起挑战"""
+        return self.repetition % 2 == 0
+    
+    @property
+    def match_id(self) -> str:
+        return f"{self.agent.username}_vs_{self.opponent.username}_{self.tier}_{self.seed}_{self.repetition}"
+    
+    def describe(self) -> Dict[str, Any]:
+        """任务的可序列化描述（写入账本）"""
+        return {
+            'match_id': self.match_id,
+            'agent': self.agent.username,
+            'opponent': self.opponent.username,
+            'tier': self.tier,
+            'seed': self.seed,
+            'repetition': self.repetition,
+        }
+
 @dataclass
 class EvaluationMetrics:
     """评测指标汇总"""
@@ -101,12 +138,23 @@ class EvaluationMetrics:
 class ExperimentConfig:
     """实验配置"""
     
-    def __init__(self):
+    def __init__(self, results_dir: Path = Path("evaluation_results")):
         # 基础配置
         self.tiers = ["gen9ubers", "gen9ou", "gen9uu", "gen9ru", "gen9nu", "gen9randombattle"]
+        self.scheduled_tiers: Optional[List[str]] = None  # build_jobs 实际安排的tier（可能不同于 tiers）
         self.seeds = list(range(1000, 1100))  # 100个种子
         self.matches_per_pair = 20  # 每对agent的对战次数
         self.max_turns = 300  # 最大回合数
+        self.backend = offline_simulator.DEFAULT_BACKEND  # 对战后端: showdown / offline
+        self.resume = False  # 从任务账本恢复：跳过已完成的对战并复用其结果
+        self.save_detailed_logs = True  # 是否为每局额外写一个 logs/battle_*.json
+        self.result_batch_size = 1000  # 结果存储每个 row group / 批次的行数
+        
+        # 调度配置
+        self.parallel_battles = 4  # 同时进行的对战数
+        self.timeout_seconds = 300  # 单局超时时间（<=0 表示不限）
+        self.retry_failed_battles = True
+        self.max_retries = 3
         
         # 对手池配置
         self.baseline_opponents = [
@@ -115,18 +163,16 @@ class ExperimentConfig:
             "SimpleHeuristicsPlayer"
         ]
         
-        # 失败原因标签
+        # 失败原因标签（由 record_battle 根据结束时的战局判定）
         self.failure_tags = [
-            "Team Preview Error",
-            "Switch Error", 
-            "Move Selection Error",
-            "Resource Drain",
-            "Hax Dominated",
+            "Turn Limit",
+            "Forfeit",
+            "Outnumbered",
             "Endgame Mishandling"
         ]
         
         # 输出目录
-        self.results_dir = Path("evaluation_results")
+        self.results_dir = Path(results_dir)
         self.logs_dir = self.results_dir / "logs"
         self.figs_dir = self.results_dir / "figures"
         self.reports_dir = self.results_dir / "reports"
@@ -134,195 +180,403 @@ class ExperimentConfig:
         # 创建目录
         for dir_path in [self.results_dir, self.logs_dir, self.figs_dir, self.reports_dir]:
             dir_path.mkdir(exist_ok=True)
+    
+    @property
+    def evaluated_tiers(self) -> List[str]:
+        """计算跨tier指标所用的tier：已安排任务时为实际进行的tier，否则为配置的tier"""
+        return self.scheduled_tiers if self.scheduled_tiers is not None else self.tiers
+    
+    @classmethod
+    def from_settings(cls, settings: ExperimentSettings,
+                      backend: str = offline_simulator.DEFAULT_BACKEND) -> "ExperimentConfig":
+        """由 experiment_config.ExperimentSettings 构造，包括并发、超时与重试设置"""
+        config = cls(results_dir=Path(settings.results_dir))
+        config.matches_per_pair = settings.matches_per_pair
+        config.tiers = settings.enabled_tiers
+        config.seeds = list(range(1000, 1000 + settings.seeds_count))
+        config.max_turns = settings.max_turns
+        config.backend = backend
+        config.save_detailed_logs = settings.save_detailed_logs
+        config.parallel_battles = settings.parallel_battles
+        config.timeout_seconds = settings.timeout_seconds
+        config.retry_failed_battles = settings.retry_failed_battles
+        config.max_retries = settings.max_retries
+        return config
+
+class JobLedger:
+    """持久化任务账本 (JSONL)
+
+    每行一条事件：planned（计划的任务）、done（完成及其 BattleResult）、failed（重试后仍失败）。
+    每条记录写入后立即 flush + fsync，进程崩溃最多丢失正在进行的对局；
+    恢复时跳过已 done 的任务并复用其结果，末尾写了一半的行会被忽略。
+    """
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = None
+    
+    def open(self, resume: bool = False):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+        # 崩溃时写了一半的末行单独成行，避免与新记录拼在一起
+        if resume and self._file.tell() > 0:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._append_newline()
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def _append_newline(self):
+        self._file.write("\n")
+        self._file.flush()
+    
+    def _append(self, record: Dict[str, Any]):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+    
+    def load(self) -> Tuple[set, Dict[str, BattleResult]]:
+        """读取已有账本，返回 (已计划的match_id, match_id -> 已完成的BattleResult)"""
+        planned, done = set(), {}
+        if not self.path.exists():
+            return planned, done
+        
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                match_id = record['job']['match_id']
+                if record['event'] == 'planned':
+                    planned.add(match_id)
+                elif record['event'] == 'done':
+                    done[match_id] = BattleResult(**record['result'])
+        return planned, done
+    
+    def record_planned(self, job: BattleJob):
+        self._append({'event': 'planned', 'job': job.describe()})
+    
+    def record_done(self, job: BattleJob, result: BattleResult):
+        self._append({'event': 'done', 'job': job.describe(), 'result': asdict(result)})
+    
+    def record_failed(self, job: BattleJob, error: str):
+        self._append({'event': 'failed', 'job': job.describe(), 'attempts': job.attempts, 'error': error})
+
+# BattleResult 的列顺序（battle_summary.csv 不含 battle_log）
+RESULT_COLUMNS = [
+    'match_id', 'agent_name', 'opponent_name', 'tier', 'seed',
+    'first_player', 'winner', 'turns', 'remain_mons',
+    'remain_hp_percent', 'failure_tags', 'battle_log', 'timestamp'
+]
+SUMMARY_COLUMNS = [column for column in RESULT_COLUMNS if column != 'battle_log']
+
+RESULT_SCHEMA = pa.schema([
+    ('match_id', pa.string()),
+    ('agent_name', pa.string()),
+    ('opponent_name', pa.string()),
+    ('tier', pa.string()),
+    ('seed', pa.int64()),
+    ('first_player', pa.bool_()),
+    ('winner', pa.string()),
+    ('turns', pa.int64()),
+    ('remain_mons', pa.int64()),
+    ('remain_hp_percent', pa.float64()),
+    ('failure_tags', pa.list_(pa.string())),
+    ('battle_log', pa.string()),
+    ('timestamp', pa.float64()),
+]) if pa is not None else None
+
+class BattleResultStore:
+    """列式结果存储
+
+    结果先在内存中攒成批，每满 batch_size 行作为一个 row group 追加到 Parquet 文件；
+    未安装 pyarrow 时以同样的批次追加到 CSV。读取时逐批流式返回，不需要一次载入全部结果。
+    """
+    
+    def __init__(self, results_dir: Path, batch_size: int = 1000):
+        suffix = "parquet" if pa is not None else "csv"
+        self.path = Path(results_dir) / f"battle_results.{suffix}"
+        self.batch_size = batch_size
+        self._pending: List[BattleResult] = []
+        self._writer = None
+        self.rows = 0
+    
+    @staticmethod
+    def _to_row(result: BattleResult) -> Dict[str, Any]:
+        row = asdict(result)
+        row['battle_log'] = json.dumps(row['battle_log'], ensure_ascii=False)
+        return row
+    
+    @staticmethod
+    def _from_row(row: Dict[str, Any]) -> BattleResult:
+        row = dict(row)
+        row['battle_log'] = json.loads(row['battle_log']) if row['battle_log'] else {}
+        return BattleResult(**row)
+    
+    def append(self, result: BattleResult):
+        self._pending.append(result)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """把当前批次写成一个 row group（或一批 CSV 行）"""
+        if not self._pending:
+            return
+        rows = [self._to_row(result) for result in self._pending]
+        
+        if pa is not None:
+            if self._writer is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._writer = pq.ParquetWriter(self.path, RESULT_SCHEMA)
+            self._writer.write_table(pa.Table.from_pylist(rows, schema=RESULT_SCHEMA))
+        else:
+            new_file = self._writer is None
+            if new_file:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._writer = open(self.path, 'w', newline='', encoding='utf-8')
+            writer = csv.DictWriter(self._writer, fieldnames=RESULT_COLUMNS)
+            if new_file:
+                writer.writeheader()
+            for row in rows:
+                row['failure_tags'] = '|'.join(row['failure_tags'])
+                writer.writerow(row)
+            self._writer.flush()
+        
+        self.rows += len(rows)
+        self._pending.clear()
+    
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+    
+    def iter_results(self, agent_name: Optional[str] = None,
+                     columns: Optional[List[str]] = None) -> Iterator[BattleResult]:
+        """逐批读取已写出的结果；可按 agent 过滤。columns 只读取部分列时返回 dict"""
+        if not self.path.exists():
+            return
+        
+        if pa is not None:
+            for batch in pq.ParquetFile(self.path).iter_batches(
+                    batch_size=self.batch_size,
+                    columns=None if columns is None else sorted(set(columns) | {'agent_name'})):
+                if agent_name is not None:
+                    batch = batch.filter(pc.equal(batch.column('agent_name'), agent_name))
+                for row in batch.to_pylist():
+                    yield row if columns is not None else self._from_row(row)
+            return
+        
+        with open(self.path, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if agent_name is not None and row['agent_name'] != agent_name:
+                    continue
+                row['seed'] = int(row['seed'])
+                row['first_player'] = row['first_player'] == 'True'
+                row['turns'] = int(row['turns'])
+                row['remain_mons'] = int(row['remain_mons'])
+                row['remain_hp_percent'] = float(row['remain_hp_percent'])
+                row['failure_tags'] = row['failure_tags'].split('|') if row['failure_tags'] else []
+                row['timestamp'] = float(row['timestamp'])
+                if columns is not None:
+                    yield {column: row[column] for column in columns}
+                else:
+                    yield self._from_row(row)
+    
+    def read_frame(self, columns: List[str]) -> pd.DataFrame:
+        """只读取需要的列，载入为一个 DataFrame"""
+        if not self.path.exists():
+            return pd.DataFrame(columns=columns)
+        
+        if pa is not None:
+            return pq.read_table(self.path, columns=columns).to_pandas()
+        
+        df = pd.read_csv(self.path, usecols=columns, keep_default_na=False,
+                         dtype={'agent_name': str, 'opponent_name': str, 'winner': str})
+        if 'failure_tags' in df:
+            df['failure_tags'] = [tags.split('|') if tags else [] for tags in df['failure_tags']]
+        return df[columns]
+    
+    def export_csv(self, csv_file: Path):
+        """流式导出与原 battle_summary.csv 相同格式的CSV"""
+        csv_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(csv_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(SUMMARY_COLUMNS)
+            for row in self.iter_results(columns=SUMMARY_COLUMNS):
+                row['failure_tags'] = '|'.join(row['failure_tags'])
+                writer.writerow([row[column] for column in SUMMARY_COLUMNS])
 
 class BattleLogger:
     """对战日志记录器"""
     
     def __init__(self, config: ExperimentConfig):
         self.config = config
-        self.battle_logs = []
+        self.store = BattleResultStore(config.results_dir, config.result_batch_size)
         
     def log_battle(self, battle_result: BattleResult):
         """记录单局对战结果"""
-        self.battle_logs.append(battle_result)
+        self.store.append(battle_result)
         
-        # 保存详细日志
+        # 保存详细日志（大规模评测可关闭，结果已在列式存储中）
+        if not self.config.save_detailed_logs:
+            return
         log_file = self.config.logs_dir / f"battle_{battle_result.match_id}.json"
         log_file.parent.mkdir(parents=True, exist_ok=True)
         with open(log_file, 'w', encoding='utf-8') as f:
             json.dump(asdict(battle_result), f, indent=2, ensure_ascii=False)
     
+    def restore_battle(self, battle_result: BattleResult):
+        """加入从任务账本恢复的结果（详细日志在原运行中已写出）"""
+        self.store.append(battle_result)
+    
     def save_summary(self):
-        """保存汇总数据"""
-        summary_file = self.config.results_dir / "battle_summary.csv"
-        
-        # 确保目录存在
-        summary_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(summary_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                'match_id', 'agent_name', 'opponent_name', 'tier', 'seed',
-                'first_player', 'winner', 'turns', 'remain_mons', 
-                'remain_hp_percent', 'failure_tags', 'timestamp'
-            ])
-            
-            for result in self.battle_logs:
-                writer.writerow([
-                    result.match_id, result.agent_name, result.opponent_name,
-                    result.tier, result.seed, result.first_player, result.winner,
-                    result.turns, result.remain_mons, result.remain_hp_percent,
-                    '|'.join(result.failure_tags), result.timestamp
-                ])
+        """写完剩余批次，并导出兼容的 battle_summary.csv"""
+        self.store.close()
+        self.store.export_csv(self.config.results_dir / "battle_summary.csv")
+
+# 计算指标需要的列
+METRIC_COLUMNS = [
+    'agent_name', 'opponent_name', 'tier', 'winner', 'turns',
+    'remain_mons', 'remain_hp_percent', 'failure_tags'
+]
 
 class MetricsCalculator:
-    """指标计算器"""
+    """指标计算器
+
+    结果载入一个 DataFrame 后按 agent / tier / 对手分组一次性算出所有 agent 的指标，
+    不再为每个 agent、tier、对手分别遍历一遍结果列表。
+    """
     
     def __init__(self, config: ExperimentConfig):
         self.config = config
     
     def wilson_confidence_interval(self, successes: int, trials: int, confidence: float = 0.95) -> Tuple[float, float]:
         """计算Wilson置信区间"""
-        if trials == 0:
-            return 0.0, 0.0
-            
+        lower, upper = self.wilson_confidence_intervals(np.array([successes]), np.array([trials]), confidence)
+        return float(lower[0]), float(upper[0])
+    
+    def wilson_confidence_intervals(self, successes: np.ndarray, trials: np.ndarray,
+                                    confidence: float = 0.95) -> Tuple[np.ndarray, np.ndarray]:
+        """逐元素计算Wilson置信区间；trials 为 0 的位置返回 (0, 0)"""
         z = stats.norm.ppf(1 - (1 - confidence) / 2)
-        p = successes / trials
-        n = trials
+        n = np.where(trials > 0, trials, 1).astype(float)
+        p = successes / n
         
         # Wilson score interval
         denominator = 1 + z**2 / n
         centre_adjusted_probability = (p + z**2 / (2 * n)) / denominator
-        adjusted_standard_deviation = math.sqrt((p * (1 - p) + z**2 / (4 * n)) / n) / denominator
+        adjusted_standard_deviation = np.sqrt((p * (1 - p) + z**2 / (4 * n)) / n) / denominator
         
-        lower = centre_adjusted_probability - z * adjusted_standard_deviation
-        upper = centre_adjusted_probability + z * adjusted_standard_deviation
+        lower = np.maximum(0.0, centre_adjusted_probability - z * adjusted_standard_deviation)
+        upper = np.minimum(1.0, centre_adjusted_probability + z * adjusted_standard_deviation)
         
-        return max(0, lower), min(1, upper)
+        empty = trials == 0
+        return np.where(empty, 0.0, lower), np.where(empty, 0.0, upper)
     
-    def calculate_win_rate_metrics(self, results: List[BattleResult], agent_name: str) -> Dict[str, float]:
-        """计算胜率指标"""
-        agent_results = [r for r in results if r.agent_name == agent_name]
-        
-        if not agent_results:
-            return {
-                'win_rate': 0.0,
-                'win_rate_ci_lower': 0.0,
-                'win_rate_ci_upper': 0.0,
-                'total_matches': 0,
-                'wins': 0,
-                'losses': 0
-            }
-        
-        wins = sum(1 for r in agent_results if r.winner == agent_name)
-        total = len(agent_results)
-        losses = total - wins
-        
-        win_rate = wins / total if total > 0 else 0.0
-        ci_lower, ci_upper = self.wilson_confidence_interval(wins, total)
-        
-        return {
-            'win_rate': win_rate,
-            'win_rate_ci_lower': ci_lower,
-            'win_rate_ci_upper': ci_upper,
-            'total_matches': total,
-            'wins': wins,
-            'losses': losses
-        }
+    @staticmethod
+    def results_frame(results: List[BattleResult]) -> pd.DataFrame:
+        """把 BattleResult 列表转成指标计算用的 DataFrame"""
+        return pd.DataFrame(
+            [[getattr(r, column) for column in METRIC_COLUMNS] for r in results],
+            columns=METRIC_COLUMNS
+        )
     
-    def calculate_strategy_strength_metrics(self, results: List[BattleResult], agent_name: str) -> Dict[str, float]:
-        """计算规则强度指标"""
-        agent_wins = [r for r in results if r.agent_name == agent_name and r.winner == agent_name]
-        
-        if not agent_wins:
-            return {
-                'median_turns': 0.0,
-                'mean_turns': 0.0,
-                'median_remain_mons': 0.0,
-                'mean_remain_mons': 0.0,
-                'median_remain_hp': 0.0,
-                'mean_remain_hp': 0.0
-            }
+    def calculate_frame_metrics(self, df: pd.DataFrame) -> Dict[str, EvaluationMetrics]:
+        """按 agent 分组计算所有指标，返回 agent_name -> EvaluationMetrics"""
+        if df.empty:
+            return {}
+        df = df.assign(won=df['winner'] == df['agent_name'])
+        df['lost'] = ~df['won']
+        
+        # 胜率：每个 agent 的胜场与总场次
+        counts = df.groupby('agent_name', sort=False)['won'].agg(['sum', 'size'])
+        wins = counts['sum'].to_numpy()
+        totals = counts['size'].to_numpy()
+        ci_lower, ci_upper = self.wilson_confidence_intervals(wins, totals)
+        
+        # 规则强度：只统计胜局
+        strength = df[df['won']].groupby('agent_name')[
+            ['turns', 'remain_mons', 'remain_hp_percent']
+        ].agg(['median', 'mean'])
+        
+        # 稳定性：按 tier 的胜率（安排了但没有对局结果的 tier 计为 0），按对手的失败率
+        tier_win_rates = (df.groupby(['agent_name', 'tier'])['won'].mean()
+                          .unstack('tier')
+                          .reindex(index=counts.index, columns=self.config.evaluated_tiers)
+                          .fillna(0.0))
+        if len(self.config.evaluated_tiers) > 1:
+            tier_variance = tier_win_rates.var(axis=1, ddof=1)
+        else:
+            tier_variance = pd.Series(0.0, index=counts.index)
+        failure_rates = df.groupby(['agent_name', 'opponent_name'])['lost'].mean()
+        mean_failure_rates = failure_rates.groupby(level='agent_name').mean()
+        
+        failure_tags = df.loc[df['lost'], ['agent_name', 'failure_tags']].explode('failure_tags').dropna()
+        failure_counts = failure_tags.groupby(['agent_name', 'failure_tags']).size()
         
-        turns = [r.turns for r in agent_wins]
-        remain_mons = [r.remain_mons for r in agent_wins]
-        remain_hp = [r.remain_hp_percent for r in agent_wins]
-        
-        return {
-            'median_turns': statistics.median(turns),
-            'mean_turns': statistics.mean(turns),
-            'median_remain_mons': statistics.median(remain_mons),
-            'mean_remain_mons': statistics.mean(remain_mons),
-            'median_remain_hp': statistics.median(remain_hp),
-            'mean_remain_hp': statistics.mean(remain_hp)
-        }
-    
-    def calculate_stability_metrics(self, results: List[BattleResult], agent_name: str) -> Dict[str, Any]:
-        """计算稳定性指标"""
-        agent_results = [r for r in results if r.agent_name == agent_name]
-        
-        if not agent_results:
-            return {
-                'tier_variance': 0.0,
-                'min_tier_win_rate': 0.0,
-                'max_tier_win_rate': 0.0,
-                'failure_rate_by_opponent': {},
-                'failure_categories': {},
-                'stability_score': 0.0
-            }
-        
-        # 按tier分组计算胜率
-        tier_win_rates = {}
-        for tier in self.config.tiers:
-            tier_results = [r for r in agent_results if r.tier == tier]
-            if tier_results:
-                wins = sum(1 for r in tier_results if r.winner == agent_name)
-                tier_win_rates[tier] = wins / len(tier_results)
+        all_metrics = {}
+        for i, agent_name in enumerate(counts.index):
+            total = int(totals[i])
+            if agent_name in strength.index:
+                row = strength.loc[agent_name]
+                strategy_metrics = {
+                    'median_turns': float(row[('turns', 'median')]),
+                    'mean_turns': float(row[('turns', 'mean')]),
+                    'median_remain_mons': float(row[('remain_mons', 'median')]),
+                    'mean_remain_mons': float(row[('remain_mons', 'mean')]),
+                    'median_remain_hp': float(row[('remain_hp_percent', 'median')]),
+                    'mean_remain_hp': float(row[('remain_hp_percent', 'mean')])
+                }
             else:
-                tier_win_rates[tier] = 0.0
-        
-        # 计算跨tier方差
-        win_rates = list(tier_win_rates.values())
-        tier_variance = statistics.variance(win_rates) if len(win_rates) > 1 else 0.0
-        
-        # 按对手分组计算失败率
-        failure_rate_by_opponent = {}
-        failure_categories = defaultdict(int)
-        
-        for opponent in set(r.opponent_name for r in agent_results):
-            opp_results = [r for r in agent_results if r.opponent_name == opponent]
-            losses = [r for r in opp_results if r.winner != agent_name]
-            failure_rate = len(losses) / len(opp_results) if opp_results else 0.0
-            failure_rate_by_opponent[opponent] = failure_rate
+                strategy_metrics = dict.fromkeys([
+                    'median_turns', 'mean_turns', 'median_remain_mons',
+                    'mean_remain_mons', 'median_remain_hp', 'mean_remain_hp'
+                ], 0.0)
             
-            # 统计失败原因
-            for loss in losses:
-                for tag in loss.failure_tags:
-                    failure_categories[tag] += 1
-        
-        # 计算稳定性评分 (1 - 失败率均值 - 方差惩罚)
-        mean_failure_rate = statistics.mean(failure_rate_by_opponent.values()) if failure_rate_by_opponent else 0.0
-        stability_score = max(0, 1 - mean_failure_rate - tier_variance)
-        
-        return {
-            'tier_variance': tier_variance,
-            'min_tier_win_rate': min(win_rates),
-            'max_tier_win_rate': max(win_rates),
-            'failure_rate_by_opponent': dict(failure_rate_by_opponent),
-            'failure_categories': dict(failure_categories),
-            'stability_score': stability_score
-        }
+            variance = float(tier_variance[agent_name])
+            # 计算稳定性评分 (1 - 失败率均值 - 方差惩罚)
+            stability_score = max(0, 1 - float(mean_failure_rates[agent_name]) - variance)
+            
+            all_metrics[agent_name] = EvaluationMetrics(
+                win_rate=int(wins[i]) / total,
+                win_rate_ci_lower=float(ci_lower[i]),
+                win_rate_ci_upper=float(ci_upper[i]),
+                total_matches=total,
+                wins=int(wins[i]),
+                losses=total - int(wins[i]),
+                **strategy_metrics,
+                tier_variance=variance,
+                min_tier_win_rate=float(tier_win_rates.loc[agent_name].min()),
+                max_tier_win_rate=float(tier_win_rates.loc[agent_name].max()),
+                failure_rate_by_opponent={
+                    opponent: float(rate) for opponent, rate in failure_rates[agent_name].items()
+                },
+                failure_categories={
+                    tag: int(count) for tag, count in failure_counts[agent_name].items()
+                } if agent_name in failure_counts.index.get_level_values('agent_name') else {},
+                stability_score=stability_score
+            )
+        return all_metrics
     
     def calculate_all_metrics(self, results: List[BattleResult], agent_name: str) -> EvaluationMetrics:
-        """计算所有指标"""
-        win_rate_metrics = self.calculate_win_rate_metrics(results, agent_name)
-        strategy_metrics = self.calculate_strategy_strength_metrics(results, agent_name)
-        stability_metrics = self.calculate_stability_metrics(results, agent_name)
+        """计算单个agent的所有指标"""
+        metrics = self.calculate_frame_metrics(self.results_frame(results)).get(agent_name)
+        if metrics is not None:
+            return metrics
         
         return EvaluationMetrics(
-            **win_rate_metrics,
-            **strategy_metrics,
-            **stability_metrics
+            win_rate=0.0, win_rate_ci_lower=0.0, win_rate_ci_upper=0.0,
+            total_matches=0, wins=0, losses=0,
+            median_turns=0.0, mean_turns=0.0, median_remain_mons=0.0,
+            mean_remain_mons=0.0, median_remain_hp=0.0, mean_remain_hp=0.0,
+            tier_variance=0.0, min_tier_win_rate=0.0, max_tier_win_rate=0.0,
+            failure_rate_by_opponent={}, failure_categories={}, stability_score=0.0
         )
 
 class ExperimentRunner:
@@ -331,85 +585,61 @@ class ExperimentRunner:
     def __init__(self, config: ExperimentConfig):
         self.config = config
         self.logger = BattleLogger(config)
+        self.ledger = JobLedger(config.results_dir / "job_ledger.jsonl")
         self.metrics_calculator = MetricsCalculator(config)
-        self.results = []
         
     def create_baseline_opponents(self) -> List[Player]:
         """创建基线对手 - 完全按照expert_main.py的逻辑"""
-        bot_folders = Path(__file__).parent / "bots"
-        bot_teams_folders = bot_folders / "teams"
-        
         opponents = []
-        bot_teams = {}
-        
-        # 加载team文件
-        if bot_teams_folders.exists():
-            for team_file in bot_teams_folders.glob("*.txt"):
-                with open(team_file, "r", encoding="utf-8") as f:
-                    bot_teams[team_file.stem] = f.read()
-        
-        # 创建对手 - 完全按照expert_main.py的方式
-        for module_name in os.listdir(bot_folders):
-            if module_name.endswith(".py"):
-                module_path = bot_folders / module_name
+        bot_teams = REGISTRY.bot_teams()
+        
+        # 创建对手 - 完全按照expert_main.py的方式（模块与队伍由注册表缓存）
+        for module_name, module_path in REGISTRY.module_files(REGISTRY.bots_dir).items():
+            try:
+                agent_class = REGISTRY.agent_class(module_path)
                 
-                try:
-                    spec = importlib.util.spec_from_file_location(module_name, module_path)
-                    module = importlib.util.module_from_spec(spec)
-                    sys.modules[module_name] = module
-                    spec.loader.exec_module(module)
-                    
-                    if hasattr(module, "CustomAgent"):
-                        agent_class = getattr(module, "CustomAgent")
+                if agent_class is not None:
+                    for team_name, team in bot_teams.items():
+                        config_name = f"{module_name}-{team_name}"
+                        account_config = AccountConfiguration(config_name, None)
+                        opponent = agent_class(
+                            team=team,
+                            account_configuration=account_config,
+                            battle_format="gen9ubers",
+                            **offline_simulator.backend_player_options(self.config.backend),
+                        )
+                        opponents.append(opponent)
+                        logger.info(f"成功创建对手: {config_name}")
                         
-                        for team_name, team in bot_teams.items():
-                            config_name = f"{module_name[:-3]}-{team_name}"
-                            account_config = AccountConfiguration(config_name, None)
-                            opponent = agent_class(
-                                team=team,
-                                account_configuration=account_config,
-                                battle_format="gen9ubers",
-                            )
-                            opponents.append(opponent)
-                            logger.info(f"成功创建对手: {config_name}")
-                            
-                except Exception as e:
-                    logger.error(f"创建对手 {module_name} 失败: {e}")
+            except Exception as e:
+                logger.error(f"创建对手 {module_name} 失败: {e}")
         
         return opponents
     
     def load_custom_agents(self) -> List[Player]:
         """加载自定义agent - 完全按照expert_main.py的逻辑"""
-        players_dir = Path(__file__).parent / "players"
         agents = []
         
-        if not players_dir.exists():
-            logger.warning(f"Players directory not found: {players_dir}")
+        if not REGISTRY.players_dir.exists():
+            logger.warning(f"Players directory not found: {REGISTRY.players_dir}")
             return agents
         
-        for module_name in os.listdir(players_dir):
-            if module_name.endswith(".py"):
-                module_path = players_dir / module_name
+        for player_name, module_path in REGISTRY.module_files(REGISTRY.players_dir).items():
+            try:
+                agent_class = REGISTRY.agent_class(module_path)
                 
-                try:
-                    spec = importlib.util.spec_from_file_location(module_name, module_path)
-                    module = importlib.util.module_from_spec(spec)
-                    sys.modules[module_name] = module
-                    spec.loader.exec_module(module)
+                if agent_class is not None:
+                    account_config = AccountConfiguration(player_name, None)
+                    player = agent_class(
+                        account_configuration=account_config,
+                        battle_format="gen9ubers",
+                        **offline_simulator.backend_player_options(self.config.backend),
+                    )
+                    agents.append(player)
+                    logger.info(f"Loaded agent: {player_name}")
                     
-                    if hasattr(module, "CustomAgent"):
-                        agent_class = getattr(module, "CustomAgent")
-                        player_name = f"{module_name[:-3]}"
-                        account_config = AccountConfiguration(player_name, None)
-                        player = agent_class(
-                            account_configuration=account_config,
-                            battle_format="gen9ubers",
-                        )
-                        agents.append(player)
-                        logger.info(f"Loaded agent: {player_name}")
-                        
-                except Exception as e:
-                    logger.error(f"Failed to load agent {module_name}: {e}")
+            except Exception as e:
+                logger.error(f"Failed to load agent {player_name}: {e}")
         
         return agents
     
@@ -434,27 +664,22 @@ class ExperimentRunner:
         logger.info(f"加载了 {len(agents)} 个自定义agent")
         logger.info(f"加载了 {len(opponents)} 个基线对手")
         
-        # 按照expert_main.py的方式，为每个agent单独测试
-        for agent in agents:
-            logger.info(f"评测agent: {agent.username}")
-            
-            # 创建测试列表：当前agent + 所有对手
-            test_agents = [agent] + opponents
-            logger.info(f"开始对战，总共 {len(test_agents)} 个玩家")
-            
-            try:
-                # 使用与expert_main.py相同的参数
-                cross_evaluation_results = await pke.cross_evaluate(test_agents, n_challenges=3)
-                logger.info(f"Agent {agent.username} 对战完成！")
-                
-                # 将cross_evaluation_results转换为我们的BattleResult格式
-                self.convert_cross_evaluation_results(cross_evaluation_results, [agent], opponents)
-                
-            except Exception as e:
-                logger.error(f"Agent {agent.username} 对战失败: {e}")
-                import traceback
-                traceback.print_exc()
-                continue
+        # 所有 (agent × 对手 × tier × 种子 × 重复) 组合作为任务队列统一调度
+        jobs = self.build_jobs(agents, opponents)
+        jobs = self.open_ledger(jobs)
+        logger.info(
+            f"共 {len(jobs)} 局对战，最多 {self.config.parallel_battles} 局并行，"
+            f"单局超时 {self.config.timeout_seconds}s"
+        )
+        
+        # 每局结束时由 record_battle 写入结果，这里只统计失败的任务
+        try:
+            outcomes = await self.run_jobs(jobs)
+        finally:
+            self.ledger.close()
+        failed = sum(1 for _, winner in outcomes if winner is None)
+        if failed:
+            logger.warning(f"{failed} 局对战在重试后仍失败，不计入结果")
         
         # 保存结果
         self.logger.save_summary()
@@ -464,70 +689,165 @@ class ExperimentRunner:
         
         logger.info("评测完成！")
     
-    def convert_cross_evaluation_results(self, cross_evaluation_results, agents, opponents):
-        """将cross_evaluation_results转换为BattleResult格式 - 简化版本"""
-        match_id_counter = 0
-        
+    def build_jobs(self, agents: List[Player], opponents: List[Player]) -> List[BattleJob]:
+        """展开任务网格；只保留双方队伍所属赛制的tier"""
+        formats = {player.format for player in agents + opponents}
+        tiers = [tier for tier in self.config.tiers if tier in formats]
+        skipped = [tier for tier in self.config.tiers if tier not in formats]
+        if skipped:
+            logger.warning(f"玩家只支持 {', '.join(sorted(formats))}，跳过tier: {', '.join(skipped)}")
+        if not tiers:
+            tiers = sorted(formats)
+        self.config.scheduled_tiers = tiers
+        
+        jobs = []
         for agent in agents:
-            agent_name = agent.username
             for opponent in opponents:
-                opponent_name = opponent.username
-                
-                # 获取对战结果
-                agent_score = cross_evaluation_results.get(agent_name, {}).get(opponent_name, 0.0)
-                
-                if agent_score is not None:
-                    # 确定胜利者
-                    if agent_score > 0.5:
-                        winner = agent_name
-                        is_agent_winner = True
-                    elif agent_score < 0.5:
-                        winner = opponent_name
-                        is_agent_winner = False
-                    else:
-                        winner = "draw"
-                        is_agent_winner = False
-                    
-                    # 简化的数据生成
-                    turns = random.randint(20, 100)
-                    remain_mons = random.randint(1, 6) if is_agent_winner else random.randint(0, 3)
-                    remain_hp_percent = random.uniform(20, 100) if is_agent_winner else random.uniform(0, 50)
-                    
-                    # 简化的失败原因
-                    failure_tags = []
-                    if not is_agent_winner and winner != "draw":
-                        failure_tags.append("Move Selection Error")
-                    
-                    match_id_counter += 1
-                    match_id = f"{agent_name}_vs_{opponent_name}_{match_id_counter}"
-                    
-                    result = BattleResult(
-                        match_id=match_id,
-                        agent_name=agent_name,
-                        opponent_name=opponent_name,
-                        tier="gen9ubers",
-                        seed=1000,
-                        first_player=True,
-                        winner=winner,
-                        turns=turns,
-                        remain_mons=remain_mons,
-                        remain_hp_percent=remain_hp_percent,
-                        failure_tags=failure_tags,
-                        battle_log={},
-                        timestamp=time.time()
-                    )
-                    
-                    self.logger.log_battle(result)
-                    self.results.append(result)
-
+                for tier in tiers:
+                    if agent.format != tier or opponent.format != tier:
+                        continue
+                    for repetition in range(self.config.matches_per_pair):
+                        seed = self.config.seeds[repetition % len(self.config.seeds)]
+                        jobs.append(BattleJob(agent, opponent, tier, seed, repetition))
+        return jobs
+    
+    def open_ledger(self, jobs: List[BattleJob]) -> List[BattleJob]:
+        """打开任务账本并登记计划；恢复模式下载入已完成的结果，只返回仍需进行的任务"""
+        planned, done = self.ledger.load() if self.config.resume else (set(), {})
+        self.ledger.open(resume=self.config.resume)
+        
+        pending = []
+        for job in jobs:
+            result = done.get(job.match_id)
+            if result is not None:
+                self.logger.restore_battle(result)
+                continue
+            if job.match_id not in planned:
+                self.ledger.record_planned(job)
+            pending.append(job)
+        
+        if done:
+            logger.info(f"从任务账本恢复 {len(jobs) - len(pending)} 局已完成的对战")
+        return pending
+    
+    async def play_job(self, job: BattleJob) -> str:
+        """进行一局对战，返回胜者用户名（平局为 "draw"）"""
+        p1, p2 = (job.agent, job.opponent) if job.agent_first else (job.opponent, job.agent)
+        battle_tag = await offline_simulator.play_battle(
+            p1, p2, backend=self.config.backend, seed=job.seed, max_turns=self.config.max_turns
+        )
+        result = self.record_battle(job, job.agent.battles[battle_tag])
+        
+        # 结果已写出，释放双方保存的Battle对象，长时间评测的内存不随局数增长
+        job.agent._battles.pop(battle_tag, None)
+        job.opponent._battles.pop(battle_tag, None)
+        return result.winner
+    
+    def record_battle(self, job: BattleJob, battle: AbstractBattle) -> BattleResult:
+        """对局完成钩子：从agent视角的Battle提取真实回合数、剩余宝可梦与HP并写入结果"""
+        if battle.won:
+            winner = job.agent.username
+        elif battle.lost:
+            winner = job.opponent.username
+        else:
+            winner = "draw"
+        
+        team = list(battle.team.values())
+        remain_mons = sum(1 for mon in team if not mon.fainted)
+        total_hp = sum(mon.max_hp for mon in team)
+        remain_hp_percent = 100 * sum(mon.current_hp for mon in team) / total_hp if total_hp else 0.0
+        # 对手队伍以队伍预览为准（未登场的宝可梦不在 opponent_team 中）
+        opponent_size = max(len(battle.opponent_team), len(battle.teampreview_opponent_team))
+        opponent_remain_mons = opponent_size - sum(1 for mon in battle.opponent_team.values() if mon.fainted)
+        
+        failure_tags = []
+        if battle.turn >= self.config.max_turns:
+            # 打满回合上限（离线后端判平局）
+            failure_tags.append("Turn Limit")
+        if winner == job.opponent.username:
+            if remain_mons > 0:
+                # 己方仍有存活宝可梦却输了：投降或超时判负
+                failure_tags.append("Forfeit")
+            elif opponent_remain_mons > 1:
+                failure_tags.append("Outnumbered")
+            elif opponent_remain_mons == 1:
+                # 对手只剩最后一只仍未能拿下
+                failure_tags.append("Endgame Mishandling")
+        
+        result = BattleResult(
+            match_id=job.match_id,
+            agent_name=job.agent.username,
+            opponent_name=job.opponent.username,
+            tier=job.tier,
+            seed=job.seed,
+            first_player=job.agent_first,
+            winner=winner,
+            turns=battle.turn,
+            remain_mons=remain_mons,
+            remain_hp_percent=remain_hp_percent,
+            failure_tags=failure_tags,
+            battle_log={
+                "battle_tag": battle.battle_tag,
+                "opponent_remain_mons": opponent_remain_mons,
+                "attempts": job.attempts,
+            },
+            timestamp=time.time()
+        )
+        
+        self.logger.log_battle(result)
+        self.ledger.record_done(job, result)
+        return result
+    
+    async def run_jobs(self, jobs: List[BattleJob]) -> List[Tuple[BattleJob, Optional[str]]]:
+        """最多 parallel_battles 局并发；超时或出错的任务重试 max_retries 次，仍失败则胜者为 None"""
+        semaphore = asyncio.Semaphore(max(1, self.config.parallel_battles))
+        locks: Dict[Any, asyncio.Lock] = defaultdict(asyncio.Lock)
+        
+        def job_locks(job: BattleJob) -> List[asyncio.Lock]:
+            if self.config.backend == "offline":
+                # 离线后端只需让同一对玩家的对局依次进行
+                return [locks[(job.agent.username, job.opponent.username)]]
+            # showdown 后端：poke_env 的挑战队列按玩家共享、服务器每个用户同时只允许一个挑战、
+            # 玩家默认 max_concurrent_battles=1，所以共享任一玩家的对局都要依次进行。
+            # 按用户名顺序加锁，两个任务不会互相等待
+            return [locks[name] for name in sorted({job.agent.username, job.opponent.username})]
+        timeout = self.config.timeout_seconds if self.config.timeout_seconds > 0 else None
+        max_attempts = 1 + (self.config.max_retries if self.config.retry_failed_battles else 0)
+        
+        async def run(job: BattleJob) -> Tuple[BattleJob, Optional[str]]:
+            while True:
+                job.attempts += 1
+                try:
+                    async with contextlib.AsyncExitStack() as stack:
+                        for lock in job_locks(job):
+                            await stack.enter_async_context(lock)
+                        async with semaphore:
+                            return job, await asyncio.wait_for(self.play_job(job), timeout)
+                except Exception as e:
+                    if job.attempts >= max_attempts:
+                        logger.error(f"对战 {job.match_id} 失败（已尝试 {job.attempts} 次）: {e!r}")
+                        self.ledger.record_failed(job, repr(e))
+                        return job, None
+                    logger.warning(f"对战 {job.match_id} 第 {job.attempts} 次失败，重试: {e!r}")
+        
+        # gather 按任务顺序返回，结果与并发度无关
+        return await asyncio.gather(*(run(job) for job in jobs))
+    
     def calculate_and_save_metrics(self, agents: List[Player]):
         """计算并保存指标"""
         logger.info("计算评测指标...")
         
         all_metrics = {}
         
+        # 只从结果存储读回指标需要的列，一次分组算出所有agent的指标
+        frame_metrics = self.metrics_calculator.calculate_frame_metrics(
+            self.logger.store.read_frame(METRIC_COLUMNS)
+        )
+        
         for agent in agents:
-            metrics = self.metrics_calculator.calculate_all_metrics(self.results, agent.username)
+            metrics = frame_metrics.get(agent.username)
+            if metrics is None:
+                metrics = self.metrics_calculator.calculate_all_metrics([], agent.username)
             all_metrics[agent.username] = metrics
             
             # 保存单个agent的详细指标
@@ -709,7 +1029,7 @@ class ExperimentRunner:
         with open(report_file, 'w', encoding='utf-8') as f:
             f.write("# Pokémon专家系统综合评测报告\n\n")
             f.write(f"**评测时间**: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            f.write(f"**评测配置**: {self.config.matches_per_pair} 局/配对, {len(self.config.tiers)} 个tier\n\n")
+            f.write(f"**评测配置**: {self.config.matches_per_pair} 局/配对, {len(self.config.evaluated_tiers)} 个tier\n\n")
             
             f.write("## 1. 胜率指标 (Win Rate)\n\n")
             f.write("| Agent | 胜率 | 95%置信区间 | 总对局 | 胜利 | 失败 |\n")
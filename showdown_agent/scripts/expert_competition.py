@@ -1,18 +1,25 @@
 # node pokemon-showdown start --no-security
 
 
+import argparse
 import asyncio
 import csv
-import importlib
 import os
 import random
-import sys
 from collections import defaultdict
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
-import poke_env as pke
-from poke_env import AccountConfiguration
 from poke_env.player.player import Player
+from websockets.protocol import State
+
+import offline_simulator
+from agent_registry import REGISTRY, PlayerSpec
+
+# Default number of pairings played at the same time within a round
+DEFAULT_CONCURRENCY = 8
+
+# Reconnect attempts before a player is considered unavailable
+MAX_RECONNECTS = 3
 
 
 def convert_results_to_html(csv_file: str, html_file: str):
@@ -65,10 +72,10 @@ def convert_results_to_html(csv_file: str, html_file: str):
 
 
 class Competitor:
-    def __init__(self, id: int, username: str, agent: Player):
+    def __init__(self, id: int, username: str, spec: PlayerSpec):
         self.id = id
         self.username = username
-        self.agent = agent
+        self.spec = spec
 
         self.wins = 0
         self.losses = 0
@@ -76,6 +83,21 @@ class Competitor:
         self.history: Set[int] = set()
         self.received_bye = False
 
+    @property
+    def agent(self) -> Player:
+        # Padding bots are only instantiated (and logged in) once they play
+        return self.spec.create()
+
+    @property
+    def has_agent(self) -> bool:
+        return self.spec.created
+
+    def save_replays_to(self, path: str):
+        # Kept in the spec so a player rebuilt on reconnect saves replays too
+        self.spec.kwargs["save_replays"] = path
+        if self.has_agent:
+            self.agent._save_replays = path
+
     def is_active(self, win_cap: int, loss_cap: int) -> bool:
         return self.wins < win_cap and self.losses < loss_cap
 
@@ -88,36 +110,101 @@ class Competitor:
         self.history.clear()
 
 
-def gather_players():
-    player_folders = os.path.join(os.path.dirname(__file__), "players")
-
-    players = []
+class PlayerPool:
+    """Keeps every competitor's connection alive for the whole tournament.
+
+    poke-env players listen on their own background loop, so the connections
+    outlive any single match; the pool checks them before each match and
+    replaces a player whose websocket dropped instead of failing the round.
+    The replacement is built from the competitor's PlayerSpec through the
+    public Player constructor, so no poke-env internals are touched.
+    """
+
+    def __init__(
+        self,
+        competitors: List[Competitor],
+        backend: str = offline_simulator.DEFAULT_BACKEND,
+        max_reconnects: int = MAX_RECONNECTS,
+    ):
+        self.competitors = competitors
+        self.backend = backend
+        self.max_reconnects = max_reconnects
+        self.reconnects = 0
+
+    @property
+    def players(self) -> List[Player]:
+        return [c.agent for c in self.competitors if c.has_agent]
+
+    def is_healthy(self, player: Player) -> bool:
+        if self.backend == "offline":
+            return True
+
+        client = player.ps_client
+        websocket = getattr(client, "websocket", None)
+        return (
+            websocket is not None
+            and websocket.state is State.OPEN
+            and client.logged_in.is_set()
+        )
 
-    for module_name in os.listdir(player_folders):
-        if module_name.endswith(".py"):
-            module_path = f"{player_folders}/{module_name}"
+    async def reconnect(self, competitor: Competitor):
+        # Close whatever is left of the old connection, then log in a fresh player
+        await asyncio.gather(
+            competitor.agent.ps_client.stop_listening(), return_exceptions=True
+        )
+        player = competitor.spec.rebuild()
+        await player.ps_client.wait_for_login()
+        self.reconnects += 1
+
+    async def ensure_connected(self, competitor: Competitor):
+        if self.backend == "offline":
+            return
+
+        # A player created for this match may still be logging in
+        await competitor.agent.ps_client.wait_for_login()
+
+        for attempt in range(1, self.max_reconnects + 1):
+            if self.is_healthy(competitor.agent):
+                return
+            print(f"🔌 Reconnecting {competitor.username} (attempt {attempt})")
+            await self.reconnect(competitor)
+
+        if not self.is_healthy(competitor.agent):
+            raise RuntimeError(
+                f"{competitor.username} could not reconnect after {self.max_reconnects} attempts"
+            )
 
-            spec = importlib.util.spec_from_file_location(module_name, module_path)
-            module = importlib.util.module_from_spec(spec)
+    async def warm_up(self):
+        # Wait for every initial login together rather than on the first match
+        if self.backend != "offline":
+            await asyncio.gather(
+                *(player.ps_client.wait_for_login() for player in self.players)
+            )
 
-            sys.modules[module_name] = module
-            spec.loader.exec_module(module)
+    async def checkout(self, *competitors: Competitor):
+        for competitor in competitors:
+            await self.ensure_connected(competitor)
 
-            # Get the class
-            if hasattr(module, "CustomAgent"):
-                # Check if the class is a subclass of Player
-                agent_class = getattr(module, "CustomAgent")
+    async def close(self):
+        if self.backend != "offline":
+            await asyncio.gather(
+                *(player.ps_client.stop_listening() for player in self.players),
+                return_exceptions=True,
+            )
 
-                config_name = f"{module_name[:-3]}"
-                account_config = AccountConfiguration(config_name, None)
-                players.append(
-                    agent_class(
-                        account_configuration=account_config,
-                        battle_format="gen9ubers",
-                    )
-                )
 
-    return players
+def gather_players(
+    backend: str = offline_simulator.DEFAULT_BACKEND,
+) -> List[PlayerSpec]:
+    return [
+        PlayerSpec(
+            agent_class,
+            player_name,
+            battle_format="gen9ubers",
+            **offline_simulator.backend_player_options(backend),
+        )
+        for player_name, agent_class in REGISTRY.player_classes().items()
+    ]
 
 
 def rank_players_by_victories(results_dict, top_k=10):
@@ -140,10 +227,16 @@ def rank_players_by_victories(results_dict, top_k=10):
     return sorted_players[:top_k]
 
 
-async def run_battle(p1: Competitor, p2: Competitor) -> Tuple[Competitor, Competitor]:
+async def run_battle(
+    p1: Competitor,
+    p2: Competitor,
+    backend: str = offline_simulator.DEFAULT_BACKEND,
+) -> Tuple[Competitor, Competitor]:
     players = [p1.agent, p2.agent]
 
-    cross_evaluation_results = await pke.cross_evaluate(players, n_challenges=3)
+    cross_evaluation_results = await offline_simulator.cross_evaluate(
+        players, n_challenges=3, backend=backend
+    )
 
     top_players = rank_players_by_victories(
         cross_evaluation_results, top_k=len(cross_evaluation_results)
@@ -158,12 +251,30 @@ async def run_battle(p1: Competitor, p2: Competitor) -> Tuple[Competitor, Compet
     return winner, loser
 
 
-def run_swiss_round(
+async def run_pairings(
+    pairings: List[Tuple[Competitor, Competitor]],
+    pool: PlayerPool,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> List[Tuple[Competitor, Competitor]]:
+    # Pairings within a round are independent; results come back in pairing order
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def play(p1: Competitor, p2: Competitor) -> Tuple[Competitor, Competitor]:
+        async with semaphore:
+            await pool.checkout(p1, p2)
+            return await run_battle(p1, p2, pool.backend)
+
+    return await asyncio.gather(*(play(p1, p2) for p1, p2 in pairings))
+
+
+async def run_swiss_round(
     competitors: list[Competitor],
     results_file: str,
     summary_file: str,
+    pool: PlayerPool,
     win_cap: int = 3,
     loss_cap: int = 2,
+    concurrency: int = DEFAULT_CONCURRENCY,
 ):
     round_num = 0
 
@@ -194,6 +305,10 @@ def run_swiss_round(
             for competitor in active_players:
                 brackets[(competitor.wins, competitor.losses)].append(competitor)
 
+            # Pair every bracket first: (group, p1, p2, re-paired), p2 is None for a bye
+            schedule: List[
+                Tuple[Tuple[int, int], Competitor, Optional[Competitor], bool]
+            ] = []
             for group_key in sorted(brackets.keys()):
                 group = brackets[group_key]
                 random.shuffle(group)
@@ -204,35 +319,38 @@ def run_swiss_round(
                     for i, p2 in enumerate(unpaired):
                         if p2.id not in p1.history:
                             unpaired.pop(i)
-                            winner, loser = asyncio.run(run_battle(p1, p2))
-                            print(
-                                f"Group {group_key}: {p1.username} vs {p2.username} → Winner: {winner.username}"
-                            )
-                            file.write(
-                                f"{round_num}\t{group_key}\t{p1.username}\t{p2.username}\t{winner.username}\tno\n"
-                            )
+                            schedule.append((group_key, p1, p2, False))
                             break
                     else:
                         # No unique opponent available — just pair with next
                         p2 = unpaired.pop(0)
-                        winner, loser = asyncio.run(run_battle(p1, p2))
-                        print(
-                            f"Group {group_key} (re-pair): {p1.username} vs {p2.username} → Winner: {winner.username}"
-                        )
-                        file.write(
-                            f"{round_num}\t{group_key}\t{p1.username}\t{p2.username}\t{winner.username}\tno\n"
-                        )
+                        schedule.append((group_key, p1, p2, True))
 
                 # Bye if odd number
                 if unpaired:
-                    bye_player = unpaired.pop()
-                    bye_player.wins += 1
-                    print(
-                        f"Group {group_key}: Player {bye_player.username} receives a BYE"
-                    )
+                    schedule.append((group_key, unpaired.pop(), None, False))
+
+            # Then play all pairings of the round as one batch
+            pairings = [(p1, p2) for _, p1, p2, _ in schedule if p2 is not None]
+            outcomes = iter(await run_pairings(pairings, pool, concurrency))
+
+            for group_key, p1, p2, re_paired in schedule:
+                if p2 is None:
+                    p1.wins += 1
+                    print(f"Group {group_key}: Player {p1.username} receives a BYE")
                     file.write(
-                        f"{round_num}\t{group_key}\t{bye_player.username}\t' '\t {bye_player.username}\tyes\n"
+                        f"{round_num}\t{group_key}\t{p1.username}\t' '\t {p1.username}\tyes\n"
                     )
+                    continue
+
+                winner, loser = next(outcomes)
+                label = f"Group {group_key} (re-pair)" if re_paired else f"Group {group_key}"
+                print(
+                    f"{label}: {p1.username} vs {p2.username} → Winner: {winner.username}"
+                )
+                file.write(
+                    f"{round_num}\t{group_key}\t{p1.username}\t{p2.username}\t{winner.username}\tno\n"
+                )
 
     print("\n🏁 Final Results:")
     final_sorted = sorted(competitors, key=lambda p: (-p.wins, p.losses, p.id))
@@ -255,52 +373,26 @@ def run_swiss_round(
     return [p for p in final_sorted if p.wins >= win_cap]
 
 
-def generate_bots(num_bots: int):
-    bot_folders = os.path.join(os.path.dirname(__file__), "bots")
-    bot_teams_folders = os.path.join(bot_folders, "teams")
-
-    bots = []
-
+def generate_bots(
+    num_bots: int, backend: str = offline_simulator.DEFAULT_BACKEND
+) -> List[PlayerSpec]:
     bot_to_add = "simple"
-    team_file = "uber.txt"
-
-    with open(
-        os.path.join(bot_teams_folders, team_file), "r", encoding="utf-8"
-    ) as file:
-        bot_team = file.read()
-
-    for i in range(num_bots):
-        module_name = f"{bot_to_add}.py"
-        module_path = os.path.join(bot_folders, module_name)
-
-        spec = importlib.util.spec_from_file_location(module_name, module_path)
-        if spec is None or spec.loader is None:
-            print(f"⚠️ Could not load module {module_name}. Skipping.")
-            raise ImportError(
-                f"Could not load module {module_name}. Please check the file path."
-            )
-
-        module = importlib.util.module_from_spec(spec)
-
-        sys.modules[module_name] = module
-        spec.loader.exec_module(module)
-
-        # Get the class
-        if hasattr(module, "CustomAgent"):
-            # Check if the class is a subclass of Player
-            agent_class = getattr(module, "CustomAgent")
-
-            config_name = f"{module_name[:-3]}-{i+1}"
-            account_config = AccountConfiguration(config_name, None)
-            bots.append(
-                agent_class(
-                    team=bot_team,
-                    account_configuration=account_config,
-                    battle_format="gen9ubers",
-                )
-            )
-
-    return bots
+    team_name = "uber"
+
+    # The module and team are loaded once; each bot is built when it first plays
+    agent_class = REGISTRY.bot_class(bot_to_add)
+    bot_team = REGISTRY.team(team_name)
+
+    return [
+        PlayerSpec(
+            agent_class,
+            f"{bot_to_add}-{i+1}",
+            team=bot_team,
+            battle_format="gen9ubers",
+            **offline_simulator.backend_player_options(backend),
+        )
+        for i in range(num_bots)
+    ]
 
 
 def bots_to_add_for_clean_halving(current_players: int, target_top_n: int) -> int:
@@ -312,7 +404,12 @@ def bots_to_add_for_clean_halving(current_players: int, target_top_n: int) -> in
         multiplier += 1
 
 
-def run_swiss_phase(top_k: int, competitors: List[Competitor]):
+async def run_swiss_phase(
+    top_k: int,
+    competitors: List[Competitor],
+    pool: PlayerPool,
+    concurrency: int = DEFAULT_CONCURRENCY,
+):
 
     while len(competitors) > top_k:
         num_competitors = len(competitors)
@@ -343,8 +440,14 @@ def run_swiss_phase(top_k: int, competitors: List[Competitor]):
 
         cap = 3
 
-        competitors = run_swiss_round(
-            competitors, results_file, summary_file, win_cap=cap, loss_cap=cap
+        competitors = await run_swiss_round(
+            competitors,
+            results_file,
+            summary_file,
+            pool,
+            win_cap=cap,
+            loss_cap=cap,
+            concurrency=concurrency,
         )
 
         convert_results_to_html(
@@ -374,7 +477,11 @@ def run_swiss_phase(top_k: int, competitors: List[Competitor]):
     return competitors
 
 
-def run_knockout_phase(players_ranked: list[Competitor]):
+async def run_knockout_phase(
+    players_ranked: list[Competitor],
+    pool: PlayerPool,
+    concurrency: int = DEFAULT_CONCURRENCY,
+):
     """players_ranked: list of player IDs sorted from best (0) to worst (15)"""
     round_num = 1
     current_round = players_ranked
@@ -408,15 +515,20 @@ def run_knockout_phase(players_ranked: list[Competitor]):
             if not os.path.exists(current_dir):
                 os.makedirs(current_dir)
 
+            pairings = []
             for i in range(num_matches):
                 p1 = current_round[i]
                 p2 = current_round[-(i + 1)]
 
-                p1.agent._save_replays = (
+                p1.save_replays_to(
                     current_dir + "/" + p1.username + "--vs--" + p2.username
                 )
+                pairings.append((p1, p2))
+
+            # Every match of the round finishes before next_round is built
+            outcomes = await run_pairings(pairings, pool, concurrency)
 
-                winner, loser = asyncio.run(run_battle(p1, p2))
+            for (p1, p2), (winner, loser) in zip(pairings, outcomes):
                 print(
                     f"Match: {p1.username} vs {p2.username} → Winner: {winner.username}"
                 )
@@ -442,11 +554,17 @@ def run_knockout_phase(players_ranked: list[Competitor]):
 
 
 def run_competition(
-    players: List[Player],
+    players: List[PlayerSpec],
     top_k: int = 16,
+    backend: str = offline_simulator.DEFAULT_BACKEND,
+    concurrency: int = DEFAULT_CONCURRENCY,
 ):
     competitors = [Competitor(i + 1, p.username, p) for i, p in enumerate(players)]
 
+    # Entrants log in up front; padding bots only once they first play
+    for spec in players:
+        spec.create()
+
     if len(competitors) < top_k:
         print(f"⚠️ Not enough players found ({len(players)}) to start a tournament.")
         return
@@ -455,7 +573,7 @@ def run_competition(
 
     print(f"🤖 Adding {bots_to_add} bots to make a clean halving for {top_k} players")
 
-    bots = generate_bots(bots_to_add)
+    bots = generate_bots(bots_to_add, backend)
 
     bot_competitors = [
         Competitor(i + len(players) + 1, p.username, p) for i, p in enumerate(bots)
@@ -463,18 +581,54 @@ def run_competition(
 
     competitors += bot_competitors
 
-    top_k_competitors = run_swiss_phase(top_k, competitors)
+    # One event loop and one set of connections for the whole tournament
+    asyncio.run(run_tournament(top_k, competitors, backend, concurrency))
 
-    print("\n🏁 Knockout Rounds:")
-    winner = run_knockout_phase(top_k_competitors)
-    print(f"\n🏆 Final Winner: {winner.username} (ID: {winner.id})")
+
+async def run_tournament(
+    top_k: int,
+    competitors: List[Competitor],
+    backend: str = offline_simulator.DEFAULT_BACKEND,
+    concurrency: int = DEFAULT_CONCURRENCY,
+):
+    pool = PlayerPool(competitors, backend)
+    await pool.warm_up()
+
+    try:
+        top_k_competitors = await run_swiss_phase(
+            top_k, competitors, pool, concurrency
+        )
+
+        print("\n🏁 Knockout Rounds:")
+        winner = await run_knockout_phase(top_k_competitors, pool, concurrency)
+        print(f"\n🏆 Final Winner: {winner.username} (ID: {winner.id})")
+    finally:
+        if pool.reconnects:
+            print(f"🔌 {pool.reconnects} reconnects during the tournament")
+        await pool.close()
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Run the Swiss + knockout competition")
+    parser.add_argument(
+        "--backend",
+        choices=offline_simulator.BACKENDS,
+        default=offline_simulator.DEFAULT_BACKEND,
+        help="showdown: local Showdown server; offline: in-process simulator",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="maximum number of pairings played at the same time within a round",
+    )
+    args = parser.parse_args()
 
-    players = gather_players()
+    players = gather_players(args.backend)
 
-    run_competition(players, top_k=16)
+    run_competition(
+        players, top_k=16, backend=args.backend, concurrency=args.concurrency
+    )
 
 
 if __name__ == "__main__":
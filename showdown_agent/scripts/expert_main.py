@@ -1,17 +1,20 @@
 # node pokemon-showdown start --no-security
 
 
+import argparse
 import asyncio
-import importlib
 import os
-import sys
-from typing import List
+from functools import partial
+from typing import Collection, List, Optional
 
-import poke_env as pke
 from poke_env import AccountConfiguration
 from poke_env.player.player import Player
 from tabulate import tabulate
 
+import offline_simulator
+import sharded_evaluation
+from agent_registry import REGISTRY
+
 
 def rank_players_by_victories(results_dict, top_k=10):
     victory_scores = {}
@@ -33,103 +36,90 @@ def rank_players_by_victories(results_dict, top_k=10):
     return sorted_players[:top_k]
 
 
-def gather_players():
-    player_folders = os.path.join(os.path.dirname(__file__), "players")
-
+def gather_players(
+    backend: str = offline_simulator.DEFAULT_BACKEND,
+    name_suffix: str = "",
+    include: Optional[Collection[str]] = None,
+):
     players = []
 
     replay_dir = os.path.join(os.path.dirname(__file__), "replays")
     if not os.path.exists(replay_dir):
         os.makedirs(replay_dir)
 
-    for module_name in os.listdir(player_folders):
-        if module_name.endswith(".py"):
-            module_path = f"{player_folders}/{module_name}"
+    for player_name, agent_class in REGISTRY.player_classes(include).items():
+        agent_replay_dir = os.path.join(replay_dir, f"{player_name}")
+        if not os.path.exists(agent_replay_dir):
+            os.makedirs(agent_replay_dir)
 
-            spec = importlib.util.spec_from_file_location(module_name, module_path)
-            module = importlib.util.module_from_spec(spec)
+        account_config = AccountConfiguration(player_name + name_suffix, None)
+        player = agent_class(
+            account_configuration=account_config,
+            battle_format="gen9ubers",
+            **offline_simulator.backend_player_options(backend),
+        )
 
-            sys.modules[module_name] = module
-            spec.loader.exec_module(module)
+        player._save_replays = agent_replay_dir
 
-            # Get the class
-            if hasattr(module, "CustomAgent"):
-                # Check if the class is a subclass of Player
+        players.append(player)
 
-                player_name = f"{module_name[:-3]}"
+    return players
 
-                agent_class = getattr(module, "CustomAgent")
 
-                agent_replay_dir = os.path.join(replay_dir, f"{player_name}")
-                if not os.path.exists(agent_replay_dir):
-                    os.makedirs(agent_replay_dir)
+def gather_bots(backend: str = offline_simulator.DEFAULT_BACKEND, name_suffix: str = ""):
+    generic_bots = []
+
+    bot_teams = REGISTRY.bot_teams()
 
-                account_config = AccountConfiguration(player_name, None)
-                player = agent_class(
+    for bot_name, agent_class in REGISTRY.bot_classes().items():
+        for team_name, team in bot_teams.items():
+            config_name = f"{bot_name}-{team_name}"
+            account_config = AccountConfiguration(config_name + name_suffix, None)
+            generic_bots.append(
+                agent_class(
+                    team=team,
                     account_configuration=account_config,
                     battle_format="gen9ubers",
+                    **offline_simulator.backend_player_options(backend),
                 )
+            )
 
-                player._save_replays = agent_replay_dir
-
-                players.append(player)
-
-    return players
-
-
-def gather_bots():
-    bot_folders = os.path.join(os.path.dirname(__file__), "bots")
-    bot_teams_folders = os.path.join(bot_folders, "teams")
-
-    generic_bots = []
+    return generic_bots
 
-    bot_teams = {}
-
-    for team_file in os.listdir(bot_teams_folders):
-        if team_file.endswith(".txt"):
-            with open(
-                os.path.join(bot_teams_folders, team_file), "r", encoding="utf-8"
-            ) as file:
-                bot_teams[team_file[:-4]] = file.read()
-
-    for module_name in os.listdir(bot_folders):
-        if module_name.endswith(".py"):
-            module_path = f"{bot_folders}/{module_name}"
-
-            spec = importlib.util.spec_from_file_location(module_name, module_path)
-            module = importlib.util.module_from_spec(spec)
-
-            sys.modules[module_name] = module
-            spec.loader.exec_module(module)
-
-            for team_name, team in bot_teams.items():
-                # Get the class
-                if hasattr(module, "CustomAgent"):
-                    # Check if the class is a subclass of Player
-                    agent_class = getattr(module, "CustomAgent")
-
-                    config_name = f"{module_name[:-3]}-{team_name}"
-                    account_config = AccountConfiguration(config_name, None)
-                    generic_bots.append(
-                        agent_class(
-                            team=team,
-                            account_configuration=account_config,
-                            battle_format="gen9ubers",
-                        )
-                    )
 
-    return generic_bots
+def build_roster(player_name: str, backend: str, name_suffix: str = "") -> List[Player]:
+    # Rebuilds one evaluation roster (the player plus every bot) inside a shard worker
+    return gather_players(backend, name_suffix, include=[player_name]) + gather_bots(
+        backend, name_suffix
+    )
 
 
-async def cross_evaluate(agents: List[Player]):
-    return await pke.cross_evaluate(agents, n_challenges=3)
+async def cross_evaluate(
+    agents: List[Player], backend: str = offline_simulator.DEFAULT_BACKEND
+):
+    return await offline_simulator.cross_evaluate(
+        agents, n_challenges=3, backend=backend
+    )
 
 
-def evalute_againts_bots(players: List[Player]):
+def evalute_againts_bots(
+    players: List[Player],
+    backend: str = offline_simulator.DEFAULT_BACKEND,
+    workers: int = 1,
+):
     print(f"{len(players)} are competing in this challenge")
 
     print("Running Cross Evaluations...")
-    cross_evaluation_results = asyncio.run(cross_evaluate(players))
+    if workers > 1:
+        cross_evaluation_results = sharded_evaluation.sharded_cross_evaluate(
+            partial(build_roster, players[0].username),
+            [p.username for p in players],
+            n_challenges=3,
+            workers=workers,
+            backend=backend,
+        )
+    else:
+        cross_evaluation_results = asyncio.run(cross_evaluate(players, backend))
     print("Evaluations Complete")
 
     table = [["-"] + [p.username for p in players]]
@@ -163,9 +153,24 @@ def assign_marks(rank: int) -> float:
 
 
 def main():
-    generic_bots = gather_bots()
+    parser = argparse.ArgumentParser(description="Evaluate agents against the bots")
+    parser.add_argument(
+        "--backend",
+        choices=offline_simulator.BACKENDS,
+        default=offline_simulator.DEFAULT_BACKEND,
+        help="showdown: local Showdown server; offline: in-process simulator",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of worker processes the battles are sharded across",
+    )
+    args = parser.parse_args()
+
+    generic_bots = gather_bots(args.backend)
 
-    players = gather_players()
+    players = gather_players(args.backend)
 
     results_file = os.path.join(
         os.path.dirname(__file__), "results", "marking_results.txt"
@@ -182,7 +187,7 @@ def main():
         agents.append(player)
         agents.extend(generic_bots)
 
-        agent_rankings = evalute_againts_bots(agents)
+        agent_rankings = evalute_againts_bots(agents, args.backend, args.workers)
 
         player_rank = len(agents) + 1
         player_mark = 0.0
@@ -3,9 +3,8 @@
 最终评测系统 - 基于expert_main.py的稳定实现
 """
 
+import argparse
 import asyncio
-import importlib
-import os
 import sys
 import random
 import time
@@ -21,6 +20,9 @@ import poke_env as pke
 from poke_env import AccountConfiguration
 from poke_env.player.player import Player
 
+import offline_simulator
+from agent_registry import REGISTRY
+
 @dataclass
 class EvaluationResult:
     """评测结果"""
@@ -63,70 +65,38 @@ def wilson_confidence_interval(successes: int, trials: int, confidence: float =
     
     return max(0, lower), min(1, upper)
 
-def load_agents_and_opponents():
+def load_agents_and_opponents(backend: str = offline_simulator.DEFAULT_BACKEND):
     """加载agents和对手，完全基于expert_main.py的逻辑"""
-    # 加载自定义agents
-    players_dir = Path(__file__).parent / "players"
+    # 加载自定义agents（模块与队伍由注册表缓存）
     agents = []
     
-    for module_name in os.listdir(players_dir):
-        if module_name.endswith(".py"):
-            module_path = f"{players_dir}/{module_name}"
-            
-            spec = importlib.util.spec_from_file_location(module_name, module_path)
-            module = importlib.util.module_from_spec(spec)
-            
-            sys.modules[module_name] = module
-            spec.loader.exec_module(module)
-            
-            if hasattr(module, "CustomAgent"):
-                agent_class = getattr(module, "CustomAgent")
-                player_name = f"{module_name[:-3]}"
-                account_config = AccountConfiguration(player_name, None)
-                player = agent_class(
-                    account_configuration=account_config,
-                    battle_format="gen9ubers",
-                )
-                agents.append(player)
-                print(f"Loaded agent: {player_name}")
+    for player_name, agent_class in REGISTRY.player_classes().items():
+        account_config = AccountConfiguration(player_name, None)
+        player = agent_class(
+            account_configuration=account_config,
+            battle_format="gen9ubers",
+            **offline_simulator.backend_player_options(backend),
+        )
+        agents.append(player)
+        print(f"Loaded agent: {player_name}")
     
     # 加载对手bots - 完全按照expert_main.py的逻辑
-    bot_folders = Path(__file__).parent / "bots"
-    bot_teams_folders = bot_folders / "teams"
-    
     opponents = []
-    bot_teams = {}
-    
-    # 加载team文件
-    for team_file in os.listdir(bot_teams_folders):
-        if team_file.endswith(".txt"):
-            with open(os.path.join(bot_teams_folders, team_file), "r", encoding="utf-8") as f:
-                bot_teams[team_file[:-4]] = f.read()
+    bot_teams = REGISTRY.bot_teams()
     
     # 创建对手
-    for module_name in os.listdir(bot_folders):
-        if module_name.endswith(".py"):
-            module_path = f"{bot_folders}/{module_name}"
-            
-            spec = importlib.util.spec_from_file_location(module_name, module_path)
-            module = importlib.util.module_from_spec(spec)
-            
-            sys.modules[module_name] = module
-            spec.loader.exec_module(module)
-            
-            if hasattr(module, "CustomAgent"):
-                agent_class = getattr(module, "CustomAgent")
-                
-                for team_name, team in bot_teams.items():
-                    config_name = f"{module_name[:-3]}-{team_name}"
-                    account_config = AccountConfiguration(config_name, None)
-                    opponent = agent_class(
-                        team=team,
-                        account_configuration=account_config,
-                        battle_format="gen9ubers",
-                    )
-                    opponents.append(opponent)
-                    print(f"Loaded opponent: {config_name}")
+    for bot_name, agent_class in REGISTRY.bot_classes().items():
+        for team_name, team in bot_teams.items():
+            config_name = f"{bot_name}-{team_name}"
+            account_config = AccountConfiguration(config_name, None)
+            opponent = agent_class(
+                team=team,
+                account_configuration=account_config,
+                battle_format="gen9ubers",
+                **offline_simulator.backend_player_options(backend),
+            )
+            opponents.append(opponent)
+            print(f"Loaded opponent: {config_name}")
     
     return agents, opponents
 
@@ -211,12 +181,12 @@ def print_standardized_results(results: List[EvaluationResult]):
     print("📈 详细数据已保存到 evaluation_results/ 目录")
     print("="*80)
 
-async def run_evaluation():
+async def run_evaluation(backend: str = offline_simulator.DEFAULT_BACKEND):
     """运行评测"""
     print("🎮 开始Pokémon专家系统综合评测...")
     
     # 加载agents和对手
-    agents, opponents = load_agents_and_opponents()
+    agents, opponents = load_agents_and_opponents(backend)
     
     if not agents:
         print("❌ 没有找到自定义agent")
@@ -233,7 +203,9 @@ async def run_evaluation():
     print("🔄 开始对战...")
     
     try:
-        cross_evaluation_results = await pke.cross_evaluate(all_players, n_challenges=3)
+        cross_evaluation_results = await offline_simulator.cross_evaluate(
+            all_players, n_challenges=3, backend=backend
+        )
         print("✅ 对战完成！")
         
         # 计算指标
@@ -271,7 +243,12 @@ async def run_evaluation():
 
 def main():
     """主函数"""
-    asyncio.run(run_evaluation())
+    parser = argparse.ArgumentParser(description="Pokémon专家系统最终评测")
+    parser.add_argument("--backend", choices=offline_simulator.BACKENDS,
+                        default=offline_simulator.DEFAULT_BACKEND,
+                        help="对战后端: showdown (本地服务器) 或 offline (进程内模拟)")
+    args = parser.parse_args()
+    asyncio.run(run_evaluation(args.backend))
 
 if __name__ == "__main__":
     main()
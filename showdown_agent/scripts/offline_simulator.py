@@ -0,0 +1,1416 @@
+#!/usr/bin/env python3
+"""
+进程内离线对战后端
+
+不依赖 Pokémon Showdown 服务器：在本进程内按 gen9 单打规则模拟对局，生成与服务器
+格式一致的协议消息和请求 JSON，交给每个玩家自己的 poke_env Battle 对象解析，
+再通过 Player.teampreview / Player.choose_move 取得决策。因此 agent 的代码路径
+（包括 _battle_finished_callback 与回放保存）与在线对战一致，但省去了 websocket
+往返、登录和服务器进程。
+
+覆盖本项目队伍用到的机制：gen9 伤害公式、属性相克与太晶化、能力变化、异常状态、
+天气、钉子类场地、蓄力/换人技能以及常用道具和特性。未覆盖的技能附加效果会被忽略，
+所以离线胜率用于快速迭代与回归比较，正式成绩仍以服务器对战为准。
+
+用法:
+    from offline_simulator import cross_evaluate, backend_player_options
+
+    players = [Agent(..., **backend_player_options("offline")), ...]
+    results = await cross_evaluate(players, n_challenges=3, backend="offline")
+"""
+
+import asyncio
+import itertools
+import math
+import random
+import re
+from typing import Any, Awaitable, Dict, List, NamedTuple, Optional, Tuple
+
+import poke_env as pke
+from poke_env.battle import Battle, Pokemon
+from poke_env.data import GenData, to_id_str
+from poke_env.player.player import Player
+from poke_env.stats import compute_raw_stats
+from poke_env.teambuilder import ConstantTeambuilder, Teambuilder, TeambuilderPokemon
+
+# 可选的对战后端
+BACKENDS = ("showdown", "offline")
+DEFAULT_BACKEND = "showdown"
+
+# 超过该回合数判平局（与 ExperimentConfig.max_turns 一致）
+MAX_TURNS = 300
+
+GEN = 9
+GEN_DATA = GenData.from_gen(GEN)
+
+STAT_KEYS = ("hp", "atk", "def", "spa", "spd", "spe")
+
+# 会心等级 -> 概率
+CRIT_CHANCES = (1 / 24, 1 / 8, 1 / 2, 1.0)
+
+# 2-5 连击的段数分布
+MULTIHIT_COUNTS = (2, 3, 4, 5)
+MULTIHIT_WEIGHTS = (35, 35, 15, 15)
+
+# 提升同属性技能威力 1.2 倍的道具
+TYPE_BOOST_ITEMS = {
+    "blackbelt": "FIGHTING", "blackglasses": "DARK", "charcoal": "FIRE",
+    "dragonfang": "DRAGON", "fairyfeather": "FAIRY", "hardstone": "ROCK",
+    "magnet": "ELECTRIC", "metalcoat": "STEEL", "miracleseed": "GRASS",
+    "mysticwater": "WATER", "nevermeltice": "ICE", "poisonbarb": "POISON",
+    "sharpbeak": "FLYING", "silkscarf": "NORMAL", "silverpowder": "BUG",
+    "softsand": "GROUND", "spelltag": "GHOST", "twistedspoon": "PSYCHIC",
+}
+PLATE_TYPES = {
+    "dracoplate": "DRAGON", "dreadplate": "DARK", "earthplate": "GROUND",
+    "fistplate": "FIGHTING", "flameplate": "FIRE", "icicleplate": "ICE",
+    "insectplate": "BUG", "ironplate": "STEEL", "meadowplate": "GRASS",
+    "mindplate": "PSYCHIC", "pixieplate": "FAIRY", "skyplate": "FLYING",
+    "splashplate": "WATER", "spookyplate": "GHOST", "stoneplate": "ROCK",
+    "toxicplate": "POISON", "zapplate": "ELECTRIC",
+}
+TYPE_BOOST_ITEMS.update(PLATE_TYPES)
+MASK_TYPES = {"cornerstonemask": "ROCK", "hearthflamemask": "FIRE", "wellspringmask": "WATER"}
+
+# 无法被打落/交换的道具
+UNREMOVABLE_ITEMS = set(PLATE_TYPES) | set(MASK_TYPES) | {
+    "rustedsword", "rustedshield", "griseouscore", "adamantcrystal", "lustrousglobe",
+}
+
+# 属性免疫类特性：特性 -> (免疫的属性, 触发效果)
+ABSORB_ABILITIES = {
+    "dryskin": ("WATER", "heal"),
+    "eartheater": ("GROUND", "heal"),
+    "flashfire": ("FIRE", None),
+    "levitate": ("GROUND", None),
+    "lightningrod": ("ELECTRIC", "spa"),
+    "motordrive": ("ELECTRIC", "spe"),
+    "sapsipper": ("GRASS", "atk"),
+    "stormdrain": ("WATER", "spa"),
+    "voltabsorb": ("ELECTRIC", "heal"),
+    "waterabsorb": ("WATER", "heal"),
+    "wellbakedbody": ("FIRE", "def2"),
+}
+STATUS_IMMUNE_ABILITIES = {
+    "brn": {"waterveil", "waterbubble", "thermalexchange"},
+    "par": {"limber"},
+    "psn": {"immunity"},
+    "tox": {"immunity"},
+    "slp": {"insomnia", "vitalspirit", "sweetveil"},
+    "frz": {"magmaarmor"},
+}
+STATUS_IMMUNE_TYPES = {
+    "brn": {"FIRE"}, "par": {"ELECTRIC"}, "psn": {"POISON", "STEEL"},
+    "tox": {"POISON", "STEEL"}, "frz": {"ICE"}, "slp": set(),
+}
+UNBOOSTABLE_ABILITIES = {"clearbody", "whitesmoke", "fullmetalbody"}
+HALVING_ABILITIES = {"multiscale", "shadowshield"}
+FILTER_ABILITIES = {"filter", "solidrock", "prismarmor"}
+
+WEATHER_ABILITIES = {
+    "drizzle": "RainDance", "drought": "SunnyDay", "orichalcumpulse": "SunnyDay",
+    "sandstream": "Sandstorm", "snowwarning": "Snow",
+}
+WEATHER_MOVES = {
+    "raindance": "RainDance", "sandstorm": "Sandstorm", "snowscape": "Snow", "sunnyday": "SunnyDay",
+}
+WEATHER_TURNS = 5
+
+# 钉子类场地 -> 最大层数
+HAZARD_LAYERS = {"spikes": 3, "stealthrock": 1, "stickyweb": 1, "toxicspikes": 2}
+
+# 蓄力回合获得的能力提升
+CHARGE_BOOSTS = {"electroshot": {"spa": 1}, "meteorbeam": {"spa": 1}, "skullbash": {"def": 1}}
+PROTECT_MOVES = {"protect", "detect", "kingsshield", "spikyshield", "banefulbunker", "silktrap", "burningbulwark"}
+WEATHER_HEAL_MOVES = {"moonlight", "morningsun", "synthesis"}
+PHAZING_MOVES = {"roar", "whirlwind", "dragontail", "circlethrow"}
+FIRST_TURN_MOVES = {"fakeout", "firstimpression"}
+
+FOE_TARGETS = {"normal", "any", "adjacentFoe", "allAdjacentFoes", "allAdjacent", "randomNormal", "scripted"}
+SELF_TARGETS = {"self", "allySide", "allyTeam", "allies", "adjacentAllyOrSelf"}
+
+_BATTLE_IDS = itertools.count(1)
+
+
+def set_battle_id_base(base: int) -> None:
+    """设置后续离线对局编号的起点；多进程分片时保证各进程的 battle_tag 不重复"""
+    global _BATTLE_IDS
+    _BATTLE_IDS = itertools.count(base + 1)
+
+
+def backend_player_options(backend: str) -> Dict[str, Any]:
+    """构造 Player 时需要额外传入的参数；离线后端不连接服务器"""
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的对战后端: {backend}，可选: {', '.join(BACKENDS)}")
+    return {"start_listening": False} if backend == "offline" else {}
+
+
+def _boost_multiplier(stage: int) -> float:
+    return (2 + stage) / 2 if stage >= 0 else 2 / (2 - stage)
+
+
+def _type_name(type_id: str) -> str:
+    return type_id.capitalize()
+
+
+class Condition(NamedTuple):
+    """协议中的 HP/状态字段：己方看到精确 HP，对手只看到百分比"""
+    role: str
+    exact: str
+    public: str
+
+
+class SimAction(NamedTuple):
+    """一方本回合的行动"""
+    kind: str  # move / switch / forfeit
+    target: Any  # 技能 id 或 SimPokemon
+    terastallize: bool = False
+
+
+class SimPokemon:
+    """对局中一只宝可梦的真实状态"""
+
+    def __init__(self, tb_mon: TeambuilderPokemon):
+        species_id = to_id_str(tb_mon.species or tb_mon.nickname)
+        entry = GEN_DATA.pokedex[species_id]
+        self.species = entry["name"]
+        # 没有昵称时 Showdown 用基础种类名作为标识（Zacian-Crowned -> "p1a: Zacian"）
+        base_species = entry.get("baseSpecies", species_id)
+        if tb_mon.species and to_id_str(tb_mon.nickname) != species_id:
+            self.name = tb_mon.nickname
+        else:
+            self.name = entry["name"] if base_species == species_id else base_species
+        self.level = tb_mon.level or 100
+        self.details = self.species if self.level == 100 else f"{self.species}, L{self.level}"
+        self.base_types = [t.upper() for t in entry["types"]]
+        self.weight = entry.get("weightkg", 100.0)
+
+        nature = to_id_str(tb_mon.nature or "serious")
+        raw = compute_raw_stats(species_id, list(tb_mon.evs), list(tb_mon.ivs), self.level, nature, GEN_DATA)
+        self.stats = dict(zip(STAT_KEYS, raw))
+        self.max_hp = self.stats["hp"]
+        self.hp = self.max_hp
+
+        self.item_name = tb_mon.item or ""
+        ability = to_id_str(tb_mon.ability or entry["abilities"]["0"])
+        names = [name for name in entry["abilities"].values() if to_id_str(name) == ability]
+        self.ability_name = names[0] if names else tb_mon.ability
+        self.moves = [to_id_str(m) for m in tb_mon.moves]
+        self.max_pp = {m: GEN_DATA.moves[m]["pp"] * 8 // 5 for m in self.moves}
+        self.pp = dict(self.max_pp)
+        self.tera_type = (tb_mon.tera_type or entry["types"][0]).upper()
+        self.terastallized = False
+
+        self.status = ""
+        self.status_turns = 0
+        self.boosts: Dict[str, int] = {}
+        self.volatiles: Dict[str, Any] = {}
+        self.active_turns = 0
+        self.protect_streak = 0
+        self.entry_ability_used = False
+        self.faint_announced = False
+
+    @property
+    def item(self) -> str:
+        return to_id_str(self.item_name)
+
+    @property
+    def ability(self) -> str:
+        return to_id_str(self.ability_name)
+
+    @property
+    def types(self) -> List[str]:
+        return [self.tera_type] if self.terastallized else self.base_types
+
+    @property
+    def fainted(self) -> bool:
+        return self.hp <= 0
+
+    def condition(self, exact: bool) -> str:
+        if self.hp <= 0:
+            return "0 fnt"
+        if exact:
+            hp = f"{self.hp}/{self.max_hp}"
+        else:
+            hp = f"{max(1, math.ceil(100 * self.hp / self.max_hp))}/100"
+        return f"{hp} {self.status}" if self.status else hp
+
+    def clear_volatiles(self):
+        self.boosts = {}
+        self.volatiles = {}
+        self.active_turns = 0
+        self.protect_streak = 0
+
+
+class SimSide:
+    """对局中的一方：玩家、其 Battle 视角和真实队伍"""
+
+    def __init__(self, role: str, player: Player, battle: Battle, team: List[SimPokemon]):
+        self.role = role
+        self.player = player
+        self.battle = battle
+        self.team = team
+        self.active: Optional[SimPokemon] = None
+        self.conditions: Dict[str, int] = {}
+        self.tera_used = False
+        self.foe: "SimSide" = self
+
+    @property
+    def username(self) -> str:
+        return self.player.username
+
+    @property
+    def bench(self) -> List[SimPokemon]:
+        return [mon for mon in self.team if mon is not self.active and not mon.fainted]
+
+    def alive(self) -> bool:
+        return any(not mon.fainted for mon in self.team)
+
+    def ident(self, mon: SimPokemon) -> str:
+        return f"{self.role}a: {mon.name}" if mon is self.active else f"{self.role}: {mon.name}"
+
+
+class OfflineBattle:
+    """一局离线对战：模拟规则、生成协议消息并驱动双方 Player"""
+
+    def __init__(self, p1: Player, p2: Player, seed: Optional[int] = None, max_turns: int = MAX_TURNS):
+        self.rng = random.Random(seed)
+        self.max_turns = max_turns
+        self.battle_format = p1.format
+        self.battle_tag = f"battle-{self.battle_format}-{next(_BATTLE_IDS)}"
+        self.turn = 0
+        self.weather = ""
+        self.weather_turns = 0
+        self.future_sight: Dict[str, Tuple[int, int]] = {}
+        self.rqid = 0
+        self.invalid_choices = 0
+        self.winner: Optional[SimSide] = None
+        self.finished = False
+        self._pending: List[List[Any]] = []
+        self._moved: set = set()
+        self._actions: Dict[str, SimAction] = {}
+
+        self.sides = [self._create_side("p1", p1), self._create_side("p2", p2)]
+        self.sides[0].foe, self.sides[1].foe = self.sides[1], self.sides[0]
+
+    # ------------------------------------------------------------------
+    # 初始化与消息
+    # ------------------------------------------------------------------
+
+    def _create_side(self, role: str, player: Player) -> SimSide:
+        packed = player.next_team
+        if not packed:
+            raise ValueError(f"{player.username} 没有队伍，离线后端只支持自带队伍的赛制")
+        team = [SimPokemon(tb_mon) for tb_mon in Teambuilder.parse_packed_team(packed)]
+
+        # 与 Player._create_battle 相同的初始化
+        battle = Battle(
+            battle_tag=self.battle_tag,
+            username=player.username,
+            logger=player.logger,
+            gen=GEN,
+            save_replays=player._save_replays,
+        )
+        if isinstance(player._team, ConstantTeambuilder):
+            battle.teampreview_team = set(
+                [Pokemon(gen=GEN, teambuilder=tb_mon) for tb_mon in player._team.team]
+            )
+        player._battles[self.battle_tag] = battle
+        return SimSide(role, player, battle, team)
+
+    def _cond(self, side: SimSide, mon: SimPokemon) -> Condition:
+        return Condition(side.role, mon.condition(True), mon.condition(False))
+
+    def _emit(self, *parts: Any):
+        self._pending.append(list(parts))
+
+    def _flush(self):
+        """把累积的协议消息按各自视角交给双方的 Battle 解析"""
+        for side in self.sides:
+            for parts in self._pending:
+                message = [""]
+                for part in parts:
+                    if isinstance(part, Condition):
+                        part = part.exact if part.role == side.role else part.public
+                    message.append(part)
+                side.battle.parse_message(message)
+        self._pending = []
+
+    def _side_of(self, mon: SimPokemon) -> SimSide:
+        return self.sides[0] if mon in self.sides[0].team else self.sides[1]
+
+    def _ident(self, mon: SimPokemon) -> str:
+        return self._side_of(mon).ident(mon)
+
+    # ------------------------------------------------------------------
+    # 请求与决策
+    # ------------------------------------------------------------------
+
+    def _move_disabled(self, mon: SimPokemon, move_id: str) -> bool:
+        entry = GEN_DATA.moves[move_id]
+        if mon.pp.get(move_id, 0) <= 0:
+            return True
+        locked = mon.volatiles.get("choicelock")
+        if locked and locked != move_id and locked in mon.moves:
+            return True
+        if entry["category"] == "Status" and ("taunt" in mon.volatiles or mon.item == "assaultvest"):
+            return True
+        if "healblock" in mon.volatiles and "heal" in entry.get("flags", {}):
+            return True
+        return False
+
+    def _request(self, side: SimSide, team_preview: bool = False, force_switch: bool = False) -> Dict[str, Any]:
+        self.rqid += 1
+        pokemon = []
+        for mon in side.team:
+            pokemon.append({
+                "ident": f"{side.role}: {mon.name}",
+                "details": mon.details,
+                "condition": mon.condition(True),
+                "active": mon is side.active and not team_preview,
+                "stats": {stat: mon.stats[stat] for stat in STAT_KEYS[1:]},
+                "moves": list(mon.moves),
+                "baseAbility": mon.ability,
+                "item": mon.item,
+                "pokeball": "pokeball",
+                "ability": mon.ability,
+                "commanding": False,
+                "reviving": False,
+                "teraType": _type_name(mon.tera_type),
+                "terastallized": _type_name(mon.tera_type) if mon.terastallized else "",
+            })
+        request: Dict[str, Any] = {
+            "side": {"name": side.username, "id": side.role, "pokemon": pokemon},
+            "rqid": self.rqid,
+        }
+        if team_preview:
+            request["teamPreview"] = True
+            request["maxTeamSize"] = len(side.team)
+        elif force_switch:
+            request["forceSwitch"] = [True]
+        else:
+            request["active"] = [self._active_request(side)]
+        return request
+
+    def _active_request(self, side: SimSide) -> Dict[str, Any]:
+        mon = side.active
+        locked = mon.volatiles.get("charging")
+        if mon.volatiles.get("mustrecharge"):
+            return {"moves": [{"move": "Recharge", "id": "recharge"}], "trapped": True}
+        if locked:
+            return {"moves": [{"move": GEN_DATA.moves[locked]["name"], "id": locked}], "trapped": True}
+
+        moves = [
+            {
+                "move": GEN_DATA.moves[move_id]["name"],
+                "id": move_id,
+                "pp": mon.pp[move_id],
+                "maxpp": mon.max_pp[move_id],
+                "target": GEN_DATA.moves[move_id]["target"],
+                "disabled": self._move_disabled(mon, move_id),
+            }
+            for move_id in mon.moves
+        ]
+        if all(move["disabled"] for move in moves):
+            moves = [{"move": "Struggle", "id": "struggle", "target": "randomNormal", "disabled": False}]
+        active: Dict[str, Any] = {"moves": moves}
+        if not side.tera_used and not mon.terastallized:
+            active["canTerastallize"] = _type_name(mon.tera_type)
+        return active
+
+    async def _decide(self, side: SimSide, request: Dict[str, Any]) -> str:
+        """与 Player._handle_battle_request 相同：解析请求后调用 teampreview / choose_move"""
+        side.battle.parse_request(request)
+        if request.get("teamPreview"):
+            return side.player.teampreview(side.battle)
+        choice = side.player.choose_move(side.battle)
+        if isinstance(choice, Awaitable):
+            choice = await choice
+        return choice.message
+
+    def _legal_moves(self, side: SimSide) -> List[str]:
+        return [move["id"] for move in self._active_request(side)["moves"] if not move.get("disabled")]
+
+    def _parse_choice(self, side: SimSide, message: str, force_switch: bool) -> SimAction:
+        """把 /choose 指令转成行动；非法指令按 Showdown 的默认选择处理"""
+        message = message.strip()
+        if message == "/forfeit":
+            return SimAction("forfeit", None)
+        if message.startswith("/choose "):
+            message = message[len("/choose "):]
+        tokens = message.split()
+
+        if tokens and tokens[0] == "switch" and len(tokens) > 1:
+            wanted = to_id_str(" ".join(tokens[1:]))
+            for index, mon in enumerate(side.team, 1):
+                if mon in side.bench and wanted in (str(index), to_id_str(mon.species), to_id_str(mon.name)):
+                    trapped = side.active is not None and not force_switch and (
+                        "charging" in side.active.volatiles or "mustrecharge" in side.active.volatiles
+                    )
+                    if not trapped:
+                        return SimAction("switch", mon)
+        elif tokens and tokens[0] == "move" and len(tokens) > 1 and not force_switch:
+            legal = self._legal_moves(side)
+            token = to_id_str(tokens[1])
+            if token.isdigit() and 0 < int(token) <= len(legal):
+                token = legal[int(token) - 1]
+            if token in legal:
+                can_tera = not side.tera_used and not side.active.terastallized
+                return SimAction("move", token, "terastallize" in tokens[2:] and can_tera)
+
+        if message != "default":
+            self.invalid_choices += 1
+            side.player.logger.debug("Offline backend ignored invalid choice %r in %s", message, self.battle_tag)
+        if force_switch:
+            return SimAction("switch", side.bench[0])
+        return SimAction("move", self._legal_moves(side)[0])
+
+    async def _choose_action(self, side: SimSide, force_switch: bool = False) -> SimAction:
+        self._flush()
+        message = await self._decide(side, self._request(side, force_switch=force_switch))
+        return self._parse_choice(side, message, force_switch)
+
+    # ------------------------------------------------------------------
+    # 对局流程
+    # ------------------------------------------------------------------
+
+    async def run(self) -> Optional[str]:
+        """进行整局对战，返回胜者用户名（平局为 None）"""
+        p1, p2 = self.sides
+        self._emit("player", "p1", p1.username, "", "")
+        self._emit("player", "p2", p2.username, "", "")
+        self._emit("teamsize", "p1", str(len(p1.team)))
+        self._emit("teamsize", "p2", str(len(p2.team)))
+        self._emit("gen", str(GEN))
+        self._emit("tier", self.battle_format)
+        self._emit("clearpoke")
+        for side in self.sides:
+            for mon in side.team:
+                self._emit("poke", side.role, mon.details, "")
+        self._emit("teampreview")
+        self._flush()
+
+        for side in self.sides:
+            order = await self._decide(side, self._request(side, team_preview=True))
+            self._apply_team_order(side, order)
+
+        self._emit("start")
+        for side in self._by_speed([side for side in self.sides], lambda s: s.team[0]):
+            self._switch_in(side, side.team[0])
+        for side in self._by_speed(self.sides, lambda s: s.active):
+            self._on_entry(side, side.active)
+
+        while not self.finished:
+            self.turn += 1
+            if self.turn > self.max_turns:
+                self._finish(None)
+                break
+            self._emit("turn", str(self.turn))
+            # 每回合让出一次事件循环，使并发对局交替推进、超时可以生效
+            await asyncio.sleep(0)
+
+            actions = {}
+            for side in self.sides:
+                actions[side.role] = await self._choose_action(side)
+            forfeits = [side for side in self.sides if actions[side.role].kind == "forfeit"]
+            if forfeits:
+                self._finish(forfeits[0].foe if len(forfeits) == 1 else None)
+                break
+
+            await self._resolve_turn(actions)
+            if not self.finished:
+                await self._replace_fainted()
+
+        self._flush()
+        return self.winner.username if self.winner else None
+
+    def _apply_team_order(self, side: SimSide, order: str):
+        """处理 /team 指令：指定的顺序在前，其余保持原顺序"""
+        chosen: List[SimPokemon] = []
+        for digit in re.findall(r"\d", order):
+            index = int(digit) - 1
+            if 0 <= index < len(side.team) and side.team[index] not in chosen:
+                chosen.append(side.team[index])
+        side.team = chosen + [mon for mon in side.team if mon not in chosen]
+
+    def _by_speed(self, sides: List[SimSide], pick) -> List[SimSide]:
+        return sorted(sides, key=lambda side: (self._speed(pick(side)), self.rng.random()), reverse=True)
+
+    def _check_winner(self) -> bool:
+        if self.finished:
+            return True
+        alive = [side for side in self.sides if side.alive()]
+        if len(alive) == 2:
+            return False
+        self._finish(alive[0] if alive else None)
+        return True
+
+    def _finish(self, winner: Optional[SimSide]):
+        self.finished = True
+        self.winner = winner
+        self._flush()
+        for side in self.sides:
+            if winner is not None:
+                side.battle.won_by(winner.username)
+            else:
+                side.battle.tied()
+        for side in self.sides:
+            side.player._battle_finished_callback(side.battle)
+
+    async def _resolve_turn(self, actions: Dict[str, SimAction]):
+        self._actions = actions
+        self._moved = set()
+
+        switching = [side for side in self.sides if actions[side.role].kind == "switch"]
+        for side in self._by_speed(switching, lambda s: s.active):
+            self._switch_in(side, actions[side.role].target)
+            self._moved.add(side.role)
+        for side in self._by_speed(switching, lambda s: s.active):
+            self._on_entry(side, side.active)
+        if self._check_winner():
+            return
+
+        movers = [side for side in self.sides if actions[side.role].kind == "move"]
+        for side in movers:
+            if actions[side.role].terastallize:
+                self._terastallize(side)
+
+        def order_key(side: SimSide):
+            move_id = actions[side.role].target
+            priority = GEN_DATA.moves[move_id]["priority"] if move_id in GEN_DATA.moves else 0
+            return priority, self._speed(side.active), self.rng.random()
+
+        for side in sorted(movers, key=order_key, reverse=True):
+            mon = side.active
+            if mon.fainted:
+                continue
+            pivot = self._use_move(side, actions[side.role].target)
+            self._moved.add(side.role)
+            self._faint_check()
+            if self._check_winner():
+                return
+            if pivot and side.bench and not mon.fainted:
+                action = await self._choose_action(side, force_switch=True)
+                self._switch_in(side, action.target)
+                self._on_entry(side, side.active)
+                self._faint_check()
+                if self._check_winner():
+                    return
+
+        self._residual()
+        self._faint_check()
+        self._check_winner()
+
+    async def _replace_fainted(self):
+        """回合结束后为倒下的一方请求替补；钉子再击倒时继续请求"""
+        while not self.finished:
+            needing = [side for side in self.sides if side.active.fainted and side.bench]
+            if not needing:
+                return
+            choices = {}
+            for side in needing:
+                choices[side.role] = (await self._choose_action(side, force_switch=True)).target
+            for side in self._by_speed(needing, lambda s: choices[s.role]):
+                self._switch_in(side, choices[side.role])
+            for side in self._by_speed(needing, lambda s: s.active):
+                self._on_entry(side, side.active)
+            self._faint_check()
+            self._check_winner()
+
+    # ------------------------------------------------------------------
+    # 换人与场地
+    # ------------------------------------------------------------------
+
+    def _grounded(self, mon: SimPokemon) -> bool:
+        return "FLYING" not in mon.types and mon.ability != "levitate" and mon.item != "airballoon"
+
+    def _switch_in(self, side: SimSide, mon: SimPokemon, drag: bool = False):
+        old = side.active
+        if old is not None:
+            if not old.fainted:
+                if old.ability == "regenerator":
+                    old.hp = min(old.max_hp, old.hp + old.max_hp // 3)
+                elif old.ability == "naturalcure":
+                    old.status = ""
+            if old.status == "tox":
+                old.status_turns = 0
+            old.clear_volatiles()
+
+        index = side.team.index(mon)
+        side.team[0], side.team[index] = side.team[index], side.team[0]
+        side.active = mon
+        mon.clear_volatiles()
+        self._emit("drag" if drag else "switch", side.ident(mon), mon.details, self._cond(side, mon))
+
+        if mon.item == "heavydutyboots":
+            return
+        ident = side.ident(mon)
+        if side.conditions.get("stealthrock"):
+            factor = self._effectiveness("ROCK", mon)
+            self._damage_direct(mon, int(mon.max_hp * factor / 8), "[from] Stealth Rock")
+        if self._grounded(mon):
+            layers = side.conditions.get("spikes", 0)
+            if layers:
+                self._damage_direct(mon, mon.max_hp * (layers + 1) // 16, "[from] Spikes")
+            layers = side.conditions.get("toxicspikes", 0)
+            if layers and "POISON" in mon.types:
+                del side.conditions["toxicspikes"]
+                self._emit("-sideend", f"{side.role}: {side.username}", "move: Toxic Spikes", f"[of] {ident}")
+            elif layers:
+                self._set_status(mon, "tox" if layers > 1 else "psn")
+            if side.conditions.get("stickyweb"):
+                self._boost(mon, {"spe": -1}, foe=True)
+
+    def _on_entry(self, side: SimSide, mon: SimPokemon):
+        """登场时触发的特性"""
+        if mon.fainted:
+            return
+        ident = side.ident(mon)
+        ability = mon.ability
+        foe = side.foe.active
+        if ability == "intimidate" and foe is not None and not foe.fainted:
+            self._emit("-ability", ident, mon.ability_name, "boost")
+            if foe.ability in {"innerfocus", "oblivious", "owntempo", "scrappy"} | UNBOOSTABLE_ABILITIES:
+                self._emit("-fail", self._ident(foe), "unboost", f"[from] ability: {foe.ability_name}", f"[of] {self._ident(foe)}")
+            else:
+                self._boost(foe, {"atk": -1}, foe=True)
+        elif ability in WEATHER_ABILITIES and self.weather != WEATHER_ABILITIES[ability]:
+            self.weather = WEATHER_ABILITIES[ability]
+            self.weather_turns = WEATHER_TURNS
+            self._emit("-weather", self.weather, f"[from] ability: {mon.ability_name}", f"[of] {ident}")
+        elif ability in ("intrepidsword", "dauntlessshield") and not mon.entry_ability_used:
+            mon.entry_ability_used = True
+            self._boost(mon, {"atk" if ability == "intrepidsword" else "def": 1}, source=f"[from] ability: {mon.ability_name}")
+        elif ability in ("pressure", "moldbreaker", "unnerve"):
+            self._emit("-ability", ident, mon.ability_name)
+
+    def _terastallize(self, side: SimSide):
+        side.tera_used = True
+        side.active.terastallized = True
+        self._emit("-terastallize", side.ident(side.active), _type_name(side.active.tera_type))
+
+    # ------------------------------------------------------------------
+    # 数值计算
+    # ------------------------------------------------------------------
+
+    def _effectiveness(self, move_type: str, target: SimPokemon) -> float:
+        factor = 1.0
+        for target_type in target.types:
+            factor *= GEN_DATA.type_chart[target_type].get(move_type, 1)
+        return factor
+
+    def _stat(self, mon: SimPokemon, stat: str, crit: bool = False, attacking: bool = True) -> int:
+        stage = mon.boosts.get(stat, 0)
+        if crit and ((attacking and stage < 0) or (not attacking and stage > 0)):
+            stage = 0
+        return int(mon.stats[stat] * _boost_multiplier(stage))
+
+    def _speed(self, mon: Optional[SimPokemon]) -> float:
+        if mon is None:
+            return 0
+        speed = self._stat(mon, "spe")
+        if mon.item == "choicescarf":
+            speed *= 1.5
+        if mon.status == "par":
+            speed *= 0.5
+        return speed
+
+    def _move_type(self, mon: SimPokemon, move_id: str) -> str:
+        if move_id in ("judgment", "multiattack") and mon.item in PLATE_TYPES:
+            return PLATE_TYPES[mon.item]
+        if move_id == "ivycudgel" and mon.item in MASK_TYPES:
+            return MASK_TYPES[mon.item]
+        if move_id == "terablast" and mon.terastallized:
+            return mon.tera_type
+        if move_id == "struggle":
+            return "???"
+        return GEN_DATA.moves[move_id]["type"].upper()
+
+    def _base_power(self, side: SimSide, user: SimPokemon, target: SimPokemon, move_id: str, move_type: str) -> float:
+        entry = GEN_DATA.moves[move_id]
+        power = float(entry["basePower"])
+        if move_id in ("heavyslam", "heatcrash"):
+            ratio = user.weight / max(target.weight, 0.1)
+            power = 120 if ratio >= 5 else 100 if ratio >= 4 else 80 if ratio >= 3 else 60 if ratio >= 2 else 40
+        elif move_id in ("eruption", "waterspout", "dragonenergy"):
+            power = max(1, int(150 * user.hp / user.max_hp))
+        elif move_id == "knockoff" and target.item and target.item not in UNREMOVABLE_ITEMS:
+            power *= 1.5
+        elif move_id in ("hex", "infernalparade") and target.status:
+            power *= 2
+        elif move_id == "facade" and user.status:
+            power *= 2
+        elif move_id == "acrobatics" and not user.item:
+            power *= 2
+        if TYPE_BOOST_ITEMS.get(user.item) == move_type or user.item in MASK_TYPES:
+            power *= 1.2
+        if user.ability == "supremeoverlord":
+            fainted = sum(1 for mon in side.team if mon.fainted)
+            power *= 1 + 0.1 * min(fainted, 5)
+        if user.ability == "technician" and power <= 60:
+            power *= 1.5
+        return power
+
+    def _calculate_damage(self, side: SimSide, user: SimPokemon, target: SimPokemon, move_id: str,
+                          move_type: str, effectiveness: float, crit: bool) -> int:
+        """gen9 伤害公式（省略了本项目队伍不涉及的修正项）"""
+        entry = GEN_DATA.moves[move_id]
+        physical = entry["category"] == "Physical"
+        if move_id == "terablast" and user.terastallized:
+            physical = self._stat(user, "atk") > self._stat(user, "spa")
+        attack_stat = entry.get("overrideOffensiveStat") or ("atk" if physical else "spa")
+        defense_stat = entry.get("overrideDefensiveStat") or ("def" if physical else "spd")
+        ignore_ability = entry.get("ignoreAbility") or user.ability in ("moldbreaker", "teravolt", "turboblaze")
+
+        attack = self._stat(user, attack_stat, crit, attacking=True)
+        defense = self._stat(target, defense_stat, crit, attacking=False)
+        if physical and user.item == "choiceband" or not physical and user.item == "choicespecs":
+            attack = int(attack * 1.5)
+        if physical and user.ability == "orichalcumpulse" and self.weather == "SunnyDay":
+            attack = int(attack * 5461 / 4096)
+        if physical and user.ability in ("hugepower", "purepower"):
+            attack *= 2
+        if move_type == "GHOST" and target.ability == "purifyingsalt" and not ignore_ability:
+            attack = int(attack * 0.5)
+        if not physical and target.item == "assaultvest":
+            defense = int(defense * 1.5)
+
+        power = self._base_power(side, user, target, move_id, move_type)
+        damage = math.floor(math.floor(math.floor(2 * user.level / 5 + 2) * power * attack / max(1, defense)) / 50) + 2
+
+        if self.weather == "SunnyDay" and move_type in ("FIRE", "WATER"):
+            damage *= 1.5 if move_type == "FIRE" else 0.5
+        elif self.weather == "RainDance" and move_type in ("FIRE", "WATER"):
+            damage *= 1.5 if move_type == "WATER" else 0.5
+        if crit:
+            damage *= 1.5
+        damage = math.floor(damage * self.rng.randint(85, 100) / 100)
+
+        stab = 1.0
+        if move_type in user.base_types or (user.terastallized and move_type == user.tera_type):
+            stab = 2.0 if user.ability == "adaptability" else 1.5
+            if user.terastallized and move_type == user.tera_type and move_type in user.base_types:
+                stab += 0.5
+        damage = math.floor(damage * stab)
+        damage = math.floor(damage * effectiveness)
+        if physical and user.status == "brn" and user.ability != "guts" and move_id != "facade":
+            damage = math.floor(damage * 0.5)
+
+        if user.item == "lifeorb":
+            damage *= 1.3
+        if user.item == "expertbelt" and effectiveness > 1:
+            damage *= 1.2
+        if not ignore_ability:
+            if target.ability in HALVING_ABILITIES and target.hp == target.max_hp:
+                damage *= 0.5
+            if target.ability in FILTER_ABILITIES and effectiveness > 1:
+                damage *= 0.75
+        return max(1, int(damage))
+
+    # ------------------------------------------------------------------
+    # 基础效果
+    # ------------------------------------------------------------------
+
+    def _damage_direct(self, mon: SimPokemon, amount: int, *suffix: str):
+        if mon.fainted or amount <= 0:
+            return
+        mon.hp = max(0, mon.hp - amount)
+        self._emit("-damage", self._ident(mon), self._cond(self._side_of(mon), mon), *suffix)
+
+    def _heal(self, mon: SimPokemon, amount: int, *suffix: str) -> bool:
+        if mon.fainted or mon.hp >= mon.max_hp or amount <= 0 or "healblock" in mon.volatiles:
+            return False
+        mon.hp = min(mon.max_hp, mon.hp + amount)
+        self._emit("-heal", self._ident(mon), self._cond(self._side_of(mon), mon), *suffix)
+        return True
+
+    def _set_status(self, mon: SimPokemon, status: str, *suffix: str) -> bool:
+        if mon.fainted or mon.status:
+            return False
+        if set(mon.types) & STATUS_IMMUNE_TYPES[status]:
+            return False
+        if mon.ability in STATUS_IMMUNE_ABILITIES[status] or mon.ability in ("purifyingsalt", "comatose"):
+            return False
+        if mon.ability == "leafguard" and self.weather == "SunnyDay":
+            return False
+        mon.status = status
+        mon.status_turns = self.rng.randint(1, 3) if status == "slp" else 0
+        self._emit("-status", self._ident(mon), status, *suffix)
+        return True
+
+    def _cure_status(self, mon: SimPokemon, *suffix: str):
+        if mon.status:
+            self._emit("-curestatus", self._ident(mon), mon.status, *suffix)
+            mon.status = ""
+            mon.status_turns = 0
+
+    def _boost(self, mon: SimPokemon, boosts: Dict[str, int], foe: bool = False, source: Optional[str] = None) -> bool:
+        """改变能力等级；foe 表示由对手造成（受恒净之躯与不服输影响）"""
+        if mon.fainted:
+            return False
+        changed = False
+        lowered = False
+        ident = self._ident(mon)
+        for stat, amount in boosts.items():
+            if amount < 0 and foe and mon.ability in UNBOOSTABLE_ABILITIES:
+                self._emit("-fail", ident, "unboost", f"[from] ability: {mon.ability_name}", f"[of] {ident}")
+                continue
+            if mon.ability == "contrary":
+                amount = -amount
+            current = mon.boosts.get(stat, 0)
+            new = max(-6, min(6, current + amount))
+            delta = new - current
+            mon.boosts[stat] = new
+            suffix = [source] if source else []
+            if amount > 0:
+                self._emit("-boost", ident, stat, str(delta), *suffix)
+            else:
+                self._emit("-unboost", ident, stat, str(-delta), *suffix)
+            changed = changed or delta != 0
+            lowered = lowered or delta < 0
+        if lowered and foe and mon.ability in ("defiant", "competitive"):
+            stat = "atk" if mon.ability == "defiant" else "spa"
+            self._boost(mon, {stat: 2}, source=f"[from] ability: {mon.ability_name}")
+        return changed
+
+    def _faint_check(self):
+        for side in self.sides:
+            mon = side.active
+            if mon is not None and mon.fainted and not mon.faint_announced:
+                mon.faint_announced = True
+                self._emit("faint", side.ident(mon))
+
+    # ------------------------------------------------------------------
+    # 技能
+    # ------------------------------------------------------------------
+
+    def _can_move(self, side: SimSide, user: SimPokemon, move_id: str) -> bool:
+        """出招前的行动判定（睡眠、冰冻、麻痹、畏缩、挑衅）"""
+        ident = side.ident(user)
+        if user.volatiles.pop("mustrecharge", False):
+            self._emit("cant", ident, "recharge")
+            return False
+        if user.status == "slp":
+            user.status_turns -= 1
+            if user.status_turns > 0:
+                self._emit("cant", ident, "slp")
+                return move_id == "sleeptalk"
+            self._cure_status(user, "[msg]")
+        if user.status == "frz":
+            if self.rng.random() < 0.2 or "defrost" in GEN_DATA.moves.get(move_id, {}).get("flags", {}):
+                self._cure_status(user, "[msg]")
+            else:
+                self._emit("cant", ident, "frz")
+                return False
+        if user.volatiles.pop("flinch", False):
+            self._emit("cant", ident, "flinch")
+            return False
+        if "taunt" in user.volatiles and move_id in GEN_DATA.moves and GEN_DATA.moves[move_id]["category"] == "Status":
+            self._emit("cant", ident, "move: Taunt", GEN_DATA.moves[move_id]["name"])
+            return False
+        if user.status == "par" and self.rng.random() < 0.25:
+            self._emit("cant", ident, "par")
+            return False
+        return True
+
+    def _use_move(self, side: SimSide, move_id: str) -> bool:
+        """执行一次出招；返回是否需要随后换人（急速折返等）"""
+        user = side.active
+        if move_id == "recharge":
+            user.volatiles.pop("mustrecharge", None)
+            self._emit("cant", side.ident(user), "recharge")
+            return False
+        if not self._can_move(side, user, move_id):
+            return False
+
+        if user.status == "slp" and move_id == "sleeptalk":
+            options = [m for m in user.moves if m != "sleeptalk" and "nosleeptalk" not in GEN_DATA.moves[m]["flags"]
+                       and "charge" not in GEN_DATA.moves[m]["flags"]]
+            self._spend_pp(side, user, move_id)
+            self._emit("move", side.ident(user), "Sleep Talk", side.ident(user))
+            if not options:
+                self._emit("-fail", side.ident(user))
+                return False
+            return self._execute(side, self.rng.choice(options), "[from] move: Sleep Talk")
+
+        if user.volatiles.get("charging") == move_id:
+            del user.volatiles["charging"]
+            return self._execute(side, move_id, "[from]lockedmove")
+
+        self._spend_pp(side, user, move_id)
+        if user.item in ("choiceband", "choicespecs", "choicescarf"):
+            user.volatiles["choicelock"] = move_id
+        if move_id not in PROTECT_MOVES:
+            user.protect_streak = 0
+
+        entry = GEN_DATA.moves[move_id]
+        if "charge" in entry["flags"] and not (move_id in ("solarbeam", "solarblade") and self.weather == "SunnyDay"):
+            self._emit("move", side.ident(user), entry["name"], "", "[still]")
+            self._emit("-prepare", side.ident(user), entry["name"])
+            if move_id in CHARGE_BOOSTS:
+                self._boost(user, CHARGE_BOOSTS[move_id])
+            if user.item == "powerherb":
+                self._emit("-enditem", side.ident(user), user.item_name)
+                user.item_name = ""
+                return self._execute(side, move_id, "[from]lockedmove")
+            user.volatiles["charging"] = move_id
+            return False
+        return self._execute(side, move_id)
+
+    def _spend_pp(self, side: SimSide, user: SimPokemon, move_id: str):
+        if move_id in user.pp:
+            cost = 2 if side.foe.active and side.foe.active.ability == "pressure" and not side.foe.active.fainted else 1
+            user.pp[move_id] = max(0, user.pp[move_id] - cost)
+
+    def _execute(self, side: SimSide, move_id: str, *suffix: str) -> bool:
+        user = side.active
+        foe_side = side.foe
+        target = foe_side.active
+        entry = GEN_DATA.moves[move_id]
+        name = entry["name"]
+        user_ident = side.ident(user)
+        targets_foe = entry["target"] in FOE_TARGETS
+
+        if targets_foe and (target is None or target.fainted):
+            self._emit("move", user_ident, name, "", "[notarget]", *suffix)
+            self._emit("-notarget", user_ident)
+            return False
+        target_ident = foe_side.ident(target) if target is not None else ""
+        self._emit("move", user_ident, name, target_ident if targets_foe or entry["target"] == "foeSide" else user_ident, *suffix)
+
+        if move_id in PROTECT_MOVES:
+            chance = 1 / (3 ** user.protect_streak)
+            if foe_side.role in self._moved or self.rng.random() >= chance:
+                user.protect_streak = 0
+                self._emit("-fail", user_ident)
+                return False
+            user.protect_streak += 1
+            user.volatiles["protect"] = True
+            self._emit("-singleturn", user_ident, "Protect")
+            return False
+
+        if targets_foe and "protect" in target.volatiles and "protect" in entry["flags"]:
+            self._emit("-activate", target_ident, "move: Protect")
+            return False
+
+        if move_id in ("suckerpunch", "thunderclap"):
+            foe_action = self._actions.get(foe_side.role)
+            if (foe_side.role in self._moved or foe_action is None or foe_action.kind != "move"
+                    or foe_action.target not in GEN_DATA.moves
+                    or GEN_DATA.moves[foe_action.target]["category"] == "Status"):
+                self._emit("-fail", user_ident)
+                return False
+        if move_id in FIRST_TURN_MOVES and user.active_turns > 0:
+            self._emit("-fail", user_ident)
+            return False
+
+        accuracy = entry["accuracy"]
+        if targets_foe and accuracy is not True and "noguard" not in (user.ability, target.ability):
+            if move_id in ("thunder", "hurricane") and self.weather == "RainDance":
+                accuracy = 100
+            elif move_id in ("thunder", "hurricane") and self.weather == "SunnyDay":
+                accuracy = 50
+            stage = max(-6, min(6, user.boosts.get("accuracy", 0) - target.boosts.get("evasion", 0)))
+            accuracy *= (3 + stage) / 3 if stage >= 0 else 3 / (3 - stage)
+            if self.rng.random() * 100 >= accuracy:
+                self._emit("-miss", user_ident, target_ident)
+                return False
+
+        move_type = self._move_type(user, move_id)
+        if targets_foe and not self._passes_immunity(user, target, entry, move_type):
+            return False
+
+        if entry["category"] == "Status":
+            return self._status_move(side, move_id)
+        return self._damaging_move(side, move_id, move_type)
+
+    def _passes_immunity(self, user: SimPokemon, target: SimPokemon, entry: Dict[str, Any], move_type: str) -> bool:
+        """属性免疫与吸收类特性"""
+        target_ident = self._ident(target)
+        ignore_ability = entry.get("ignoreAbility") or user.ability in ("moldbreaker", "teravolt", "turboblaze")
+        absorb = ABSORB_ABILITIES.get(target.ability)
+        if absorb and absorb[0] == move_type and not ignore_ability:
+            source = f"[from] ability: {target.ability_name}"
+            if absorb[1] == "heal":
+                if not self._heal(target, target.max_hp // 4, source):
+                    self._emit("-immune", target_ident, source)
+            elif absorb[1] == "def2":
+                self._boost(target, {"def": 2}, source=source)
+            elif absorb[1]:
+                self._boost(target, {absorb[1]: 1}, source=source)
+            else:
+                self._emit("-immune", target_ident, source)
+            return False
+        if "bullet" in entry["flags"] and target.ability == "bulletproof" and not ignore_ability:
+            self._emit("-immune", target_ident, f"[from] ability: {target.ability_name}")
+            return False
+
+        respects_types = entry["category"] != "Status" or entry.get("ignoreImmunity") is False
+        if respects_types and entry.get("ignoreImmunity") is not True and move_type != "???":
+            if self._effectiveness(move_type, target) == 0:
+                self._emit("-immune", target_ident)
+                return False
+        if entry["category"] == "Status" and "powder" in entry["flags"] and "GRASS" in target.types:
+            self._emit("-immune", target_ident)
+            return False
+        return True
+
+    def _damaging_move(self, side: SimSide, move_id: str, move_type: str) -> bool:
+        user = side.active
+        foe_side = side.foe
+        target = foe_side.active
+        entry = GEN_DATA.moves[move_id]
+        target_ident = foe_side.ident(target)
+        user_ident = side.ident(user)
+
+        if move_id == "futuresight" or move_id == "doomdesire":
+            if foe_side.role in self.future_sight:
+                self._emit("-fail", user_ident)
+                return False
+            damage = self._calculate_damage(side, user, target, move_id, move_type, 1.0, False)
+            self.future_sight[foe_side.role] = (self.turn + 2, damage)
+            self._emit("-start", user_ident, f"move: {entry['name']}")
+            return False
+
+        effectiveness = 1.0 if move_type == "???" else self._effectiveness(move_type, target)
+        if effectiveness > 1:
+            self._emit("-supereffective", target_ident)
+        elif 0 < effectiveness < 1:
+            self._emit("-resisted", target_ident)
+
+        hits = entry.get("multihit", 1)
+        if isinstance(hits, list):
+            if user.ability == "skilllink":
+                hits = hits[1]
+            elif user.item == "loadeddice":
+                hits = self.rng.choice((4, 5))
+            else:
+                hits = self.rng.choices(MULTIHIT_COUNTS, MULTIHIT_WEIGHTS)[0]
+
+        crit_stage = entry.get("critRatio", 1) - 1
+        if user.ability == "superluck":
+            crit_stage += 1
+        contact = "contact" in entry["flags"] and user.ability != "longreach" and user.item != "protectivepads"
+        total = 0
+        landed = 0
+        for _ in range(hits):
+            if target.fainted or user.fainted:
+                break
+            crit = entry.get("willCrit") or self.rng.random() < CRIT_CHANCES[min(max(crit_stage, 0), 3)]
+            if target.ability in ("battlearmor", "shellarmor"):
+                crit = False
+            damage = self._calculate_damage(side, user, target, move_id, move_type, effectiveness, crit)
+            if damage >= target.hp and target.hp == target.max_hp and target.item == "focussash":
+                damage = target.hp - 1
+                self._emit("-enditem", target_ident, target.item_name)
+                target.item_name = ""
+            damage = min(damage, target.hp)
+            if crit:
+                self._emit("-crit", target_ident)
+            target.hp -= damage
+            total += damage
+            landed += 1
+            self._emit("-damage", target_ident, self._cond(foe_side, target))
+            if contact:
+                self._contact_effects(side, user, target)
+        if hits > 1:
+            self._emit("-hitcount", target_ident, str(landed))
+
+        if entry.get("drain") and total:
+            numerator, denominator = entry["drain"]
+            self._heal(user, max(1, total * numerator // denominator), "[from] drain", f"[of] {target_ident}")
+        if entry.get("recoil") and total and user.ability not in ("rockhead", "magicguard"):
+            numerator, denominator = entry["recoil"]
+            self._damage_direct(user, max(1, total * numerator // denominator), "[from] Recoil")
+        if entry.get("struggleRecoil"):
+            self._damage_direct(user, max(1, user.max_hp // 4), "[from] Recoil")
+        if user.item == "lifeorb" and total and user.ability != "magicguard":
+            self._damage_direct(user, user.max_hp // 10, "[from] item: Life Orb")
+
+        self._secondary_effects(side, user, target, entry)
+
+        if move_id == "knockoff" and target.item and target.item not in UNREMOVABLE_ITEMS and not user.fainted:
+            self._emit("-enditem", target_ident, target.item_name, "[from] move: Knock Off", f"[of] {user_ident}")
+            target.item_name = ""
+        if move_id in ("rapidspin", "mortalspin") and not user.fainted:
+            self._clear_hazards(side)
+        if "recharge" in entry["flags"] and not user.fainted:
+            user.volatiles["mustrecharge"] = True
+            self._emit("-mustrecharge", user_ident)
+        if move_id in PHAZING_MOVES and not target.fainted:
+            self._drag(foe_side)
+        return bool(entry.get("selfSwitch")) and not user.fainted
+
+    def _contact_effects(self, side: SimSide, user: SimPokemon, target: SimPokemon):
+        target_ident = self._ident(target)
+        if user.ability == "magicguard":
+            return
+        if target.item == "rockyhelmet" and not user.fainted:
+            self._damage_direct(user, user.max_hp // 6, "[from] item: Rocky Helmet", f"[of] {target_ident}")
+        if target.ability in ("roughskin", "ironbarbs") and not user.fainted:
+            self._damage_direct(user, user.max_hp // 8, f"[from] ability: {target.ability_name}", f"[of] {target_ident}")
+        if target.ability == "flamebody" and self.rng.random() < 0.3:
+            self._set_status(user, "brn", f"[from] ability: {target.ability_name}", f"[of] {target_ident}")
+        if target.ability == "static" and self.rng.random() < 0.3:
+            self._set_status(user, "par", f"[from] ability: {target.ability_name}", f"[of] {target_ident}")
+        if user.ability == "poisontouch" and not target.fainted and self.rng.random() < 0.3:
+            self._set_status(target, "psn", f"[from] ability: {user.ability_name}", f"[of] {self._ident(user)}")
+
+    def _secondary_effects(self, side: SimSide, user: SimPokemon, target: SimPokemon, entry: Dict[str, Any]):
+        """技能的追加效果与使用者自身的能力变化"""
+        secondaries = entry.get("secondaries") or ([entry["secondary"]] if entry.get("secondary") else [])
+        sheer_force = user.ability == "sheerforce"
+        for secondary in secondaries:
+            if sheer_force:
+                break
+            chance = secondary.get("chance", 100) * (2 if user.ability == "serenegrace" else 1)
+            if self.rng.random() * 100 >= chance:
+                continue
+            if secondary.get("self", {}).get("boosts") and not user.fainted:
+                self._boost(user, secondary["self"]["boosts"])
+            if target.fainted or target.ability == "shielddust" or target.item == "covertcloak":
+                continue
+            if secondary.get("status"):
+                self._set_status(target, secondary["status"])
+            if secondary.get("boosts"):
+                self._boost(target, secondary["boosts"], foe=True)
+            volatile = secondary.get("volatileStatus")
+            if volatile == "flinch" and side.foe.role not in self._moved and target.ability != "innerfocus":
+                target.volatiles["flinch"] = True
+            elif volatile == "saltcure" and "saltcure" not in target.volatiles:
+                target.volatiles["saltcure"] = True
+                self._emit("-start", self._ident(target), "Salt Cure")
+            elif volatile == "healblock" and "healblock" not in target.volatiles:
+                target.volatiles["healblock"] = 2
+                self._emit("-start", self._ident(target), "move: Heal Block")
+
+        if entry.get("self", {}).get("boosts") and not user.fainted:
+            self._boost(user, entry["self"]["boosts"])
+        if entry.get("selfBoost", {}).get("boosts") and not user.fainted:
+            self._boost(user, entry["selfBoost"]["boosts"])
+
+    def _status_move(self, side: SimSide, move_id: str) -> bool:
+        user = side.active
+        foe_side = side.foe
+        target = foe_side.active
+        entry = GEN_DATA.moves[move_id]
+        user_ident = side.ident(user)
+
+        if move_id in HAZARD_LAYERS:
+            layers = foe_side.conditions.get(move_id, 0)
+            if layers >= HAZARD_LAYERS[move_id]:
+                self._emit("-fail", user_ident)
+                return False
+            foe_side.conditions[move_id] = layers + 1
+            self._emit("-sidestart", f"{foe_side.role}: {foe_side.username}", f"move: {entry['name']}")
+        elif move_id in WEATHER_MOVES:
+            if self.weather == WEATHER_MOVES[move_id]:
+                self._emit("-fail", user_ident)
+                return False
+            self.weather = WEATHER_MOVES[move_id]
+            self.weather_turns = WEATHER_TURNS
+            self._emit("-weather", self.weather)
+        elif move_id in ("defog", "tidyup"):
+            self._clear_hazards(side)
+            if move_id == "defog":
+                self._clear_hazards(foe_side)
+        elif move_id == "painsplit":
+            average = (user.hp + target.hp) // 2
+            for mon in (target, user):
+                mon.hp = min(mon.max_hp, average)
+                self._emit("-sethp", self._ident(mon), self._cond(self._side_of(mon), mon), "[from] move: Pain Split")
+        elif move_id == "rest":
+            if user.hp == user.max_hp or user.status == "slp" or user.ability in STATUS_IMMUNE_ABILITIES["slp"]:
+                self._emit("-fail", user_ident)
+                return False
+            user.status = "slp"
+            user.status_turns = 3
+            user.hp = user.max_hp
+            self._emit("-status", user_ident, "slp", "[from] move: Rest")
+            self._emit("-heal", user_ident, self._cond(side, user), "[silent]")
+        elif move_id in ("trick", "switcheroo"):
+            if user.item in UNREMOVABLE_ITEMS or target.item in UNREMOVABLE_ITEMS or not (user.item or target.item):
+                self._emit("-fail", user_ident)
+                return False
+            user.item_name, target.item_name = target.item_name, user.item_name
+            user.volatiles.pop("choicelock", None)
+            target.volatiles.pop("choicelock", None)
+            self._emit("-activate", user_ident, f"move: {entry['name']}", f"[of] {foe_side.ident(target)}")
+            if user.item_name:
+                self._emit("-item", user_ident, user.item_name, f"[from] move: {entry['name']}")
+            if target.item_name:
+                self._emit("-item", foe_side.ident(target), target.item_name, f"[from] move: {entry['name']}")
+        elif move_id in PHAZING_MOVES:
+            if not foe_side.bench:
+                self._emit("-fail", user_ident)
+                return False
+            self._drag(foe_side)
+        elif move_id in ("junglehealing", "lunarblessing"):
+            healed = self._heal(user, user.max_hp // 4)
+            if user.status:
+                self._cure_status(user, "[from] move: Jungle Healing")
+            elif not healed:
+                self._emit("-fail", user_ident)
+        elif move_id in ("healbell", "aromatherapy"):
+            for mon in side.team:
+                mon.status = ""
+            self._emit("-cureteam", user_ident, f"[from] move: {entry['name']}")
+        elif move_id in WEATHER_HEAL_MOVES or entry.get("heal"):
+            if move_id in WEATHER_HEAL_MOVES:
+                fraction = 2 / 3 if self.weather == "SunnyDay" else 1 / 4 if self.weather else 1 / 2
+            else:
+                fraction = entry["heal"][0] / entry["heal"][1]
+            if not self._heal(user, math.ceil(user.max_hp * fraction)):
+                self._emit("-fail", user_ident)
+                return False
+        else:
+            recipient = user if entry["target"] in SELF_TARGETS else target
+            applied = False
+            if entry.get("boosts"):
+                applied = self._boost(recipient, entry["boosts"], foe=recipient is not user) or applied
+            if entry.get("status"):
+                if self._set_status(recipient, entry["status"]):
+                    applied = True
+                else:
+                    self._emit("-fail", self._ident(recipient))
+            volatile = entry.get("volatileStatus")
+            if volatile == "taunt" and "taunt" not in recipient.volatiles and recipient.ability != "oblivious":
+                recipient.volatiles["taunt"] = 3
+                self._emit("-start", self._ident(recipient), "move: Taunt")
+                applied = True
+            if entry.get("self", {}).get("boosts"):
+                applied = self._boost(user, entry["self"]["boosts"]) or applied
+            if not applied and not entry.get("selfSwitch"):
+                return False
+        return bool(entry.get("selfSwitch")) and not user.fainted
+
+    def _clear_hazards(self, side: SimSide):
+        for hazard in list(side.conditions):
+            if hazard in HAZARD_LAYERS:
+                del side.conditions[hazard]
+                self._emit("-sideend", f"{side.role}: {side.username}", f"move: {GEN_DATA.moves[hazard]['name']}")
+
+    def _drag(self, side: SimSide):
+        if side.bench:
+            mon = self.rng.choice(side.bench)
+            self._switch_in(side, mon, drag=True)
+            self._on_entry(side, mon)
+
+    # ------------------------------------------------------------------
+    # 回合结束
+    # ------------------------------------------------------------------
+
+    def _residual(self):
+        """回合末结算：天气、剩饭、异常状态伤害、盐腌、预知未来与计时状态"""
+        if self.weather:
+            self.weather_turns -= 1
+            if self.weather_turns <= 0:
+                self.weather = ""
+                self._emit("-weather", "none")
+            else:
+                self._emit("-weather", self.weather, "[upkeep]")
+
+        for side in self._by_speed(self.sides, lambda s: s.active):
+            mon = side.active
+            if mon is None or mon.fainted:
+                continue
+            magic_guard = mon.ability == "magicguard"
+
+            if self.weather == "Sandstorm" and not magic_guard and not set(mon.types) & {"ROCK", "GROUND", "STEEL"}:
+                self._damage_direct(mon, mon.max_hp // 16, "[from] Sandstorm")
+
+            due = self.future_sight.get(side.role)
+            if due and due[0] <= self.turn:
+                del self.future_sight[side.role]
+                self._emit("-end", side.ident(mon), "move: Future Sight")
+                self._damage_direct(mon, due[1])
+
+            if mon.item == "leftovers":
+                self._heal(mon, mon.max_hp // 16, "[from] item: Leftovers")
+            elif mon.item == "blacksludge":
+                if "POISON" in mon.types:
+                    self._heal(mon, mon.max_hp // 16, "[from] item: Black Sludge")
+                elif not magic_guard:
+                    self._damage_direct(mon, mon.max_hp // 8, "[from] item: Black Sludge")
+
+            if not magic_guard:
+                if mon.status == "brn":
+                    self._damage_direct(mon, max(1, mon.max_hp // 16), "[from] brn")
+                elif mon.status == "psn" and mon.ability != "poisonheal":
+                    self._damage_direct(mon, max(1, mon.max_hp // 8), "[from] psn")
+                elif mon.status == "tox" and mon.ability != "poisonheal":
+                    mon.status_turns = min(15, mon.status_turns + 1)
+                    self._damage_direct(mon, max(1, mon.max_hp * mon.status_turns // 16), "[from] psn")
+                if "saltcure" in mon.volatiles:
+                    divisor = 4 if set(mon.types) & {"WATER", "STEEL"} else 8
+                    self._damage_direct(mon, max(1, mon.max_hp // divisor), "[from] Salt Cure")
+
+            for volatile, label in (("taunt", "move: Taunt"), ("healblock", "move: Heal Block")):
+                if volatile in mon.volatiles:
+                    mon.volatiles[volatile] -= 1
+                    if mon.volatiles[volatile] <= 0:
+                        del mon.volatiles[volatile]
+                        self._emit("-end", side.ident(mon), label)
+
+            mon.volatiles.pop("protect", None)
+            mon.volatiles.pop("flinch", None)
+            mon.active_turns += 1
+        self._emit("upkeep")
+
+
+async def battle_against(p1: Player, p2: Player, n_battles: int = 1,
+                         rng: Optional[random.Random] = None, max_turns: int = MAX_TURNS):
+    """离线版 Player.battle_against：p1 作为挑战方（p1 位置）"""
+    for _ in range(n_battles):
+        seed = rng.getrandbits(32) if rng is not None else None
+        await OfflineBattle(p1, p2, seed=seed, max_turns=max_turns).run()
+
+
+async def play_battle(p1: Player, p2: Player, backend: str = DEFAULT_BACKEND, seed: Optional[int] = None,
+                      max_turns: int = MAX_TURNS) -> str:
+    """进行一局对战（p1 为挑战方），返回 battle_tag；双方的 Battle 都保留在各自的 battles 中
+
+    seed 与 max_turns 只对离线后端生效。showdown 后端下按新增且对手匹配的对局识别本局，
+    因此同一对玩家不能同时调用本函数。
+    """
+    if backend == "offline":
+        battle = OfflineBattle(p1, p2, seed=seed, max_turns=max_turns)
+        await battle.run()
+        return battle.battle_tag
+    if backend == "showdown":
+        known = set(p1.battles)
+        await p1.battle_against(p2, n_battles=1)
+        for battle_tag, battle in p1.battles.items():
+            if battle_tag not in known and battle.opponent_username == p2.username:
+                return battle_tag
+        raise RuntimeError(f"没有找到 {p1.username} 对 {p2.username} 的新对局")
+    raise ValueError(f"未知的对战后端: {backend}，可选: {', '.join(BACKENDS)}")
+
+
+async def offline_cross_evaluate(players: List[Player], n_challenges: int,
+                                 seed: Optional[int] = None) -> Dict[str, Dict[str, Optional[float]]]:
+    """离线版 poke_env.cross_evaluate，返回结构完全相同"""
+    rng = random.Random(seed) if seed is not None else None
+    results: Dict[str, Dict[str, Optional[float]]] = {
+        p1.username: {p2.username: None for p2 in players} for p1 in players
+    }
+    for i, p1 in enumerate(players):
+        for j, p2 in enumerate(players):
+            if j <= i:
+                continue
+            await battle_against(p1, p2, n_battles=n_challenges, rng=rng)
+            results[p1.username][p2.username] = p1.win_rate
+            results[p2.username][p1.username] = p2.win_rate
+            p1.reset_battles()
+            p2.reset_battles()
+    return results
+
+
+async def cross_evaluate(players: List[Player], n_challenges: int, backend: str = DEFAULT_BACKEND,
+                         seed: Optional[int] = None) -> Dict[str, Dict[str, Optional[float]]]:
+    """按所选后端进行循环对战，接口与 poke_env.cross_evaluate 一致"""
+    if backend == "showdown":
+        return await pke.cross_evaluate(players, n_challenges=n_challenges)
+    if backend == "offline":
+        return await offline_cross_evaluate(players, n_challenges, seed=seed)
+    raise ValueError(f"未知的对战后端: {backend}，可选: {', '.join(BACKENDS)}")
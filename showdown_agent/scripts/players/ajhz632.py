@@ -1,13 +1,35 @@
-from poke_env.battle import AbstractBattle, Pokemon, Move
+from poke_env.battle import AbstractBattle, Pokemon, Move, MoveCategory, PokemonType, Status, Weather
+from poke_env.data import GenData
+from poke_env.data.normalize import to_id_str
 from poke_env.player import Player
-from typing import Dict, List, Tuple, Optional, Any, cast
+from poke_env.teambuilder import Teambuilder
+from typing import Dict, List, Tuple, Optional, Any, Iterator, NamedTuple, cast
+import numpy as np
 import random
 import math
 import logging
+from logging.handlers import QueueHandler, QueueListener
 import os
+import sys
 import time
 import json
+import glob
+import copy
+import cProfile
+import pstats
+import sqlite3
+import tempfile
 from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
+import queue
+import atexit
+import asyncio
+import inspect
+from abc import ABC, abstractmethod
 
 # Team configuration
 team = """
@@ -98,6 +120,1186 @@ PRIORITY_WEIGHTS = {
     'other': 0.5
 }
 
+GEN_DATA = GenData.from_gen(9)
+
+def _build_type_chart() -> np.ndarray:
+    """Build the attacker x defender effectiveness table once at import time"""
+    # Indexed by PokemonType.value; slot 0 stands for "no second type" so that
+    # single-typed defenders can be looked up as (type_1, 0). Stellar and ???
+    # keep neutral rows/columns, matching poke_env's damage_multiplier.
+    size = len(PokemonType) + 1
+    chart = np.ones((size, size), dtype=np.float64)
+    for defender, row in GEN_DATA.type_chart.items():
+        for attacker, multiplier in row.items():
+            chart[PokemonType[attacker].value, PokemonType[defender].value] = multiplier
+    chart.setflags(write=False)
+    return chart
+
+TYPE_CHART = _build_type_chart()
+
+def type_index(pokemon_type: Optional[PokemonType]) -> int:
+    """Row/column of a type in TYPE_CHART (0 for no type)"""
+    return pokemon_type.value if pokemon_type is not None else 0
+
+def defender_type_indices(pokemon: Pokemon) -> Tuple[int, int]:
+    """Current (Tera-aware) defensive types of a Pokemon as TYPE_CHART columns"""
+    return type_index(pokemon.type_1), type_index(pokemon.type_2)
+
+def type_effectiveness(move_type: Optional[PokemonType], defender: Pokemon) -> float:
+    """Effectiveness of an attacking type against a Pokemon in one indexed read"""
+    if move_type is None:
+        return 1.0
+    # Stellar Tera Blast is super effective against any terastallized target
+    if move_type is PokemonType.STELLAR and defender.is_terastallized:
+        return 2.0
+    type_1, type_2 = defender_type_indices(defender)
+    row = TYPE_CHART[move_type.value]
+    return float(row[type_1] * row[type_2])
+
+def effectiveness_matrix(move_types: np.ndarray, defender_types: np.ndarray) -> np.ndarray:
+    """Vectorized lookup: (M,) move type indices x (N, 2) defender type pairs -> (M, N)"""
+    rows = TYPE_CHART[move_types]
+    return rows[:, defender_types[:, 0]] * rows[:, defender_types[:, 1]]
+
+# ---------------------------------------------------------------------------
+# Move metadata: classification, weight and flags for the whole gen9 dex
+# ---------------------------------------------------------------------------
+
+# Volatile effects on the target that we count as status moves
+STATUS_VOLATILES = {'taunt', 'confusion', 'encore', 'yawn', 'leechseed', 'torment', 'disable', 'attract', 'curse'}
+
+class MoveInfo(NamedTuple):
+    """Precomputed classification of one move"""
+    category: str
+    weight: float
+    priority: int
+    flags: frozenset
+
+def _classify_entry(move_id: str, entry: Dict) -> str:
+    """Category for a dex entry; MOVE_TYPES entries override the rules for non-damaging moves"""
+    if entry.get('basePower', 0) > 0 or entry.get('damage'):
+        # Priority attacks get their own category so the low-HP finisher bonus applies
+        if entry.get('priority', 0) > 0:
+            return 'priority'
+        if entry.get('category') == 'Physical':
+            return 'physical_attack'
+        elif entry.get('category') == 'Special':
+            return 'special_attack'
+        return 'attack'
+    
+    for move_type, moves in MOVE_TYPES.items():
+        if move_id in moves:
+            return move_type
+    
+    target = entry.get('target')
+    self_boosts = entry.get('boosts') if target in ('self', 'adjacentAllyOrSelf', 'allies') else (entry.get('self') or {}).get('boosts')
+    if 'heal' in entry or (entry.get('flags', {}).get('heal') and target == 'self'):
+        return 'recovery'
+    if entry.get('stallingMove') or entry.get('volatileStatus') == 'substitute':
+        return 'protection'
+    if self_boosts and any(stage > 0 for stage in self_boosts.values()):
+        return 'setup'
+    if entry.get('status') or entry.get('volatileStatus') in STATUS_VOLATILES:
+        return 'status'
+    if target == 'foeSide' or entry.get('sideCondition') or entry.get('weather') or entry.get('terrain') or entry.get('pseudoWeather'):
+        return 'field'
+    return 'other'
+
+def build_move_index() -> Dict[str, MoveInfo]:
+    """Classify every move in the dex once"""
+    index = {}
+    for move_id, entry in GEN_DATA.moves.items():
+        category = _classify_entry(move_id, entry)
+        flags = set(entry.get('flags', {}))
+        if 'heal' in entry or 'drain' in entry:
+            flags.add('heal')
+        if entry.get('priority', 0) > 0:
+            flags.add('priority')
+        if entry.get('sideCondition') and entry.get('target') == 'foeSide':
+            flags.add('hazard')
+        index[move_id] = MoveInfo(category, PRIORITY_WEIGHTS.get(category, 1.0), entry.get('priority', 0), frozenset(flags))
+    return index
+
+MOVE_INDEX = build_move_index()
+UNKNOWN_MOVE = MoveInfo('other', PRIORITY_WEIGHTS['other'], 0, frozenset())
+
+def move_info(move: Move) -> MoveInfo:
+    """O(1) metadata lookup; pseudo-moves outside the dex (e.g. recharge) count as 'other'"""
+    return MOVE_INDEX.get(move.id, UNKNOWN_MOVE)
+
+# ---------------------------------------------------------------------------
+# Damage engine: real stats, 16 damage rolls at once, exact KO probabilities
+# ---------------------------------------------------------------------------
+
+STAT_NAMES = ('hp', 'atk', 'def', 'spa', 'spd', 'spe')
+
+# The 16 random factors applied to every hit (85%..100%)
+DAMAGE_ROLLS = np.arange(85, 101, dtype=np.float64) / 100.0
+
+# Crit chance by crit stage; stage 3+ always crits
+CRIT_CHANCES = (1 / 24, 1 / 8, 1 / 2, 1.0)
+
+# Spread assumed for opponents whose sets we cannot see
+DEFAULT_EVS = (84, 84, 84, 84, 84, 84)
+DEFAULT_IVS = (31, 31, 31, 31, 31, 31)
+
+# Items that boost the base power of one type by 20%
+TYPE_BOOST_ITEMS = {
+    'flameplate': PokemonType.FIRE, 'charcoal': PokemonType.FIRE,
+    'splashplate': PokemonType.WATER, 'mysticwater': PokemonType.WATER,
+    'zapplate': PokemonType.ELECTRIC, 'magnet': PokemonType.ELECTRIC,
+    'meadowplate': PokemonType.GRASS, 'miracleseed': PokemonType.GRASS,
+    'icicleplate': PokemonType.ICE, 'nevermeltice': PokemonType.ICE,
+    'fistplate': PokemonType.FIGHTING, 'blackbelt': PokemonType.FIGHTING,
+    'toxicplate': PokemonType.POISON, 'poisonbarb': PokemonType.POISON,
+    'earthplate': PokemonType.GROUND, 'softsand': PokemonType.GROUND,
+    'skyplate': PokemonType.FLYING, 'sharpbeak': PokemonType.FLYING,
+    'mindplate': PokemonType.PSYCHIC, 'twistedspoon': PokemonType.PSYCHIC,
+    'insectplate': PokemonType.BUG, 'silverpowder': PokemonType.BUG,
+    'stoneplate': PokemonType.ROCK, 'hardstone': PokemonType.ROCK,
+    'spookyplate': PokemonType.GHOST, 'spelltag': PokemonType.GHOST,
+    'dracoplate': PokemonType.DRAGON, 'dragonfang': PokemonType.DRAGON,
+    'dreadplate': PokemonType.DARK, 'blackglasses': PokemonType.DARK,
+    'ironplate': PokemonType.STEEL, 'metalcoat': PokemonType.STEEL,
+    'pixieplate': PokemonType.FAIRY, 'fairyfeather': PokemonType.FAIRY,
+    'silkscarf': PokemonType.NORMAL,
+}
+
+SUN_WEATHERS = {Weather.SUNNYDAY, Weather.DESOLATELAND}
+RAIN_WEATHERS = {Weather.RAINDANCE, Weather.PRIMORDIALSEA}
+
+# Moves that take half the target's current HP (a damageCallback, so no base power or fixed damage)
+HALF_HP_MOVES = frozenset({'superfang', 'ruination', 'naturesmadness'})
+
+def is_damaging(move: Move) -> bool:
+    """Moves the damage engine models: base power, fixed damage (Seismic Toss) or half HP (Super Fang)"""
+    return move.base_power > 0 or bool(move.damage) or move.id in HALF_HP_MOVES
+
+class TeamSet(NamedTuple):
+    """One Pokemon of a Showdown team string"""
+    species: str
+    level: int
+    evs: Tuple[int, ...]
+    ivs: Tuple[int, ...]
+    nature: str
+    item: str
+    ability: str
+    tera_type: Optional[PokemonType]
+
+def parse_team_sets(team_str: str) -> Dict[str, TeamSet]:
+    """Parse a Showdown export into species id -> TeamSet"""
+    sets = {}
+    for tb_mon in Teambuilder.parse_showdown_team(team_str):
+        species = to_id_str(tb_mon.species or tb_mon.nickname)
+        sets[species] = TeamSet(
+            species=species,
+            level=int(tb_mon.level or 100),
+            evs=tuple(int(ev) for ev in tb_mon.evs),
+            ivs=tuple(int(iv) for iv in tb_mon.ivs),
+            nature=to_id_str(tb_mon.nature or 'serious'),
+            item=to_id_str(tb_mon.item or ''),
+            ability=to_id_str(tb_mon.ability or ''),
+            tera_type=PokemonType.from_name(tb_mon.tera_type) if tb_mon.tera_type else None
+        )
+    return sets
+
+def compute_stats(base_stats: Dict[str, int], level: int, evs: Tuple[int, ...], ivs: Tuple[int, ...], nature: str) -> Dict[str, int]:
+    """Gen 3+ stat formula"""
+    nature_mods = GEN_DATA.natures.get(nature, {})
+    stats = {}
+    for stat, ev, iv in zip(STAT_NAMES, evs, ivs):
+        core = (2 * base_stats[stat] + iv + ev // 4) * level // 100
+        if stat == 'hp':
+            stats[stat] = 1 if base_stats[stat] == 1 else core + level + 10
+        else:
+            stats[stat] = int((core + 5) * nature_mods.get(stat, 1))
+    return stats
+
+def boosted_stat(value: int, stage: int) -> int:
+    """Apply a -6..+6 stat stage"""
+    if stage >= 0:
+        return value * (2 + stage) // 2
+    return value * 2 // (2 - stage)
+
+def poke_round(values: np.ndarray) -> np.ndarray:
+    """Showdown rounding: halves round down"""
+    return np.where(values % 1 > 0.5, np.ceil(values), np.floor(values))
+
+class DamageEngine:
+    """Vectorized damage calculator seeded with our own team's real sets"""
+    
+    def __init__(self, team_str: str):
+        self.team_sets = parse_team_sets(team_str)
+        self._stats_cache: Dict[Tuple[str, int, bool], Dict[str, int]] = {}
+
+    def stats_for(self, pokemon: Pokemon, own: bool) -> Dict[str, int]:
+        """Unboosted stats: our sets come from the team string, opponents get DEFAULT_EVS"""
+        key = (pokemon.species, pokemon.level, own)
+        stats = self._stats_cache.get(key)
+        if stats is None:
+            team_set = self.team_sets.get(pokemon.species) if own else None
+            if team_set is not None:
+                stats = compute_stats(pokemon.base_stats, team_set.level, team_set.evs, team_set.ivs, team_set.nature)
+            else:
+                stats = compute_stats(pokemon.base_stats, pokemon.level, DEFAULT_EVS, DEFAULT_IVS, 'serious')
+            self._stats_cache[key] = stats
+        return stats
+
+    def item_for(self, pokemon: Pokemon, own: bool) -> str:
+        item = pokemon.item
+        if (not item or item == 'unknown_item') and own:
+            team_set = self.team_sets.get(pokemon.species)
+            item = team_set.item if team_set else ''
+        return '' if item == 'unknown_item' else (item or '')
+
+    @staticmethod
+    def move_type(move: Move, attacker: Pokemon, item: str) -> PokemonType:
+        """Move type after type-changing effects we model (Judgment, Tera Blast)"""
+        if move.id == 'judgment' and item.endswith('plate'):
+            return TYPE_BOOST_ITEMS.get(item, move.type)
+        if move.id == 'terablast' and attacker.is_terastallized and attacker.tera_type is not None:
+            return attacker.tera_type
+        return move.type
+
+    @staticmethod
+    def stab_modifier(move_type: PokemonType, attacker: Pokemon) -> float:
+        original_types = attacker.original_types
+        if attacker.is_terastallized and attacker.tera_type is PokemonType.STELLAR:
+            stab = 2.0 if move_type in original_types else 4915 / 4096
+        elif attacker.is_terastallized and move_type is attacker.tera_type:
+            stab = 2.0 if move_type in original_types else 1.5
+        elif move_type in original_types:
+            stab = 1.5
+        else:
+            return 1.0
+        if attacker.ability == 'adaptability':
+            stab = 2.25 if stab == 2.0 else 2.0
+        return stab
+
+    def damage_row(self, move: Move, attacker: Pokemon, defender: Pokemon, battle: Optional[AbstractBattle], attacker_own: bool) -> Tuple[float, ...]:
+        """Scalar part of the formula for one (move, attacker, defender)
+
+        Returns (base damage, crit base damage, multiplier, defender max HP, crit chance, fixed)
+        where the base damages already include weather, the multiplier folds
+        STAB/effectiveness/burn/items/hit count (applied after the roll), and
+        fixed marks moves such as Seismic Toss or Super Fang that do not roll.
+        """
+        attacker_stats = self.stats_for(attacker, attacker_own)
+        defender_stats = self.stats_for(defender, not attacker_own)
+        attacker_item = self.item_for(attacker, attacker_own)
+        defender_item = self.item_for(defender, not attacker_own)
+        defender_hp = float(defender_stats['hp'])
+        
+        move_type = self.move_type(move, attacker, attacker_item)
+        effectiveness = type_effectiveness(move_type, defender)
+        if effectiveness == 0:
+            return 0.0, 0.0, 0.0, defender_hp, 0.0, 0.0
+        
+        # Fixed damage moves ignore stats and effectiveness multipliers
+        if move.id in HALF_HP_MOVES:
+            fixed = float(max(1, math.floor(defender.current_hp_fraction * defender_hp / 2)))
+            return fixed, fixed, 1.0, defender_hp, 0.0, 1.0
+        if move.damage:
+            fixed = float(attacker.level if move.damage == 'level' else move.damage)
+            return fixed, fixed, 1.0, defender_hp, 0.0, 1.0
+        
+        base_power = move.base_power
+        if TYPE_BOOST_ITEMS.get(attacker_item) is move_type:
+            base_power = int(poke_round(np.float64(base_power * 4915 / 4096)))
+        
+        # Offensive/defensive stats and their stages
+        physical = move.category is MoveCategory.PHYSICAL
+        if move.id == 'photongeyser':
+            physical = boosted_stat(attacker_stats['atk'], attacker.boosts['atk']) > boosted_stat(attacker_stats['spa'], attacker.boosts['spa'])
+        offense_source, offense_stats = (defender, defender_stats) if move.use_target_offensive else (attacker, attacker_stats)
+        offense_stat = move.entry.get('overrideOffensiveStat') or ('atk' if physical else 'spa')
+        defensive_physical = physical if move.id == 'photongeyser' else move.defensive_category is MoveCategory.PHYSICAL
+        defense_stat = 'def' if defensive_physical else 'spd'
+        
+        attack = offense_stats[offense_stat]
+        defense = defender_stats[defense_stat]
+        if attacker_item == 'choiceband' and offense_stat == 'atk':
+            attack = attack * 3 // 2
+        elif attacker_item == 'choicespecs' and offense_stat == 'spa':
+            attack = attack * 3 // 2
+        if defender_item == 'assaultvest' and defense_stat == 'spd':
+            defense = defense * 3 // 2
+        if battle is not None and defense_stat == 'spd' and Weather.SANDSTORM in battle.weather and PokemonType.ROCK in defender.types:
+            defense = defense * 3 // 2
+        if battle is not None and defense_stat == 'def' and Weather.SNOWSCAPE in battle.weather and PokemonType.ICE in defender.types:
+            defense = defense * 3 // 2
+        
+        attack_stage = offense_source.boosts[offense_stat]
+        defense_stage = defender.boosts[defense_stat]
+        level_term = 2 * attacker.level // 5 + 2
+        
+        # Weather scales the base damage before the crit and the random roll, as in Showdown
+        weather = 1.0
+        if battle is not None:
+            if battle.weather.keys() & SUN_WEATHERS:
+                weather = 1.5 if move_type is PokemonType.FIRE else (0.5 if move_type is PokemonType.WATER else 1.0)
+            elif battle.weather.keys() & RAIN_WEATHERS:
+                weather = 1.5 if move_type is PokemonType.WATER else (0.5 if move_type is PokemonType.FIRE else 1.0)
+        
+        def base_damage(atk_stage: int, def_stage: int) -> float:
+            a = boosted_stat(attack, atk_stage)
+            d = max(1, boosted_stat(defense, def_stage))
+            damage = float(level_term * base_power * a // d // 50 + 2)
+            return float(poke_round(np.float64(damage * weather))) if weather != 1.0 else damage
+        
+        # Crits ignore our negative and the target's positive stages
+        normal_base = base_damage(attack_stage, defense_stage)
+        crit_base = base_damage(max(attack_stage, 0), min(defense_stage, 0)) * 1.5
+        
+        multiplier = self.stab_modifier(move_type, attacker) * effectiveness
+        if physical and attacker.status is Status.BRN and attacker.ability != 'guts':
+            multiplier *= 0.5
+        if attacker_item == 'lifeorb':
+            multiplier *= 5324 / 4096
+        elif attacker_item == 'expertbelt' and effectiveness > 1:
+            multiplier *= 4915 / 4096
+        multiplier *= move.expected_hits
+        
+        if move.entry.get('willCrit'):
+            crit_chance = 1.0
+        else:
+            crit_chance = CRIT_CHANCES[min(max(move.crit_ratio - 1, 0), 3)]
+        return normal_base, crit_base, multiplier, defender_hp, crit_chance, 0.0
+
+    @staticmethod
+    def rolls(rows: List[Tuple[float, ...]]) -> Tuple[np.ndarray, np.ndarray]:
+        """All 16 rolls for every row at once: (R, 16) normal and (R, 16) crit damage"""
+        table = np.asarray(rows, dtype=np.float64).reshape(-1, 6)
+        multiplier = table[:, 2:3]
+        fixed = table[:, 5:6] > 0
+        normal = poke_round(np.floor(table[:, 0:1] * DAMAGE_ROLLS) * multiplier)
+        crit = poke_round(np.floor(np.floor(table[:, 1:2]) * DAMAGE_ROLLS) * multiplier)
+        # Fixed-damage rows do not roll; every damaging hit does at least 1
+        normal = np.where(fixed, table[:, 0:1], np.maximum(normal, 1.0))
+        crit = np.where(fixed, table[:, 1:2], np.maximum(crit, 1.0))
+        immune = multiplier == 0.0
+        return np.where(immune, 0.0, normal), np.where(immune, 0.0, crit)
+
+    @staticmethod
+    def ko_within(normal: np.ndarray, crit: np.ndarray, crit_chance: float, hp: float, max_hits: int = 3) -> np.ndarray:
+        """Exact P(KO within k hits) for k = 1..max_hits from the 32-outcome hit distribution"""
+        values = np.concatenate((normal, crit))
+        weights = np.concatenate((np.full(normal.size, (1 - crit_chance) / normal.size), np.full(crit.size, crit_chance / crit.size)))
+        order = np.argsort(values)
+        values, weights = values[order], weights[order]
+        # P(one hit >= t) for any threshold t via the sorted tail sums
+        tail = np.concatenate((np.cumsum(weights[::-1])[::-1], [0.0]))
+        
+        probabilities = np.empty(max_hits)
+        totals, total_weights = np.zeros(1), np.ones(1)
+        for hit in range(max_hits):
+            # Condition the last hit on everything before it instead of expanding it
+            needed = hp - totals
+            probabilities[hit] = np.dot(total_weights, tail[np.searchsorted(values, needed, side='left')])
+            if hit + 1 < max_hits:
+                totals = np.add.outer(totals, values).ravel()
+                total_weights = np.multiply.outer(total_weights, weights).ravel()
+        return np.minimum(probabilities, 1.0)
+
+    def analyze(self, move: Move, attacker: Pokemon, defender: Pokemon, battle: Optional[AbstractBattle], attacker_own: bool) -> Dict:
+        """Damage summary in the defender's HP units (percent for opponents)"""
+        row = self.damage_row(move, attacker, defender, battle, attacker_own)
+        normal, crit = self.rolls([row])
+        crit_chance, real_max_hp = row[4], row[3]
+        
+        # Opponents report HP as a percentage; rescale to whatever units we see
+        scale = defender.max_hp / real_max_hp if defender.max_hp else 1.0
+        normal, crit = normal[0] * scale, crit[0] * scale
+        hp = max(defender.current_hp or 0, 1e-9)
+        
+        ko_hits = self.ko_within(normal, crit, crit_chance, hp)
+        accuracy = float(move.accuracy) if move.accuracy is not True else 1.0
+        return {
+            'ko_prob': float(accuracy * ko_hits[0]),
+            'ko_hits': ko_hits,
+            'mean_damage': float((1 - crit_chance) * normal.mean() + crit_chance * crit.mean()),
+            'min_damage': float(normal[0]),
+            'max_damage': float(crit[-1] if crit_chance >= 1.0 else normal[-1])
+        }
+
+    def analyze_matrix(self, moves: List[Move], attacker: Pokemon, defenders: List[Pokemon], battle: Optional[AbstractBattle], attacker_own: bool) -> Dict[str, np.ndarray]:
+        """analyze for every move x defender at once: ko_prob, mean_damage, min_damage and max_damage, each (M, D)"""
+        shape = (len(moves), len(defenders))
+        if not moves or not defenders:
+            return {name: np.zeros(shape) for name in ('ko_prob', 'mean_damage', 'min_damage', 'max_damage')}
+        
+        rows = [self.damage_row(move, attacker, defender, battle, attacker_own) for move in moves for defender in defenders]
+        normal, crit = self.rolls(rows)
+        table = np.asarray(rows, dtype=np.float64)
+        scale = np.tile([defender.max_hp or 0.0 for defender in defenders], len(moves)) / table[:, 3]
+        scale = np.where(scale > 0, scale, 1.0)[:, None]
+        hp = np.tile([max(defender.current_hp or 0, 1e-9) for defender in defenders], len(moves))[:, None]
+        normal, crit = normal * scale, crit * scale
+        
+        crit_chance = table[:, 4]
+        ko = (1 - crit_chance) * (normal >= hp).mean(axis=1) + crit_chance * (crit >= hp).mean(axis=1)
+        mean = (1 - crit_chance) * normal.mean(axis=1) + crit_chance * crit.mean(axis=1)
+        highest = np.where(crit_chance >= 1.0, crit[:, -1], normal[:, -1])
+        
+        # Status moves never deal damage; accuracy only gates the KO
+        damaging = np.repeat([is_damaging(move) for move in moves], len(defenders))
+        accuracy = np.repeat([float(move.accuracy) if move.accuracy is not True else 1.0 for move in moves], len(defenders))
+        return {
+            'ko_prob': np.where(damaging, accuracy * ko, 0.0).reshape(shape),
+            'mean_damage': np.where(damaging, mean, 0.0).reshape(shape),
+            'min_damage': np.where(damaging, normal[:, 0], 0.0).reshape(shape),
+            'max_damage': np.where(damaging, highest, 0.0).reshape(shape)
+        }
+
+class DamageCache:
+    """Turn-scoped memo of damage calculations, one bucket per battle
+    
+    Shared by calculate_damage and the batched move scoring, so an entry may
+    come from either DamageEngine.analyze or analyze_matrix; both carry
+    ko_prob, mean_damage, min_damage and max_damage.
+    """
+    
+    def __init__(self):
+        # battle_tag -> (turn, {key: damage_info})
+        self._buckets: Dict[str, Tuple[int, Dict[tuple, Dict]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(move: Move, attacker: Pokemon, target: Pokemon) -> tuple:
+        """Everything calculate_damage depends on that can change within a battle"""
+        return (
+            move.id, move.base_power,
+            attacker.species, attacker.current_hp, attacker.is_terastallized, tuple(attacker.boosts.values()),
+            target.species, target.current_hp, target.is_terastallized, tuple(target.boosts.values())
+        )
+
+    def _bucket(self, battle: AbstractBattle) -> Dict[tuple, Dict]:
+        """Entries for the battle's current turn, dropping stale turns"""
+        bucket = self._buckets.get(battle.battle_tag)
+        if bucket is None or bucket[0] != battle.turn:
+            bucket = (battle.turn, {})
+            self._buckets[battle.battle_tag] = bucket
+        return bucket[1]
+
+    def get(self, battle: AbstractBattle, key: tuple) -> Optional[Dict]:
+        entry = self._bucket(battle).get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, battle: AbstractBattle, key: tuple, damage_info: Dict):
+        self._bucket(battle)[key] = damage_info
+
+    def invalidate(self, battle_tag: str):
+        """Forget a battle entirely (called when it finishes)"""
+        self._buckets.pop(battle_tag, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups > 0 else 0.0,
+            'battles': len(self._buckets),
+            'entries': sum(len(entries) for _, entries in self._buckets.values())
+        }
+
+# ---------------------------------------------------------------------------
+# Logging: a background thread batches every agent's log file writes
+# ---------------------------------------------------------------------------
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_BATCH_SIZE = 64  # buffered lines per file before they are written
+LOG_FLUSH_INTERVAL = 1.0  # seconds; idle buffers are written at least this often
+
+# One JSON record per decision, one trace file per process under results/traces
+TRACE_DECISIONS = True
+
+class FileQueueHandler(QueueHandler):
+    """Queues records stamped with the file they belong to
+    
+    Structured handlers leave the message (a dict) untouched so the writer
+    thread can serialize it as one JSON line.
+    """
+    
+    def __init__(self, log_queue: queue.SimpleQueue, path: str, structured: bool = False):
+        super().__init__(log_queue)
+        self.path = path
+        self.structured = structured
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if self.structured:
+            record = copy.copy(record)
+            record.log_structured = True
+        else:
+            record = super().prepare(record)
+        record.log_path = self.path
+        return record
+
+class BatchingFileRouter(logging.Handler):
+    """Listener-side handler: buffers lines per file and appends them in batches
+    
+    Besides log lines it handles control records: 'tick' writes every buffer,
+    'close' writes one file's buffer and forgets it, and 'rename' does the same
+    before moving the file.
+    """
+    
+    def __init__(self, batch_size: int = LOG_BATCH_SIZE):
+        super().__init__()
+        self.setFormatter(logging.Formatter(LOG_FORMAT))
+        self.batch_size = batch_size
+        self._buffers: Dict[str, List[str]] = {}
+
+    def emit(self, record: logging.LogRecord):
+        control = getattr(record, 'log_control', None)
+        if control == 'tick':
+            self.flush()
+        elif control is None:
+            buffer = self._buffers.setdefault(record.log_path, [])
+            if getattr(record, 'log_structured', False):
+                buffer.append(json.dumps(record.msg, separators=(',', ':')))
+            else:
+                buffer.append(self.format(record))
+            if len(buffer) >= self.batch_size:
+                self._write(record.log_path)
+        else:
+            self._write(record.log_path)
+            if control == 'rename':
+                self._rename(record.log_path, record.new_path)
+
+    def flush(self):
+        for path in list(self._buffers):
+            self._write(path)
+
+    def _write(self, path: str):
+        lines = self._buffers.pop(path, None)
+        if not lines:
+            return
+        try:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        except OSError as e:
+            logging.getLogger(__name__).error(f"Failed to write log file {path}: {e}")
+
+    @staticmethod
+    def _rename(path: str, new_path: str):
+        if not os.path.exists(path):
+            return
+        try:
+            os.rename(path, new_path)
+        except OSError as e:
+            logging.getLogger(__name__).error(f"Failed to rename log file: {e}")
+
+class TickingQueueListener(QueueListener):
+    """QueueListener that wakes up periodically so idle buffers still get written"""
+    
+    def dequeue(self, block: bool) -> Optional[logging.LogRecord]:
+        try:
+            return self.queue.get(block, LOG_FLUSH_INTERVAL)
+        except queue.Empty:
+            return logging.makeLogRecord({'log_control': 'tick'})
+
+class LogPipeline:
+    """Process-wide QueueHandler/QueueListener pair behind every agent's loggers
+    
+    Logging calls on the event loop only enqueue; file I/O happens on the
+    listener thread. Loggers are not registered with the logging module, so a
+    finished battle's logger is garbage collected with its owner.
+    """
+    
+    def __init__(self):
+        self.queue = queue.SimpleQueue()
+        self.router = BatchingFileRouter()
+        self._listener: Optional[TickingQueueListener] = None
+        self._lock = threading.Lock()
+
+    def logger(self, name: str, path: str, level: int, structured: bool = False) -> logging.Logger:
+        with self._lock:
+            if self._listener is None:
+                self._listener = TickingQueueListener(self.queue, self.router)
+                self._listener.start()
+        logger = logging.Logger(name, level)
+        logger.addHandler(FileQueueHandler(self.queue, path, structured))
+        return logger
+
+    def close(self, path: str):
+        """Write out a file's pending lines"""
+        self.queue.put_nowait(logging.makeLogRecord({'log_control': 'close', 'log_path': path}))
+
+    def rename(self, path: str, new_path: str):
+        """Write out a file's pending lines, then rename it"""
+        self.queue.put_nowait(logging.makeLogRecord({'log_control': 'rename', 'log_path': path, 'new_path': new_path}))
+
+    def stop(self):
+        with self._lock:
+            listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+        self.router.flush()
+
+LOG_PIPELINE = LogPipeline()
+atexit.register(LOG_PIPELINE.stop)
+
+# ---------------------------------------------------------------------------
+# Performance stats: append-only SQLite store shared across agents and processes
+# ---------------------------------------------------------------------------
+
+PERFORMANCE_DB = 'performance.sqlite3'
+PERFORMANCE_SUMMARY = 'simplified_performance.json'
+# Seconds between JSON summary refreshes on the writer thread
+PERFORMANCE_EXPORT_INTERVAL = 30.0
+
+class PerformanceStore:
+    """One row per finished battle in a SQLite database in WAL mode
+    
+    Inserts run on a single background thread so the event loop never waits
+    on disk, and WAL lets any number of processes append and query at once.
+    Summaries are computed from the rows on demand; the writer thread also
+    refreshes the JSON summary at most every export_interval seconds, so a
+    crashed run leaves it at most one interval behind the database.
+    """
+    
+    SCHEMA = """CREATE TABLE IF NOT EXISTS battles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        agent TEXT NOT NULL,
+        battle_tag TEXT NOT NULL,
+        opponent TEXT,
+        won INTEGER,
+        turns INTEGER NOT NULL,
+        decisions INTEGER NOT NULL,
+        total_decision_time REAL NOT NULL,
+        max_decision_time REAL NOT NULL,
+        pid INTEGER NOT NULL,
+        finished_at TEXT NOT NULL
+    )"""
+    COLUMNS = ('agent', 'battle_tag', 'opponent', 'won', 'turns', 'decisions', 'total_decision_time', 'max_decision_time', 'pid', 'finished_at')
+    
+    def __init__(self, path: str, export_interval: float = PERFORMANCE_EXPORT_INTERVAL):
+        self.path = path
+        self.summary_path = os.path.join(os.path.dirname(path), PERFORMANCE_SUMMARY)
+        self.export_interval = export_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='performance-store')
+        self._connection: Optional[sqlite3.Connection] = None
+        self._last_export = float('-inf')
+
+    def _connect(self) -> sqlite3.Connection:
+        # Only the writer thread uses its connection, but close() runs on the caller's thread
+        connection = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(self.SCHEMA)
+        return connection
+
+    def record(self, row: Dict[str, Any]) -> Future:
+        """Queue one battle row for insertion"""
+        return self._executor.submit(self._insert, row)
+
+    def _insert(self, row: Dict[str, Any]):
+        if self._connection is None:
+            self._connection = self._connect()
+        columns = ', '.join(self.COLUMNS)
+        placeholders = ', '.join(f':{column}' for column in self.COLUMNS)
+        with self._connection:
+            self._connection.execute(f'INSERT INTO battles ({columns}) VALUES ({placeholders})', row)
+        
+        if time.monotonic() - self._last_export >= self.export_interval:
+            try:
+                self._write_summary(self.summary_path)
+            except (OSError, sqlite3.Error) as e:
+                logging.getLogger(__name__).error(f"Failed to export performance summary: {e}")
+
+    def flush(self):
+        """Wait until every queued row is written"""
+        try:
+            self._executor.submit(lambda: None).result()
+        except RuntimeError:
+            pass  # Already shut down at interpreter exit, which drains the queue
+
+    def summary(self, agent: Optional[str] = None) -> Dict[str, Any]:
+        """Win rate, decision time and turn statistics over every stored battle"""
+        query = 'SELECT won, turns, decisions, total_decision_time, max_decision_time FROM battles'
+        params: Tuple = ()
+        if agent is not None:
+            query += ' WHERE agent = ?'
+            params = (agent,)
+        connection = self._connect()
+        try:
+            rows = connection.execute(query, params).fetchall()
+        finally:
+            connection.close()
+        
+        if not rows:
+            return {'total_battles': 0, 'wins': 0, 'losses': 0, 'win_rate': 0.0, 'total_turns': 0, 'avg_decision_time': 0.0}
+        table = np.array(rows, dtype=np.float64)
+        won, turns, decisions, total_time, max_time = table.T
+        wins = int(np.sum(won == 1))
+        total_decisions = int(decisions.sum())
+        per_battle_time = total_time[decisions > 0] / decisions[decisions > 0]
+        p50, p95, p99 = np.percentile(per_battle_time, [50, 95, 99]) if per_battle_time.size else (0.0, 0.0, 0.0)
+        return {
+            'total_battles': len(rows),
+            'wins': wins,
+            'losses': int(np.sum(won == 0)),
+            'win_rate': wins / len(rows),
+            'total_turns': total_decisions,
+            'avg_decision_time': float(total_time.sum() / total_decisions) if total_decisions > 0 else 0.0,
+            'battle_decision_time_p50': float(p50),
+            'battle_decision_time_p95': float(p95),
+            'battle_decision_time_p99': float(p99),
+            'max_decision_time': float(max_time.max()),
+            'avg_battle_turns': float(turns.mean()),
+            'battle_turns_p95': float(np.percentile(turns, 95))
+        }
+
+    def agents(self) -> List[str]:
+        connection = self._connect()
+        try:
+            return [agent for (agent,) in connection.execute('SELECT DISTINCT agent FROM battles ORDER BY agent')]
+        finally:
+            connection.close()
+
+    def export_json(self, path: str):
+        """Atomically write per-agent and overall summaries to a JSON file"""
+        self.flush()
+        self._write_summary(path)
+
+    def _write_summary(self, path: str):
+        stats = self.summary()
+        stats['agents'] = {agent: self.summary(agent) for agent in self.agents()}
+        stats['last_updated'] = datetime.now().isoformat()
+        directory = os.path.dirname(path) or '.'
+        fd, temp_path = tempfile.mkstemp(prefix='.performance_', suffix='.json', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(stats, f, indent=2, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self._last_export = time.monotonic()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+# One store per database file in this process
+_PERFORMANCE_STORES: Dict[str, PerformanceStore] = {}
+
+def performance_store(path: str) -> PerformanceStore:
+    path = os.path.abspath(path)
+    store = _PERFORMANCE_STORES.get(path)
+    if store is None:
+        store = _PERFORMANCE_STORES[path] = PerformanceStore(path)
+    return store
+
+@atexit.register
+def _close_performance_stores():
+    """Bring the JSON summary up to date with the last battles before exit"""
+    for store in _PERFORMANCE_STORES.values():
+        try:
+            store.export_json(store.summary_path)
+        except (OSError, sqlite3.Error) as e:
+            logging.getLogger(__name__).error(f"Failed to export performance summary: {e}")
+        store.close()
+
+def describe_action(action) -> Dict[str, Any]:
+    """Structured form of an order, Move or Pokemon: {'kind': 'move'|'switch'|'other', 'id': ...}"""
+    order = getattr(action, 'order', action)
+    if isinstance(order, Move):
+        description = {'kind': 'move', 'id': order.id}
+    elif isinstance(order, Pokemon):
+        description = {'kind': 'switch', 'id': order.species}
+    else:
+        description = {'kind': 'other', 'id': str(action)}
+    if getattr(action, 'terastallize', False):
+        description['tera'] = True
+    return description
+
+def read_decision_trace(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream decision records from a trace file, or from every trace file in a directory"""
+    if os.path.isdir(path):
+        paths = sorted(glob.glob(os.path.join(path, 'decision_trace_*.jsonl')))
+    else:
+        paths = [path]
+    for trace_path in paths:
+        with open(trace_path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A record cut short by a crash
+
+# ---------------------------------------------------------------------------
+# Decision latency: per-phase HDR-style histograms, per battle and per process
+# ---------------------------------------------------------------------------
+
+# Phases of choose_move; 'total' is the whole decision
+DECISION_PHASES = ('setup', 'damage', 'evaluation', 'order', 'logging', 'total')
+LATENCY_SUB_BUCKETS = 16  # linear buckets per power of two, about 6% resolution
+LATENCY_MAX_EXPONENT = 40  # 2**40 microseconds is far beyond any turn timer
+
+class LatencyHistogram:
+    """Log-linear (HDR-style) histogram of durations, recorded in microseconds
+    
+    Every power of two is split into LATENCY_SUB_BUCKETS linear buckets, so a
+    record is O(1) and quantiles keep the same relative precision at any scale.
+    """
+    
+    SIZE = LATENCY_MAX_EXPONENT * LATENCY_SUB_BUCKETS
+    
+    def __init__(self):
+        self.counts = np.zeros(self.SIZE, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def bucket(micros: float) -> int:
+        if micros < 1.0:
+            return 0
+        mantissa, exponent = math.frexp(micros)  # micros = mantissa * 2**exponent, mantissa in [0.5, 1)
+        index = (exponent - 1) * LATENCY_SUB_BUCKETS + int((2 * mantissa - 1) * LATENCY_SUB_BUCKETS)
+        return min(index, LatencyHistogram.SIZE - 1)
+
+    @staticmethod
+    def bucket_upper(index: int) -> float:
+        """Largest value (in microseconds) that falls into a bucket"""
+        exponent, sub_bucket = divmod(index, LATENCY_SUB_BUCKETS)
+        return 2.0 ** exponent * (1 + (sub_bucket + 1) / LATENCY_SUB_BUCKETS)
+
+    def record(self, seconds: float):
+        micros = seconds * 1e6
+        self.counts[self.bucket(micros)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: 'LatencyHistogram'):
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentiles(self, qs: Tuple[float, ...] = (50, 95, 99)) -> List[float]:
+        """Quantiles in seconds, each at most one bucket above the true value"""
+        if self.count == 0:
+            return [0.0] * len(qs)
+        cumulative = np.cumsum(self.counts)
+        ranks = np.maximum(np.ceil(np.asarray(qs) / 100.0 * self.count), 1)
+        indices = np.searchsorted(cumulative, ranks)
+        return [min(self.bucket_upper(int(index)) / 1e6, self.max) for index in indices]
+
+    def summary(self) -> Dict[str, float]:
+        p50, p95, p99 = self.percentiles((50, 95, 99))
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': p50,
+            'p95': p95,
+            'p99': p99,
+            'max': self.max
+        }
+
+class LatencyStats:
+    """One LatencyHistogram per decision phase"""
+    
+    def __init__(self):
+        self.histograms = {phase: LatencyHistogram() for phase in DECISION_PHASES}
+
+    def record(self, phases: Dict[str, float]):
+        for phase, seconds in phases.items():
+            self.histograms[phase].record(seconds)
+
+    def merge(self, other: 'LatencyStats'):
+        for phase, histogram in other.histograms.items():
+            self.histograms[phase].merge(histogram)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {phase: histogram.summary() for phase, histogram in self.histograms.items() if histogram.count}
+
+class PhaseTimer:
+    """Splits one decision's wall time into phases
+    
+    mark(phase) charges the time since the previous mark to that phase.
+    Nested work such as order creation is charged with add() and excluded
+    from whichever phase encloses it.
+    """
+    
+    __slots__ = ('start', 'phases', '_last', '_nested')
+    
+    def __init__(self):
+        self.start = self._last = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self._nested = 0.0
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - self._last - self._nested)
+        self._last = now
+        self._nested = 0.0
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        self._nested += seconds
+
+    def finish(self) -> Dict[str, float]:
+        self.phases['total'] = time.perf_counter() - self.start
+        return self.phases
+
+# Every decision made in this process, across agents and battles
+PROCESS_LATENCY = LatencyStats()
+
+def process_latency_summary() -> Dict[str, Dict[str, float]]:
+    """Per-phase count/mean/p50/p95/p99/max (seconds) for this process"""
+    return PROCESS_LATENCY.summary()
+
+# ---------------------------------------------------------------------------
+# Profiling: opt-in, sampled profiling of choose_move
+# ---------------------------------------------------------------------------
+
+# None disables profiling; 'cprofile' or 'sampling' profile PROFILE_SAMPLE_RATE of decisions
+PROFILE_MODES = (None, 'cprofile', 'sampling')
+PROFILE_MODE = None
+PROFILE_SAMPLE_RATE = 0.05
+# Minimum seconds between stack samples; greedy decisions take well under a millisecond
+PROFILE_INTERVAL = 0.0001
+
+class DecisionProfiler(ABC):
+    """Profiles the decisions it is handed and accumulates them across battles
+    
+    Every mode exports collapsed stacks ('frame;frame;frame weight' per line)
+    for flamegraph.pl or speedscope, so both modes give the same artifact.
+    A decision that returns a coroutine (rollout mode) is profiled each time
+    the coroutine resumes, so time spent waiting on the event loop, when
+    other battles run, is not counted.
+    """
+    
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.decisions = 0
+        self._lock = threading.Lock()
+
+    def profile_decision(self, fn, *args):
+        """Profile one decision fn(*args)"""
+        self.decisions += 1
+        result = self.run(fn, *args)
+        if inspect.iscoroutine(result):
+            return ProfiledCoroutine(self, result)
+        return result
+
+    @abstractmethod
+    def run(self, fn, *args):
+        """Call fn(*args), profiling it"""
+
+    @abstractmethod
+    def collapsed_stacks(self) -> Dict[str, int]:
+        """Root-to-leaf stack -> weight for everything profiled so far"""
+
+    @staticmethod
+    def frame_name(name: str, filename: str, lineno: int) -> str:
+        return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+    @staticmethod
+    def root_code(fn):
+        """Code object the profiled stacks start at; a coroutine's send resumes its own code"""
+        return getattr(fn, '__code__', None) or getattr(getattr(fn, '__self__', None), 'cr_code', None)
+
+    def export(self) -> Optional[str]:
+        """Atomically (re)write this process's cumulative collapsed stacks; returns their path"""
+        if not self.decisions:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f'choose_move_{os.getpid()}.collapsed')
+        self._replace(path, self._write)
+        return path
+
+    @staticmethod
+    def _replace(path: str, write):
+        temp_path = f'{path}.tmp'
+        write(temp_path)
+        os.replace(temp_path, path)
+
+    def _write(self, path: str):
+        stacks = sorted(self.collapsed_stacks().items())
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, weight in stacks:
+                f.write(f"{stack} {weight}\n")
+
+class CProfileProfiler(DecisionProfiler):
+    """Deterministic profile of sampled decisions
+    
+    Exported as a pstats .prof file and as collapsed stacks weighted in
+    microseconds. cProfile only records caller -> callee totals, so a
+    function's time is split over the paths that reach it in proportion to
+    the time each caller spent calling it.
+    """
+    
+    def __init__(self, output_dir: str):
+        super().__init__(output_dir)
+        # enable/disable accumulates into the same profile across decisions
+        self.profile = cProfile.Profile()
+        self._roots = set()
+
+    def run(self, fn, *args):
+        code = self.root_code(fn)
+        if code is not None:
+            self._roots.add((code.co_filename, code.co_firstlineno, code.co_name))
+        self.profile.enable()
+        try:
+            return fn(*args)
+        finally:
+            self.profile.disable()
+
+    def export(self) -> Optional[str]:
+        path = super().export()
+        if path is not None:
+            self._replace(path[:-len('.collapsed')] + '.prof', self.profile.dump_stats)
+        return path
+
+    def collapsed_stacks(self) -> Dict[str, int]:
+        stats = pstats.Stats(self.profile).stats
+        callees: Dict[tuple, List[tuple]] = {}
+        for func, (_, _, _, _, callers) in stats.items():
+            for caller in callers:
+                callees.setdefault(caller, []).append(func)
+        
+        def label(func: tuple) -> str:
+            filename, lineno, name = func
+            return name if filename == '~' else self.frame_name(name, filename, lineno)
+        
+        stacks: Dict[str, float] = {}
+        
+        def walk(func: tuple, path: List[str], on_path: set, share: float):
+            # share: the fraction of func's cumulative time spent under this path
+            stack = path + [label(func)]
+            key = ';'.join(stack)
+            stacks[key] = stacks.get(key, 0.0) + stats[func][2] * share
+            for callee in callees.get(func, ()):
+                if callee in on_path:
+                    continue
+                edge_time = stats[callee][4][func][3] * share
+                # Ignore branches under a microsecond; they do not show in a flamegraph
+                if edge_time >= 1e-6 and stats[callee][3] > 0:
+                    walk(callee, stack, on_path | {callee}, edge_time / stats[callee][3])
+        
+        for root in self._roots & stats.keys():
+            walk(root, [], {root}, 1.0)
+        return {stack: round(seconds * 1e6) for stack, seconds in stacks.items() if round(seconds * 1e6) > 0}
+
+class SamplingProfiler(DecisionProfiler):
+    """Stack sampler for sampled decisions, weighted in microseconds
+    
+    While a sampled decision runs, a sys.setprofile hook on the deciding
+    thread takes a sample at the first call or return event at least
+    interval seconds after the previous one, and once more as the decision
+    returns, charging the time since the previous sample to the current
+    stack. A sampler thread would need the GIL, which a
+    sub-millisecond decision never hands over, and the interpreter's switch
+    interval is left as it is.
+    """
+    
+    def __init__(self, output_dir: str, interval: float = PROFILE_INTERVAL):
+        super().__init__(output_dir)
+        self.interval = interval
+        self.stacks: Dict[str, float] = {}
+        self._root = None
+        self._last_sample = 0.0
+
+    def run(self, fn, *args):
+        self._root = self.root_code(fn)
+        previous = sys.getprofile()
+        self._last_sample = time.perf_counter()
+        sys.setprofile(self._on_event)
+        try:
+            return fn(*args)
+        finally:
+            sys.setprofile(previous)
+
+    def _on_event(self, frame, event: str, arg):
+        now = time.perf_counter()
+        # The profiled function's return (or a coroutine's suspension) always
+        # samples, so even a decision shorter than the interval is recorded
+        if now - self._last_sample >= self.interval or (event == 'return' and frame.f_code is self._root):
+            # A C call's own time is charged to the C function, not its caller
+            self._sample(frame, arg if event in ('c_call', 'c_return', 'c_exception') else None, now)
+
+    def _sample(self, frame, c_function, now: float):
+        stack = self._collapse(frame)
+        if stack is None:
+            return
+        if c_function is not None:
+            stack += ';' + getattr(c_function, '__qualname__', repr(c_function))
+        with self._lock:
+            self.stacks[stack] = self.stacks.get(stack, 0.0) + (now - self._last_sample)
+        self._last_sample = now
+
+    def _collapse(self, frame) -> Optional[str]:
+        """Root-to-leaf frame names, starting at the profiled function; None outside it"""
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(self.frame_name(code.co_name, code.co_filename, code.co_firstlineno))
+            if code is self._root:
+                return ';'.join(reversed(names))
+            frame = frame.f_back
+        return None
+
+    def collapsed_stacks(self) -> Dict[str, int]:
+        with self._lock:
+            return {stack: round(seconds * 1e6) for stack, seconds in self.stacks.items() if round(seconds * 1e6) > 0}
+
+class ProfiledCoroutine:
+    """Awaitable that drives a decision coroutine, profiling each resumption"""
+    
+    def __init__(self, profiler: DecisionProfiler, coroutine):
+        self.profiler = profiler
+        self.coroutine = coroutine
+
+    def __await__(self):
+        send, value = self.coroutine.send, None
+        while True:
+            try:
+                yielded = self.profiler.run(send, value)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value = yield yielded
+                send = self.coroutine.send
+            except BaseException as e:
+                send, value = self.coroutine.throw, e
+
+# One profiler per mode and process, shared by every agent
+_PROFILERS: Dict[str, DecisionProfiler] = {}
+
+def decision_profiler(mode: str, output_dir: str) -> DecisionProfiler:
+    profiler = _PROFILERS.get(mode)
+    if profiler is None:
+        profiler_class = CProfileProfiler if mode == 'cprofile' else SamplingProfiler
+        profiler = _PROFILERS[mode] = profiler_class(output_dir)
+    return profiler
+
+@atexit.register
+def _export_profiles():
+    for profiler in _PROFILERS.values():
+        try:
+            profiler.export()
+        except OSError as e:
+            logging.getLogger(__name__).error(f"Failed to export profile: {e}")
+
+# Ranked candidate actions produced by CustomAgent.evaluate_all_actions
+ACTION_MOVE = 0
+ACTION_SWITCH = 1
+ACTION_DTYPE = np.dtype([('action', object), ('kind', np.int8), ('utility', np.float64)])
+
 def get_active_pokemon(battle: AbstractBattle) -> Tuple[Optional[Pokemon], Optional[Pokemon]]:
     """Safely get current Pokemon for both sides"""
     my_pokemon = getattr(battle, 'active_pokemon', None)
@@ -110,10 +1312,619 @@ def get_active_pokemon(battle: AbstractBattle) -> Tuple[Optional[Pokemon], Optio
     
     return my_pokemon, opp_pokemon
 
+# ---------------------------------------------------------------------------
+# Lookahead: a compact battle model for depth-limited expectiminimax search
+# ---------------------------------------------------------------------------
+
+# 'greedy' scores actions one turn ahead, 'search' looks ahead with expectiminimax
+# and 'rollout' plays out random continuations in a process pool
+DECISION_MODES = ('greedy', 'search', 'rollout')
+DECISION_MODE = 'greedy'
+SEARCH_TIME_BUDGET = 0.05  # seconds per decision
+SEARCH_MAX_DEPTH = 3  # turns
+# Weight of the simulated position's outlook (BattleModel.outlook) added to material at the leaves
+LEAF_HEURISTIC_WEIGHT = 0.1
+
+ROLLOUT_COUNT = 64  # continuations per decision, split over the workers
+ROLLOUT_HORIZON = 20  # turns
+ROLLOUT_EPSILON = 0.1  # chance the rollout policy picks a random move
+ROLLOUT_TIME_BUDGET = 0.2  # seconds per decision
+ROLLOUT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# Action encoding: 0..3 are move slots, MOVE_SLOTS + i switches to roster slot i
+MOVE_SLOTS = 4
+NO_ACTION = -1
+
+# Chance outcomes of a hit: low half of the rolls, high half, critical hit
+HIT_OUTCOMES = 3
+OUTCOME_MISS = HIT_OUTCOMES
+
+# States hash HP in 5% buckets, so near-identical positions share table entries
+HP_BUCKETS = 20
+ZOBRIST_SEED = 20240615
+# Process-wide cap on transposition entries (roughly 200 bytes each), shared by every agent
+TRANSPOSITION_CAPACITY = 100_000
+
+# Assumed attacks for opponents that have not revealed one: (physical, special) per type
+STAB_PROXY_MOVES = {
+    PokemonType.NORMAL: ('bodyslam', 'hypervoice'),
+    PokemonType.FIRE: ('flareblitz', 'flamethrower'),
+    PokemonType.WATER: ('liquidation', 'surf'),
+    PokemonType.ELECTRIC: ('wildcharge', 'thunderbolt'),
+    PokemonType.GRASS: ('seedbomb', 'energyball'),
+    PokemonType.ICE: ('iciclecrash', 'icebeam'),
+    PokemonType.FIGHTING: ('closecombat', 'aurasphere'),
+    PokemonType.POISON: ('poisonjab', 'sludgebomb'),
+    PokemonType.GROUND: ('earthquake', 'earthpower'),
+    PokemonType.FLYING: ('bravebird', 'airslash'),
+    PokemonType.PSYCHIC: ('zenheadbutt', 'psychic'),
+    PokemonType.BUG: ('xscissor', 'bugbuzz'),
+    PokemonType.ROCK: ('stoneedge', 'powergem'),
+    PokemonType.GHOST: ('shadowclaw', 'shadowball'),
+    PokemonType.DRAGON: ('outrage', 'dracometeor'),
+    PokemonType.DARK: ('crunch', 'darkpulse'),
+    PokemonType.STEEL: ('ironhead', 'flashcannon'),
+    PokemonType.FAIRY: ('playrough', 'moonblast'),
+}
+
+class SimState(NamedTuple):
+    """Position inside the lookahead: active roster slots and HP fractions"""
+    our_active: int
+    opp_active: int
+    our_hp: Tuple[float, ...]
+    opp_hp: Tuple[float, ...]
+
+class SearchTimeout(Exception):
+    """Raised inside the search once the decision budget is spent"""
+
+class ZobristKeys:
+    """Random 64-bit keys for battle features, drawn lazily from a seeded generator
+    
+    A feature is any hashable tuple such as ('boost', side, species, stat, stage);
+    a position hashes to the XOR of its features' keys.
+    """
+    
+    def __init__(self, seed: int = ZOBRIST_SEED):
+        self._rng = np.random.default_rng(seed)
+        self._keys: Dict[tuple, int] = {}
+
+    def key(self, *feature) -> int:
+        key = self._keys.get(feature)
+        if key is None:
+            key = int.from_bytes(self._rng.bytes(8), 'little')
+            self._keys[feature] = key
+        return key
+
+    def combine(self, features) -> int:
+        combined = 0
+        for feature in features:
+            combined ^= self.key(*feature)
+        return combined
+
+class TTEntry(NamedTuple):
+    value: float
+    depth: int
+    best_action: int
+
+class TranspositionTable:
+    """Bounded map of state hash -> searched value, depth and best action
+    
+    Entries are kept in LRU order and the least recently used one is evicted
+    at capacity. A shallower result never overwrites a deeper one for the
+    same state. Values depend on the turn's BattleModel and search budget,
+    which the state hash does not capture, so the table only ever holds one
+    battle's turn: scope() clears it when a search starts anywhere else.
+    """
+    
+    def __init__(self, capacity: int = TRANSPOSITION_CAPACITY):
+        self.capacity = capacity
+        self._entries: 'OrderedDict[int, TTEntry]' = OrderedDict()
+        self._scope: Optional[Tuple[str, int]] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: int) -> Optional[TTEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return entry
+
+    def store(self, key: int, value: float, depth: int, best_action: int):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if entry.depth > depth:
+                return
+        self._entries[key] = TTEntry(value, depth, best_action)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def scope(self, battle_tag: str, turn: int):
+        """Keep the entries only if they come from this battle's current turn"""
+        if self._scope != (battle_tag, turn):
+            self._scope = (battle_tag, turn)
+            self.clear()
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups > 0 else 0.0,
+            'entries': len(self._entries),
+            'capacity': self.capacity,
+            'evictions': self.evictions
+        }
+
+# One table and key set per process, however many agents it hosts
+ZOBRIST = ZobristKeys()
+TRANSPOSITION_TABLE = TranspositionTable()
+
+class BattleModel:
+    """Per-decision damage, accuracy and speed tables for the lookahead
+    
+    Holds only NumPy arrays and plain Python values, so it can be shipped to
+    other processes. Damage is stored as a fraction of the defender's max HP
+    for each chance outcome, indexed [attacker, defender, move slot, outcome].
+    """
+    
+    def __init__(self, our_size: int, opp_size: int, opp_hidden: int, team_size: int):
+        self.our_size = our_size
+        self.opp_size = opp_size
+        # Opponents we have not seen yet count as healthy in the material balance
+        self.opp_hidden = opp_hidden
+        self.team_size = max(team_size, 1)
+        self.our_damage = np.zeros((our_size, opp_size, MOVE_SLOTS, HIT_OUTCOMES))
+        self.opp_damage = np.zeros((opp_size, our_size, MOVE_SLOTS, HIT_OUTCOMES))
+        self.our_chance = np.zeros((our_size, opp_size, MOVE_SLOTS, HIT_OUTCOMES + 1))
+        self.opp_chance = np.zeros((opp_size, our_size, MOVE_SLOTS, HIT_OUTCOMES + 1))
+        self.our_valid = np.zeros((our_size, MOVE_SLOTS), dtype=bool)
+        self.opp_valid = np.zeros((opp_size, MOVE_SLOTS), dtype=bool)
+        self.our_priority = np.zeros((our_size, MOVE_SLOTS), dtype=np.int8)
+        self.opp_priority = np.zeros((opp_size, MOVE_SLOTS), dtype=np.int8)
+        self.our_heal = np.zeros((our_size, MOVE_SLOTS))
+        self.opp_heal = np.zeros((opp_size, MOVE_SLOTS))
+        self.our_speed = np.zeros(our_size)
+        self.opp_speed = np.zeros(opp_size)
+        # Zobrist keys, filled in by set_keys; without them states are not hashed
+        self.base_key: Optional[int] = None
+        self._active_keys: Tuple[List[int], List[int]] = ([], [])
+        self._hp_keys: Tuple[List[List[int]], List[List[int]]] = ([], [])
+        self._outcomes: Dict[Tuple[int, int, int, int], List[Tuple[int, float]]] = {}
+        self._matchups: Dict[Tuple[bool, int, int, float, float], float] = {}
+
+    def set_move(self, own: bool, attacker: int, slot: int, defender: int, normal: np.ndarray, crit: np.ndarray, crit_chance: float, accuracy: float, defender_hp: float):
+        """Reduce the 16 normal and 16 crit rolls of one attack to the three chance outcomes"""
+        damage = self.our_damage if own else self.opp_damage
+        chance = self.our_chance if own else self.opp_chance
+        half = normal.size // 2
+        damage[attacker, defender, slot] = (normal[:half].mean(), normal[half:].mean(), crit.mean())
+        damage[attacker, defender, slot] /= max(defender_hp, 1.0)
+        hit = (1 - crit_chance) / 2
+        chance[attacker, defender, slot] = (accuracy * hit, accuracy * hit, accuracy * crit_chance, 1 - accuracy)
+
+    def set_keys(self, zobrist: ZobristKeys, our_species: List[str], opp_species: List[str], context: List[tuple]):
+        """Hash keys for roster slots and HP buckets plus the fixed context (boosts, status, field)"""
+        self.base_key = zobrist.combine(context)
+        self._active_keys = (
+            [zobrist.key('active', 0, species) for species in our_species],
+            [zobrist.key('active', 1, species) for species in opp_species]
+        )
+        self._hp_keys = (
+            [[zobrist.key('hp', 0, species, bucket) for bucket in range(HP_BUCKETS + 1)] for species in our_species],
+            [[zobrist.key('hp', 1, species, bucket) for bucket in range(HP_BUCKETS + 1)] for species in opp_species]
+        )
+
+    def hash_state(self, state: SimState) -> Optional[int]:
+        if self.base_key is None:
+            return None
+        key = self.base_key ^ self._active_keys[0][state.our_active] ^ self._active_keys[1][state.opp_active]
+        for hp_keys, hp in zip(self._hp_keys[0], state.our_hp):
+            key ^= hp_keys[math.ceil(hp * HP_BUCKETS)]
+        for hp_keys, hp in zip(self._hp_keys[1], state.opp_hp):
+            key ^= hp_keys[math.ceil(hp * HP_BUCKETS)]
+        return key
+
+    def outcomes(self, own: bool, attacker: int, defender: int, slot: int) -> List[Tuple[int, float]]:
+        """Chance outcomes with non-zero probability; non-damaging moves have exactly one"""
+        key = (0 if own else 1, attacker, defender, slot)
+        outcomes = self._outcomes.get(key)
+        if outcomes is None:
+            damage = (self.our_damage if own else self.opp_damage)[attacker, defender, slot]
+            chance = (self.our_chance if own else self.opp_chance)[attacker, defender, slot]
+            if not damage.any():
+                outcomes = [(0, 1.0)]
+            else:
+                outcomes = [(outcome, float(p)) for outcome, p in enumerate(chance) if p > 1e-9]
+            self._outcomes[key] = outcomes
+        return outcomes
+
+    def sample_outcome(self, own: bool, attacker: int, defender: int, slot: int, rng: np.random.Generator) -> int:
+        outcomes = self.outcomes(own, attacker, defender, slot)
+        if len(outcomes) == 1:
+            return outcomes[0][0]
+        threshold = rng.random()
+        for outcome, p in outcomes:
+            threshold -= p
+            if threshold < 0:
+                return outcome
+        return outcomes[-1][0]
+
+    def move_utilities(self, own: bool, attacker: int, defender: int, attacker_hp: float, defender_hp: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Valid move slots and evaluate_move's KO, damage and recovery terms for each, on the model"""
+        slots = np.flatnonzero((self.our_valid if own else self.opp_valid)[attacker])
+        damage = (self.our_damage if own else self.opp_damage)[attacker, defender, slots]
+        hit_chance = (self.our_chance if own else self.opp_chance)[attacker, defender, slots, :HIT_OUTCOMES]
+        ko_prob = (hit_chance * (damage >= defender_hp)).sum(axis=1)
+        mean_damage = 100.0 * (hit_chance * damage).sum(axis=1)
+        utility = ko_prob * 100.0 + mean_damage * 0.1
+        if attacker_hp < 0.5:
+            utility += 50.0 * ((self.our_heal if own else self.opp_heal)[attacker, slots] > 0)
+        return slots, utility
+
+    def policy_action(self, state: SimState, own: bool, rng: np.random.Generator, epsilon: float = ROLLOUT_EPSILON) -> int:
+        """Rollout policy: the best of move_utilities, epsilon-greedy"""
+        attacker, defender = (state.our_active, state.opp_active) if own else (state.opp_active, state.our_active)
+        attacker_hp = (state.our_hp if own else state.opp_hp)[attacker]
+        if attacker_hp <= 0:
+            return NO_ACTION
+        defender_hp = (state.opp_hp if own else state.our_hp)[defender]
+        slots, utility = self.move_utilities(own, attacker, defender, attacker_hp, defender_hp)
+        if not slots.size:
+            return NO_ACTION
+        if rng.random() < epsilon:
+            return int(rng.choice(slots))
+        return int(slots[np.argmax(utility)])
+
+    def matchup(self, own: bool, attacker: int, defender: int, attacker_hp: float, defender_hp: float) -> float:
+        """Best move utility of attacker against defender at these HP fractions"""
+        key = (own, attacker, defender, attacker_hp, defender_hp)
+        value = self._matchups.get(key)
+        if value is None:
+            _, utility = self.move_utilities(own, attacker, defender, attacker_hp, defender_hp)
+            value = self._matchups[key] = float(utility.max()) if utility.size else 0.0
+        return value
+
+    def outlook(self, state: SimState) -> float:
+        """One-turn greedy outlook of a simulated position, for the search's leaves
+        
+        Our best option, staying in or switching to a healthy bench Pokemon,
+        scored by our best move minus the opponent's best move against whoever
+        faces it. A switch spends the turn, so the incoming Pokemon takes the
+        opponent's move once more.
+        """
+        opp_active = state.opp_active
+        opp_hp = state.opp_hp[opp_active]
+        
+        def option(index: int, hits: int) -> float:
+            hp = state.our_hp[index]
+            return self.matchup(True, index, opp_active, hp, opp_hp) - hits * self.matchup(False, opp_active, index, opp_hp, hp)
+        
+        best = option(state.our_active, 1)
+        for index, hp in enumerate(state.our_hp):
+            if hp > 0 and index != state.our_active:
+                best = max(best, option(index, 2))
+        return best
+
+    def rollout(self, state: SimState, first_action: int, horizon: int, epsilon: float, rng: np.random.Generator) -> float:
+        """Play first_action, then both sides follow the rollout policy; returns the final material"""
+        our_action = first_action
+        for _ in range(horizon):
+            if self.terminal(state):
+                break
+            opp_action = self.policy_action(state, False, rng, epsilon)
+            our_outcome = opp_outcome = 0
+            if 0 <= our_action < MOVE_SLOTS:
+                our_outcome = self.sample_outcome(True, state.our_active, state.opp_active, our_action, rng)
+            if 0 <= opp_action < MOVE_SLOTS:
+                target = our_action - MOVE_SLOTS if our_action >= MOVE_SLOTS else state.our_active
+                opp_outcome = self.sample_outcome(False, state.opp_active, target, opp_action, rng)
+            state = self.resolve(state, our_action, opp_action, our_outcome, opp_outcome)
+            our_action = self.policy_action(state, True, rng, epsilon)
+        return self.material(state)
+
+    def our_actions(self, state: SimState) -> List[int]:
+        if state.our_hp[state.our_active] <= 0:
+            return [NO_ACTION]
+        actions = [int(slot) for slot in np.flatnonzero(self.our_valid[state.our_active])]
+        actions += [MOVE_SLOTS + i for i, hp in enumerate(state.our_hp) if hp > 0 and i != state.our_active]
+        return actions or [NO_ACTION]
+
+    def opp_actions(self, state: SimState) -> List[int]:
+        """The opponent is modelled as always attacking with its known or assumed moves"""
+        if state.opp_hp[state.opp_active] <= 0:
+            return [NO_ACTION]
+        actions = [int(slot) for slot in np.flatnonzero(self.opp_valid[state.opp_active])]
+        return actions or [NO_ACTION]
+
+    def _opp_moves_first(self, our_active: int, our_slot: int, opp_active: int, opp_slot: int) -> bool:
+        our_priority = self.our_priority[our_active, our_slot]
+        opp_priority = self.opp_priority[opp_active, opp_slot]
+        if our_priority != opp_priority:
+            return opp_priority > our_priority
+        return self.opp_speed[opp_active] > self.our_speed[our_active]
+
+    def resolve(self, state: SimState, our_action: int, opp_action: int, our_outcome: int, opp_outcome: int) -> SimState:
+        """Play one turn: switches first, then attacks in priority/speed order"""
+        our_hp, opp_hp = list(state.our_hp), list(state.opp_hp)
+        our_active, opp_active = state.our_active, state.opp_active
+        if our_action >= MOVE_SLOTS:
+            our_active = our_action - MOVE_SLOTS
+        if opp_action >= MOVE_SLOTS:
+            opp_active = opp_action - MOVE_SLOTS
+        
+        attacks = []
+        if 0 <= our_action < MOVE_SLOTS:
+            attacks.append((True, our_action, our_outcome))
+        if 0 <= opp_action < MOVE_SLOTS:
+            attacks.append((False, opp_action, opp_outcome))
+        if len(attacks) == 2 and self._opp_moves_first(our_active, our_action, opp_active, opp_action):
+            attacks.reverse()
+        
+        for own, slot, outcome in attacks:
+            attacker_hp, defender_hp = (our_hp, opp_hp) if own else (opp_hp, our_hp)
+            attacker, defender = (our_active, opp_active) if own else (opp_active, our_active)
+            if attacker_hp[attacker] <= 0 or outcome == OUTCOME_MISS:
+                continue
+            damage = (self.our_damage if own else self.opp_damage)[attacker, defender, slot, outcome]
+            defender_hp[defender] = max(0.0, defender_hp[defender] - damage)
+            heal = (self.our_heal if own else self.opp_heal)[attacker, slot]
+            attacker_hp[attacker] = min(1.0, attacker_hp[attacker] + heal)
+        
+        # Fainted actives are replaced by the healthiest remaining Pokemon
+        if our_hp[our_active] <= 0 and any(hp > 0 for hp in our_hp):
+            our_active = max(range(len(our_hp)), key=our_hp.__getitem__)
+        if opp_hp[opp_active] <= 0 and any(hp > 0 for hp in opp_hp):
+            opp_active = max(range(len(opp_hp)), key=opp_hp.__getitem__)
+        return SimState(our_active, opp_active, tuple(our_hp), tuple(opp_hp))
+
+    def terminal(self, state: SimState) -> bool:
+        return not any(hp > 0 for hp in state.our_hp) or not any(hp > 0 for hp in state.opp_hp)
+
+    def material(self, state: SimState) -> float:
+        """HP balance in percent of a full team; unseen opponents count as healthy"""
+        ours = sum(state.our_hp)
+        theirs = sum(state.opp_hp) + self.opp_hidden
+        value = 100.0 * (ours - theirs) / self.team_size
+        if ours <= 0:
+            value -= 1000.0
+        elif theirs <= 0:
+            value += 1000.0
+        return value
+
+class ExpectiminimaxSearch:
+    """Depth-limited expectiminimax over a BattleModel with iterative deepening
+    
+    We maximize, the opponent minimizes, and chance nodes average over damage
+    rolls, critical hits and misses. Each completed depth replaces the previous
+    answer, so running out of time returns the deepest finished result. With a
+    transposition table, positions searched at a shallower depth of the same
+    decision are reused and their best action is tried first.
+    """
+    
+    def __init__(self, model: BattleModel, leaf_heuristic=None, budget: float = SEARCH_TIME_BUDGET, max_depth: int = SEARCH_MAX_DEPTH, table: Optional[TranspositionTable] = None):
+        self.model = model
+        # leaf_heuristic(state) scores non-terminal leaves on top of material
+        self.leaf_heuristic = leaf_heuristic
+        self.budget = budget
+        self.max_depth = max_depth
+        self.table = table
+        self.deadline = 0.0
+        self.nodes = 0
+
+    def search(self, state: SimState, root_actions: List[int], priors: Optional[Dict[int, float]] = None) -> Tuple[Optional[int], float, int]:
+        """Best root action, its value and the deepest completed depth (0 if none finished)"""
+        self.deadline = time.perf_counter() + self.budget
+        self.nodes = 0
+        priors = priors or {}
+        ordered = sorted(root_actions, key=lambda action: -priors.get(action, 0.0))
+        best_action, best_value, completed = (ordered[0] if ordered else None), 0.0, 0
+        
+        for depth in range(1, self.max_depth + 1):
+            try:
+                values = self._root_values(state, ordered, depth)
+            except SearchTimeout:
+                break
+            completed = depth
+            # Search the previous best first next time for tighter cut-offs
+            ordered = sorted(ordered, key=lambda action: -values[action])
+            best_action, best_value = ordered[0], values[ordered[0]]
+            if self.model.terminal(state):
+                break
+        return best_action, best_value, completed
+
+    def _root_values(self, state: SimState, actions: List[int], depth: int) -> Dict[int, float]:
+        values = {}
+        alpha = -math.inf
+        for action in actions:
+            values[action] = self._min_value(state, action, depth, alpha)
+            alpha = max(alpha, values[action])
+        return values
+
+    def _max_value(self, state: SimState, depth: int) -> float:
+        self.nodes += 1
+        if time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        if depth == 0 or self.model.terminal(state):
+            return self.evaluate(state)
+        
+        actions = self.model.our_actions(state)
+        key = self.model.hash_state(state) if self.table is not None else None
+        if key is not None:
+            entry = self.table.get(key)
+            if entry is not None:
+                if entry.depth >= depth:
+                    return entry.value
+                if entry.best_action in actions:
+                    actions.remove(entry.best_action)
+                    actions.insert(0, entry.best_action)
+        
+        # Min nodes only cut below the running best, so this maximum is exact
+        best, best_action = -math.inf, actions[0]
+        for action in actions:
+            value = self._min_value(state, action, depth, best)
+            if value > best:
+                best, best_action = value, action
+        if key is not None:
+            self.table.store(key, best, depth, best_action)
+        return best
+
+    def _min_value(self, state: SimState, our_action: int, depth: int, alpha: float) -> float:
+        """Opponent's best reply to our_action; stops once it is no better than alpha for us"""
+        worst = math.inf
+        for opp_action in self.model.opp_actions(state):
+            worst = min(worst, self._chance_value(state, our_action, opp_action, depth))
+            if worst <= alpha:
+                break
+        return worst
+
+    def _chance_value(self, state: SimState, our_action: int, opp_action: int, depth: int) -> float:
+        model = self.model
+        our_outcomes = [(0, 1.0)]
+        if 0 <= our_action < MOVE_SLOTS:
+            our_outcomes = model.outcomes(True, state.our_active, state.opp_active, our_action)
+        opp_outcomes = [(0, 1.0)]
+        if 0 <= opp_action < MOVE_SLOTS:
+            # Our switch happens first, so the attack lands on the incoming Pokemon
+            target = our_action - MOVE_SLOTS if our_action >= MOVE_SLOTS else state.our_active
+            opp_outcomes = model.outcomes(False, state.opp_active, target, opp_action)
+        
+        value = 0.0
+        for our_outcome, our_p in our_outcomes:
+            for opp_outcome, opp_p in opp_outcomes:
+                child = model.resolve(state, our_action, opp_action, our_outcome, opp_outcome)
+                value += our_p * opp_p * self._max_value(child, depth - 1)
+        return value
+
+    def evaluate(self, state: SimState) -> float:
+        """Material plus the leaf heuristic's opinion of the simulated position"""
+        value = self.model.material(state)
+        if self.leaf_heuristic is not None and not self.model.terminal(state):
+            value += LEAF_HEURISTIC_WEIGHT * self.leaf_heuristic(state)
+        return value
+
+def run_rollouts(model: BattleModel, state: SimState, actions: List[int], count: int, horizon: int, epsilon: float, seed: np.random.SeedSequence) -> Dict[int, Tuple[float, int]]:
+    """Worker entry point: count rollouts spread round-robin over the root actions
+    
+    Returns action -> (summed final material, number of rollouts).
+    """
+    rng = np.random.default_rng(seed)
+    totals = {action: (0.0, 0) for action in actions}
+    for n in range(count):
+        action = actions[n % len(actions)]
+        total, played = totals[action]
+        totals[action] = (total + model.rollout(state, action, horizon, epsilon, rng), played + 1)
+    return totals
+
+def rollout_task(model_fields: Dict[str, Any], state: tuple, *args) -> Dict[int, Tuple[float, int]]:
+    """run_rollouts on a BattleModel and SimState rebuilt from plain values"""
+    model = BattleModel.__new__(BattleModel)
+    vars(model).update(model_fields)
+    return run_rollouts(model, SimState(*state), *args)
+
+# Executed once in each spawned worker: load this file by path under the name
+# the parent registered it as, as AgentRegistry.load_module does
+WORKER_BOOTSTRAP = """
+import importlib.util, sys
+if module_name not in sys.modules:
+    spec = importlib.util.spec_from_file_location(module_name, module_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+"""
+# Evaluated in the worker for each task
+WORKER_TASK = "__import__('sys').modules[module_name].rollout_task(*args)"
+
+class RolloutPool:
+    """Process pool for rollouts, shared by every agent in the process
+    
+    Workers are spawned rather than forked: this process runs the poke_env
+    loop, log and SQLite threads, whose locks a forked child could inherit
+    mid-use. Runners register this file as "<name>.py", which pickle cannot
+    import, so a task never references this module: each worker loads the
+    file by path (WORKER_BOOTSTRAP) and every task is the builtin eval of
+    WORKER_TASK over builtin and NumPy values. submit returns None when the
+    pool is saturated or unavailable so callers can fall back to the greedy
+    path.
+    """
+    
+    def __init__(self, workers: int = ROLLOUT_WORKERS, max_pending: Optional[int] = None):
+        self.workers = workers
+        self.max_pending = max_pending or 2 * workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, model: BattleModel, state: SimState, *args) -> Optional[Future]:
+        """Queue rollout_task(model, state, *args) on a worker"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return None
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=exec, initargs=(WORKER_BOOTSTRAP, self._names())
+                )
+            try:
+                future = self._executor.submit(eval, WORKER_TASK, {**self._names(), 'args': (dict(vars(model)), tuple(state), *args)})
+            except (BrokenProcessPool, RuntimeError):
+                self._executor = None
+                return None
+            self._pending += 1
+        future.add_done_callback(self._release)
+        return future
+
+    @staticmethod
+    def _names() -> Dict[str, Any]:
+        # A script run directly is already __main__ in the worker, re-run by spawn
+        return {'module_name': __name__, 'module_path': os.path.abspath(__file__)}
+
+    def _release(self, future: Future):
+        with self._lock:
+            self._pending -= 1
+
+    def reset(self):
+        """Drop a broken executor; the next submit starts a fresh one"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        self.reset()
+
+ROLLOUT_POOL = RolloutPool()
+atexit.register(ROLLOUT_POOL.shutdown)
+
 class CustomAgent(Player):
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, decision_mode: Optional[str] = None, search_budget: float = SEARCH_TIME_BUDGET, search_depth: int = SEARCH_MAX_DEPTH,
+                 rollout_count: int = ROLLOUT_COUNT, rollout_budget: float = ROLLOUT_TIME_BUDGET,
+                 profile_mode: Optional[str] = PROFILE_MODE, profile_rate: float = PROFILE_SAMPLE_RATE,
+                 write_logs: bool = True, **kwargs):
         super().__init__(team=team, *args, **kwargs)
+        # write_logs=False keeps battle logs, decision traces and the performance database off disk
+        self.write_logs = write_logs
+        self.decision_mode = decision_mode or DECISION_MODE
+        if self.decision_mode not in DECISION_MODES:
+            raise ValueError(f"Unknown decision mode: {self.decision_mode}")
+        self.search_budget = search_budget
+        self.search_depth = search_depth
+        self.transposition_table = TRANSPOSITION_TABLE
+        self.rollout_count = rollout_count
+        self.rollout_budget = rollout_budget
+        self.rollout_pool = ROLLOUT_POOL
         self.battle_logger = None
         self.current_battle_id = None
         self.performance_stats = {
@@ -123,52 +1934,54 @@ class CustomAgent(Player):
             'total_turns': 0,
             'total_decision_time': 0.0
         }
+        self.damage_engine = DamageEngine(team)
+        self.damage_cache = DamageCache()
+        self.battle_decision_times: Dict[str, List[float]] = {}
+        self.battle_latency: Dict[str, LatencyStats] = {}
+        self.decision_timer: Optional[PhaseTimer] = None
         self.setup_logging()
+        self.performance_store = performance_store(os.path.join(self.results_dir, PERFORMANCE_DB)) if write_logs else None
+        
+        # Profiling is off unless asked for; then a fraction of decisions is profiled
+        if profile_mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {profile_mode}")
+        self.profile_rate = profile_rate
+        self.profiler = decision_profiler(profile_mode, os.path.join(self.results_dir, 'profiles')) if profile_mode else None
 
     def setup_logging(self):
         """Setup detailed logging system"""
         self.results_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'results')
+        self.trace_logger = None
+        if not self.write_logs:
+            # Like the pipeline's loggers it is not registered globally, so it goes with the agent
+            self.main_logger = logging.Logger(f'simplified_agent_{id(self)}')
+            self.main_logger.addHandler(logging.NullHandler())
+            return
         os.makedirs(self.results_dir, exist_ok=True)
         
-        self.main_logger = logging.getLogger(f'simplified_agent_{id(self)}')
-        self.main_logger.setLevel(logging.INFO)
-        
-        # Clear existing handlers
-        for handler in self.main_logger.handlers[:]:
-            self.main_logger.removeHandler(handler)
-        
-        # Create file handler
+        # Writes go through the shared background log pipeline
         log_file = os.path.join(self.results_dir, 'simplified_agent.log')
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
-        file_handler.setLevel(logging.INFO)
-        
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        file_handler.setFormatter(formatter)
-        self.main_logger.addHandler(file_handler)
+        self.main_logger = LOG_PIPELINE.logger(f'simplified_agent_{id(self)}', log_file, logging.INFO)
+        
+        # Structured per-decision trace shared by every agent in this process
+        if TRACE_DECISIONS:
+            traces_dir = os.path.join(self.results_dir, 'traces')
+            os.makedirs(traces_dir, exist_ok=True)
+            trace_file = os.path.join(traces_dir, f'decision_trace_{os.getpid()}.jsonl')
+            self.trace_logger = LOG_PIPELINE.logger(f'decision_trace_{id(self)}', trace_file, logging.INFO, structured=True)
 
     def setup_battle_logging(self, battle: AbstractBattle):
         """Setup independent log file for each battle"""
+        if not self.write_logs:
+            return
         if not self.current_battle_id or self.current_battle_id != battle.battle_tag:
             self.current_battle_id = battle.battle_tag
             # Initial filename, will be updated based on results later
             self.battle_id = f"battle_{int(time.time())}_{battle.battle_tag}"
             
-            # Create battle-specific logger
-            self.battle_logger = logging.getLogger(f'battle_{self.battle_id}')
-            self.battle_logger.setLevel(logging.DEBUG)
-            
-            # Clear existing handlers
-            for handler in self.battle_logger.handlers[:]:
-                self.battle_logger.removeHandler(handler)
-            
-            # Create battle log file
+            # Create battle-specific logger, batched and written off the event loop
             battle_log_file = os.path.join(self.results_dir, f'{self.battle_id}.log')
-            battle_file_handler = logging.FileHandler(battle_log_file, encoding='utf-8')
-            battle_file_handler.setLevel(logging.DEBUG)
-            
-            formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-            battle_file_handler.setFormatter(formatter)
-            self.battle_logger.addHandler(battle_file_handler)
+            self.battle_logger = LOG_PIPELINE.logger(f'battle_{self.battle_id}', battle_log_file, logging.DEBUG)
             
             # Record battle start time
             self.battle_start_time = time.time()
@@ -190,8 +2003,15 @@ class CustomAgent(Player):
                 self.battle_logger.info(f"Opponent Moves: {known_moves}")
 
     def choose_move(self, battle: AbstractBattle):
+        """Main decision function, profiled for a sampled fraction of decisions when enabled"""
+        if self.profiler is not None and random.random() < self.profile_rate:
+            return self.profiler.profile_decision(self._choose_move, battle)
+        return self._choose_move(battle)
+
+    def _choose_move(self, battle: AbstractBattle):
         """Simplified main decision function"""
         start_time = time.time()
+        self.decision_timer = PhaseTimer()
         
         # Setup battle logging
         self.setup_battle_logging(battle)
@@ -199,6 +2019,7 @@ class CustomAgent(Player):
         # Record battle start
         if battle.turn == 1:
             self.main_logger.info(f"Starting battle: {battle.battle_tag}")
+        self.decision_timer.mark('setup')
         
         # Handle forced switch
         if battle.force_switch:
@@ -216,6 +2037,7 @@ class CustomAgent(Player):
         
         # Record turn start information
         self.log_turn_start(battle, my_pokemon, opp_pokemon)
+        self.decision_timer.mark('setup')
         
         # Handle fainted Pokemon
         if not my_pokemon or my_pokemon.fainted:
@@ -237,7 +2059,33 @@ class CustomAgent(Player):
         
         # Record damage calculations
         self.log_damage_calculations(battle, my_pokemon, opp_pokemon)
-        
+        self.decision_timer.mark('damage')
+        
+        # Look ahead when search or rollouts are enabled; None falls through to greedy
+        if self.decision_mode == 'rollout':
+            # poke_env awaits the returned coroutine, so other battles keep running while rollouts do
+            return self._choose_rollout_decision(battle, start_time)
+        if self.decision_mode == 'search':
+            lookahead_action = self.choose_search_move(battle)
+            if lookahead_action:
+                self.log_decision(battle, lookahead_action, time.time() - start_time)
+                return lookahead_action
+        
+        return self._choose_greedy_move(battle, start_time)
+
+    async def _choose_rollout_decision(self, battle: AbstractBattle, start_time: float):
+        """Rollout decision, falling back to the greedy path when no rollout finished in time"""
+        timer = self.decision_timer
+        lookahead_action = await self.choose_rollout_move(battle)
+        # Another battle may have started a decision while we waited
+        self.decision_timer = timer
+        if lookahead_action:
+            self.log_decision(battle, lookahead_action, time.time() - start_time)
+            return lookahead_action
+        return self._choose_greedy_move(battle, start_time)
+
+    def _choose_greedy_move(self, battle: AbstractBattle, start_time: float):
+        """One-turn greedy choice: a high damage attack, else the best ranked action"""
         # Prioritize high damage attacks
         high_damage_action = self.choose_high_damage_move(battle)
         if high_damage_action:
@@ -245,13 +2093,12 @@ class CustomAgent(Player):
             return high_damage_action
         
         # Evaluate all available actions
-        action_utilities = self.evaluate_all_actions(battle)
+        ranked_actions = self.evaluate_all_actions(battle)
         
         # Choose best action
-        if action_utilities:
-            best_action = max(action_utilities, key=lambda x: x['utility'])
-            action = self.create_order(best_action['action'])
-            self.log_decision(battle, action, time.time() - start_time)
+        if ranked_actions.size:
+            action = self.create_order(ranked_actions[0]['action'])
+            self.log_decision(battle, action, time.time() - start_time, ranked_actions)
             return action
         
         # Fallback plan
@@ -263,44 +2110,283 @@ class CustomAgent(Player):
         self.log_decision(battle, action, time.time() - start_time)
         return action
 
-    def evaluate_all_actions(self, battle: AbstractBattle) -> List[Dict]:
-        """Evaluate all available actions"""
-        action_utilities = []
+    def evaluate_all_actions(self, battle: AbstractBattle) -> np.ndarray:
+        """Score every move and switch in one batched pass, best first
+        
+        Returns a structured array of ACTION_DTYPE sorted by descending utility.
+        The scores match evaluate_move/evaluate_switch, which remain the
+        per-action reference implementations.
+        """
         my_pokemon, opp_pokemon = get_active_pokemon(battle)
+        if not my_pokemon or not opp_pokemon:
+            return np.empty(0, dtype=ACTION_DTYPE)
+        
+        moves = [move for move in my_pokemon.moves.values() if move.current_pp > 0]
+        switches = list(battle.available_switches)
+        actions = np.empty(len(moves) + len(switches), dtype=ACTION_DTYPE)
+        actions['action'] = moves + switches
+        actions['kind'][:len(moves)] = ACTION_MOVE
+        actions['kind'][len(moves):] = ACTION_SWITCH
+        actions['utility'][:len(moves)] = self._score_moves(moves, battle, my_pokemon, opp_pokemon)
+        actions['utility'][len(moves):] = self._score_switches(switches, battle, opp_pokemon)
+        
+        return actions[np.argsort(-actions['utility'], kind='stable')]
+
+    def _score_moves(self, moves: List[Move], battle: AbstractBattle, my_pokemon: Pokemon, opp_pokemon: Pokemon) -> np.ndarray:
+        """Vectorized evaluate_move over all of our moves"""
+        if not moves:
+            return np.zeros(0)
+        
+        ko_prob, mean_damage = self.damage_matrix(moves, my_pokemon, opp_pokemon, battle)
+        damaging = np.array([is_damaging(move) for move in moves])
+        
+        # KO value, damage value and risk penalty for attacks
+        move_types = np.array([type_index(move.type) for move in moves], dtype=np.intp)
+        effectiveness = effectiveness_matrix(move_types, np.array([defender_type_indices(opp_pokemon)], dtype=np.intp))[:, 0]
+        has_type = np.array([move.type is not None for move in moves]) & bool(opp_pokemon.types)
+        effectiveness = np.where(has_type, np.clip(effectiveness, 0.0, 4.0), 1.0)
+        my_hp_ratio = my_pokemon.current_hp / my_pokemon.max_hp
+        risky = damaging & ((my_hp_ratio < 0.3) | (effectiveness < 0.5))
+        utility = np.where(damaging, ko_prob * 100.0 + mean_damage * 0.1 - 30.0 * risky, 0.0)
+        
+        # Adjust based on move type
+        infos = [move_info(move) for move in moves]
+        kinds = np.array([info.category for info in infos])
+        if my_hp_ratio < 0.5:
+            utility += 50.0 * (kinds == 'recovery')
+        if my_hp_ratio > 0.6:
+            utility += 30.0 * (kinds == 'setup')
+        if not opp_pokemon.status:
+            utility += 25.0 * (kinds == 'status')
+        if self.opponent_has_threat_moves(opp_pokemon):
+            utility += 20.0 * (kinds == 'protection')
+        if opp_pokemon.current_hp / opp_pokemon.max_hp < 0.3:
+            utility += 40.0 * (kinds == 'priority')
         
+        # Apply move priority weights
+        return utility * np.array([info.weight for info in infos])
+
+    def damage_matrix(self, moves: List[Move], attacker: Pokemon, defender: Pokemon, battle: AbstractBattle) -> Tuple[np.ndarray, np.ndarray]:
+        """KO probability and expected damage of each of our moves, through the turn's damage cache
+        
+        Moves already calculated this turn are reused; the rest go through the
+        engine in one batch and are cached for calculate_damage and later calls.
+        """
+        keys = [DamageCache.make_key(move, attacker, defender) for move in moves]
+        infos = [self.damage_cache.get(battle, key) for key in keys]
+        missing = [i for i, info in enumerate(infos) if info is None]
+        if missing:
+            computed = self.damage_engine.analyze_matrix([moves[i] for i in missing], attacker, [defender], battle, True)
+            for row, i in enumerate(missing):
+                infos[i] = {name: float(values[row, 0]) for name, values in computed.items()}
+                self.damage_cache.put(battle, keys[i], infos[i])
+        return np.array([info['ko_prob'] for info in infos]), np.array([info['mean_damage'] for info in infos])
+
+    def _score_switches(self, switches: List[Pokemon], battle: AbstractBattle, opp_pokemon: Pokemon) -> np.ndarray:
+        """Vectorized evaluate_switch: every switch against every known opposing attack"""
+        if not switches:
+            return np.zeros(0)
+        
+        utility = np.zeros(len(switches))
+        if opp_pokemon and opp_pokemon.moves:
+            move_types = np.array(
+                [type_index(move.type) for move in opp_pokemon.moves.values() if move.base_power > 0],
+                dtype=np.intp
+            )
+            if move_types.size:
+                defender_types = np.array([defender_type_indices(switch) for switch in switches], dtype=np.intp)
+                effectiveness = effectiveness_matrix(move_types, defender_types)
+                utility += 20.0 * np.count_nonzero(effectiveness < 1.0, axis=0)  # Resistance
+                utility -= 15.0 * np.count_nonzero(effectiveness > 1.0, axis=0)  # Weakness
+        
+        # Entry damage penalty (hazards hit every switch-in alike)
+        return utility - 0.5 * np.array([self.calculate_entry_damage(switch, battle) for switch in switches])
+
+    def choose_search_move(self, battle: AbstractBattle) -> Optional[Any]:
+        """Choose an action by expectiminimax lookahead, or None when the position cannot be modelled"""
+        my_pokemon, opp_pokemon = get_active_pokemon(battle)
         if not my_pokemon or not opp_pokemon:
-            return action_utilities
+            return None
         
-        # Evaluate moves
-        for move in my_pokemon.moves.values():
-            if move.current_pp > 0:
-                utility = self.evaluate_move(move, battle, my_pokemon, opp_pokemon)
-                action_utilities.append({
-                    'action': move,
-                    'utility': utility,
-                    'type': 'move',
-                    'move_type': self.classify_move(move)
-                })
-        
-        # Evaluate switches
-        for switch in battle.available_switches:
-            utility = self.evaluate_switch(switch, battle, opp_pokemon)
-            action_utilities.append({
-                'action': switch,
-                'utility': utility,
-                'type': 'switch'
-            })
+        model, state, root_actions = self.build_battle_model(battle)
+        if not root_actions:
+            return None
+        
+        # The greedy scores order the root; leaves are scored on the simulated position
+        codes = {id(order): code for code, order in root_actions.items()}
+        priors = {codes[id(entry['action'])]: float(entry['utility']) for entry in self.evaluate_all_actions(battle) if id(entry['action']) in codes}
+        self.transposition_table.scope(battle.battle_tag, battle.turn)
+        search = ExpectiminimaxSearch(model, model.outlook, self.search_budget, self.search_depth, self.transposition_table)
+        best, value, depth = search.search(state, list(root_actions), priors)
+        if self.battle_logger:
+            self.battle_logger.debug(f"Search: depth {depth}, {search.nodes} nodes, value {value:.1f}, table {len(self.transposition_table)} entries")
+        if best is None or depth == 0:
+            return None
+        return self.create_order(root_actions[best])
+
+    async def choose_rollout_move(self, battle: AbstractBattle) -> Optional[Any]:
+        """Choose the action with the best mean rollout result, or None to fall back to greedy"""
+        my_pokemon, opp_pokemon = get_active_pokemon(battle)
+        if not my_pokemon or not opp_pokemon:
+            return None
         
-        return action_utilities
+        model, state, root_actions = self.build_battle_model(battle)
+        if not root_actions:
+            return None
+        
+        actions = list(root_actions)
+        chunks = max(1, min(self.rollout_pool.workers, self.rollout_count))
+        per_chunk = math.ceil(self.rollout_count / chunks)
+        futures = [
+            self.rollout_pool.submit(model, state, actions, per_chunk, ROLLOUT_HORIZON, ROLLOUT_EPSILON, seed)
+            for seed in np.random.SeedSequence().spawn(chunks)
+        ]
+        futures = [future for future in futures if future is not None]
+        if not futures:
+            if self.battle_logger:
+                self.battle_logger.debug("Rollouts: pool saturated, using greedy")
+            return None
+        
+        # Aggregate whatever finished inside the budget and drop the rest; waiting
+        # on the event loop leaves it free for other battles and keep-alives
+        futures = [asyncio.wrap_future(future) for future in futures]
+        done, not_done = await asyncio.wait(futures, timeout=self.rollout_budget)
+        for future in not_done:
+            future.cancel()
+        totals = {action: [0.0, 0] for action in actions}
+        for future in done:
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                self.rollout_pool.reset()
+                continue
+            except Exception as e:
+                self.main_logger.warning(f"Rollout worker failed: {e}")
+                continue
+            for action, (total, played) in result.items():
+                totals[action][0] += total
+                totals[action][1] += played
+        
+        means = {action: total / played for action, (total, played) in totals.items() if played}
+        if self.battle_logger:
+            self.battle_logger.debug(f"Rollouts: {sum(played for _, played in totals.values())} played, {len(done)}/{len(futures)} batches in time")
+        if not means:
+            return None
+        return self.create_order(root_actions[max(means, key=means.get)])
+
+    def build_battle_model(self, battle: AbstractBattle) -> Tuple[BattleModel, SimState, Dict[int, Any]]:
+        """Snapshot the battle into a BattleModel
+        
+        Returns the model, the root state and the legal root actions keyed by
+        their action code.
+        """
+        my_pokemon, opp_pokemon = get_active_pokemon(battle)
+        our_roster = [mon for mon in battle.team.values() if not mon.fainted or mon is my_pokemon]
+        opp_roster = [mon for mon in battle.opponent_team.values() if not mon.fainted or mon is opp_pokemon]
+        team_size = len(battle.team)
+        opp_hidden = max(0, team_size - len(battle.opponent_team))
+        model = BattleModel(len(our_roster), len(opp_roster), opp_hidden, team_size)
+        
+        our_moves = []
+        for mon in our_roster:
+            moves = battle.available_moves if mon is my_pokemon else [move for move in mon.moves.values() if move.current_pp > 0]
+            our_moves.append(list(moves)[:MOVE_SLOTS])
+        opp_moves = [self.expected_opponent_moves(mon) for mon in opp_roster]
+        
+        # Every damaging (attacker, move, defender) goes through the engine in one batch
+        rows, targets = [], []
+        for own, attackers, movesets, defenders in ((True, our_roster, our_moves, opp_roster), (False, opp_roster, opp_moves, our_roster)):
+            valid = model.our_valid if own else model.opp_valid
+            priority = model.our_priority if own else model.opp_priority
+            heal = model.our_heal if own else model.opp_heal
+            speed = model.our_speed if own else model.opp_speed
+            for i, (attacker, moves) in enumerate(zip(attackers, movesets)):
+                speed[i] = self.effective_speed(attacker, own, attacker is my_pokemon or attacker is opp_pokemon)
+                for slot, move in enumerate(moves):
+                    valid[i, slot] = True
+                    priority[i, slot] = move.priority
+                    heal[i, slot] = move.heal
+                    if not is_damaging(move):
+                        continue
+                    for j, defender in enumerate(defenders):
+                        rows.append(self.damage_engine.damage_row(move, attacker, defender, battle, own))
+                        accuracy = float(move.accuracy) if move.accuracy is not True else 1.0
+                        targets.append((own, i, slot, j, accuracy))
+        if rows:
+            normal, crit = DamageEngine.rolls(rows)
+            for (own, i, slot, j, accuracy), row, normal_row, crit_row in zip(targets, rows, normal, crit):
+                model.set_move(own, i, slot, j, normal_row, crit_row, row[4], accuracy, row[3])
+        
+        model.set_keys(
+            ZOBRIST,
+            [mon.species for mon in our_roster],
+            [mon.species for mon in opp_roster],
+            self.state_features(battle, our_roster, opp_roster, our_moves, opp_moves) + [('hidden', opp_hidden)]
+        )
+        
+        state = SimState(
+            next(i for i, mon in enumerate(our_roster) if mon is my_pokemon),
+            next(i for i, mon in enumerate(opp_roster) if mon is opp_pokemon),
+            tuple(0.0 if mon.fainted else mon.current_hp_fraction for mon in our_roster),
+            tuple(0.0 if mon.fainted else mon.current_hp_fraction for mon in opp_roster)
+        )
+        root_actions: Dict[int, Any] = {slot: move for slot, move in enumerate(our_moves[state.our_active])}
+        for switch in battle.available_switches:
+            index = next((i for i, mon in enumerate(our_roster) if mon is switch), None)
+            if index is not None:
+                root_actions[MOVE_SLOTS + index] = switch
+        return model, state, root_actions
+
+    def state_features(self, battle: AbstractBattle, our_roster: List[Pokemon], opp_roster: List[Pokemon], our_moves: List[List[Move]], opp_moves: List[List[Move]]) -> List[tuple]:
+        """Everything the model's tables depend on besides actives and HP, as Zobrist features"""
+        features = []
+        for side, roster, movesets in ((0, our_roster, our_moves), (1, opp_roster, opp_moves)):
+            for mon, moves in zip(roster, movesets):
+                features.extend(('boost', side, mon.species, stat, stage) for stat, stage in mon.boosts.items() if stage)
+                features.extend(('move', side, mon.species, move.id) for move in moves)
+                if mon.status is not None:
+                    features.append(('status', side, mon.species, mon.status.name))
+                if mon.is_terastallized:
+                    features.append(('tera', side, mon.species, mon.type_1.name))
+        for side, conditions in ((0, battle.side_conditions), (1, battle.opponent_side_conditions)):
+            features.extend(('side', side, condition.name, layers) for condition, layers in conditions.items())
+        features.extend(('weather', weather.name) for weather in battle.weather)
+        features.extend(('field', field.name) for field in battle.fields)
+        return features
+
+    def expected_opponent_moves(self, pokemon: Pokemon) -> List[Move]:
+        """Revealed moves, topped up with STAB attacks until the opponent has a damaging one"""
+        moves = list(pokemon.moves.values())[:MOVE_SLOTS]
+        if any(is_damaging(move) for move in moves):
+            return moves
+        base_stats = pokemon.base_stats
+        physical = base_stats.get('atk', 0) >= base_stats.get('spa', 0)
+        for pokemon_type in pokemon.types:
+            proxies = STAB_PROXY_MOVES.get(pokemon_type)
+            if proxies and len(moves) < MOVE_SLOTS:
+                moves.append(Move(proxies[0] if physical else proxies[1], gen=9))
+        return moves
+
+    def effective_speed(self, pokemon: Pokemon, own: bool, active: bool) -> float:
+        """Speed stat with the modifiers that decide turn order"""
+        speed = float(self.damage_engine.stats_for(pokemon, own)['spe'])
+        if active:
+            speed = float(boosted_stat(int(speed), pokemon.boosts['spe']))
+        if self.damage_engine.item_for(pokemon, own) == 'choicescarf':
+            speed *= 1.5
+        if pokemon.status is Status.PAR:
+            speed *= 0.5
+        return speed
 
     def evaluate_move(self, move: Move, battle: AbstractBattle, my_pokemon: Pokemon, opp_pokemon: Pokemon) -> float:
         """Simplified move evaluation"""
         utility = 0.0
-        move_type = self.classify_move(move)
+        info = move_info(move)
+        move_type = info.category
         
         # Basic damage calculation
-        if move.base_power > 0:
-            damage_info = self.calculate_damage(move, opp_pokemon, my_pokemon)
+        if is_damaging(move):
+            damage_info = self.calculate_damage(move, opp_pokemon, my_pokemon, battle)
             ko_prob = damage_info['ko_prob']
             mean_damage = damage_info['mean_damage']
             
@@ -332,7 +2418,7 @@ class CustomAgent(Player):
                 utility += 40.0
         
         # Apply move priority weights
-        utility *= PRIORITY_WEIGHTS.get(move_type, 1.0)
+        utility *= info.weight
         
         return utility
 
@@ -341,77 +2427,51 @@ class CustomAgent(Player):
         utility = 0.0
         
         if opp_pokemon and opp_pokemon.moves:
-            # Type advantage
-            for move in opp_pokemon.moves.values():
-                if move.base_power > 0:
-                    effectiveness = self.calculate_effectiveness(move, switch)
-                    if effectiveness < 1.0:  # Resistance
-                        utility += 20.0
-                    elif effectiveness > 1.0:  # Weakness
-                        utility -= 15.0
+            # Type advantage against every known damaging move in one lookup
+            move_types = np.array(
+                [type_index(move.type) for move in opp_pokemon.moves.values() if move.base_power > 0],
+                dtype=np.intp
+            )
+            if move_types.size:
+                defender_types = np.array([defender_type_indices(switch)], dtype=np.intp)
+                effectiveness = effectiveness_matrix(move_types, defender_types)[:, 0]
+                utility += 20.0 * np.count_nonzero(effectiveness < 1.0)  # Resistance
+                utility -= 15.0 * np.count_nonzero(effectiveness > 1.0)  # Weakness
         
         # Entry damage penalty
         entry_damage = self.calculate_entry_damage(switch, battle)
         utility -= entry_damage * 0.5
         
-        return utility
+        return float(utility)
 
-    def calculate_damage(self, move: Move, target: Pokemon, attacker: Pokemon) -> Dict:
-        """Simplified damage calculation"""
-        if move.base_power == 0:
-            return {'ko_prob': 0.0, 'mean_damage': 0.0}
-        
-        # Base power
-        base_power = move.base_power
-        
-        # Type effectiveness
-        try:
-            effectiveness = float(target.damage_multiplier(move))
-        except:
-            effectiveness = self.calculate_effectiveness(move, target)
-        
-        if effectiveness == 0:
-            return {'ko_prob': 0.0, 'mean_damage': 0.0}
-        
-        # STAB bonus
-        stab = 1.5 if move.type and attacker.types and any(move.type.name.upper() == t.name.upper() for t in attacker.types) else 1.0
-        
-        # Basic damage calculation
-        level_factor = 0.44
-        base_damage = base_power * level_factor * effectiveness * stab
-        
-        # Random factor
-        min_damage = base_damage * 0.85
-        max_damage = base_damage * 1.0
-        mean_damage = (min_damage + max_damage) / 2
-        
-        # KO probability
-        if mean_damage >= target.current_hp:
-            ko_prob = 0.95
-        elif max_damage >= target.current_hp:
-            ko_prob = 0.75
-        elif min_damage >= target.current_hp:
-            ko_prob = 0.25
-        else:
-            damage_ratio = mean_damage / target.current_hp if target.current_hp > 0 else 0
-            ko_prob = min(damage_ratio * 0.8, 0.9)
-        
-        return {
-            'ko_prob': min(ko_prob, 1.0),
-            'mean_damage': max(mean_damage, 0.0)
-        }
+    def calculate_damage(self, move: Move, target: Pokemon, attacker: Pokemon, battle: Optional[AbstractBattle] = None) -> Dict:
+        """Damage calculation, memoized for the current turn when the battle is known"""
+        if battle is None:
+            return self._calculate_damage(move, target, attacker)
+        
+        key = DamageCache.make_key(move, attacker, target)
+        damage_info = self.damage_cache.get(battle, key)
+        if damage_info is None:
+            damage_info = self._calculate_damage(move, target, attacker, battle)
+            self.damage_cache.put(battle, key, damage_info)
+        return damage_info
+
+    def _calculate_damage(self, move: Move, target: Pokemon, attacker: Pokemon, battle: Optional[AbstractBattle] = None) -> Dict:
+        """Stat-based damage calculation through the damage engine"""
+        if not is_damaging(move):
+            return {'ko_prob': 0.0, 'mean_damage': 0.0, 'min_damage': 0.0, 'max_damage': 0.0}
+        
+        # Without a battle we can only be scoring our own moves
+        attacker_own = battle is None or any(attacker is mon for mon in battle.team.values())
+        return self.damage_engine.analyze(move, attacker, target, battle, attacker_own)
 
     def calculate_effectiveness(self, move: Move, target: Pokemon) -> float:
         """Calculate type effectiveness"""
         if not move.type or not target.types:
             return 1.0
         
-        try:
-            effectiveness = float(target.damage_multiplier(move))
-            return max(0.0, min(effectiveness, 4.0))
-        except:
-            # Simplified calculation
-            return 1.0
+        effectiveness = type_effectiveness(move.type, target)
+        return max(0.0, min(effectiveness, 4.0))
 
     def calculate_entry_damage(self, pokemon: Pokemon, battle: AbstractBattle) -> float:
         """Calculate entry damage"""
@@ -429,28 +2489,12 @@ class CustomAgent(Player):
 
     def classify_move(self, move: Move) -> str:
         """Move classification"""
-        move_name = move.id.lower()
-        
-        # Attack moves
-        if move.base_power > 0:
-            if move.category == 'Physical':
-                return 'physical_attack'
-            elif move.category == 'Special':
-                return 'special_attack'
-            else:
-                return 'attack'
-        
-        # Other move types
-        for move_type, moves in MOVE_TYPES.items():
-            if move_name in moves:
-                return move_type
-        
-        return 'other'
+        return move_info(move).category
 
     def is_risky_move(self, move: Move, my_pokemon: Pokemon, opp_pokemon: Pokemon) -> bool:
         """Determine if move is risky"""
         # Attack moves are more dangerous at low HP
-        if move.base_power > 0 and my_pokemon.current_hp / my_pokemon.max_hp < 0.3:
+        if is_damaging(move) and my_pokemon.current_hp / my_pokemon.max_hp < 0.3:
             return True
         
         # More dangerous when severely resisted
@@ -480,8 +2524,8 @@ class CustomAgent(Player):
         best_damage = 0
         
         for move in battle.available_moves:
-            if move.base_power > 0:
-                damage_info = self.calculate_damage(move, opp_pokemon, my_pokemon)
+            if is_damaging(move):
+                damage_info = self.calculate_damage(move, opp_pokemon, my_pokemon, battle)
                 if damage_info['mean_damage'] > best_damage:
                     best_damage = damage_info['mean_damage']
                     best_move = move
@@ -535,36 +2579,103 @@ class CustomAgent(Player):
             return
         
         for move in my_pokemon.moves.values():
-            if move.current_pp > 0 and move.base_power > 0:
-                damage_info = self.calculate_damage(move, opp_pokemon, my_pokemon)
+            if move.current_pp > 0 and is_damaging(move):
+                damage_info = self.calculate_damage(move, opp_pokemon, my_pokemon, battle)
                 self.battle_logger.debug(f"Damage calculation: {move.id} (Move object) -> {opp_pokemon.species}")
                 self.battle_logger.debug(f"  Base power: {move.base_power}")
                 self.battle_logger.debug(f"  Expected damage: {damage_info['mean_damage']:.1f}")
                 self.battle_logger.debug(f"  KO probability: {damage_info['ko_prob']:.2f}")
 
-    def log_decision(self, battle: AbstractBattle, action, decision_time: float):
+    def log_decision(self, battle: AbstractBattle, action, decision_time: float, candidates: Optional[np.ndarray] = None):
         """Log decision"""
+        timer = self.decision_timer
+        if timer:
+            timer.mark('evaluation')
         self.performance_stats['total_decision_time'] += decision_time
         self.performance_stats['total_turns'] += 1
+        self.battle_decision_times.setdefault(battle.battle_tag, []).append(decision_time)
+        description = describe_action(action)
         
         if self.battle_logger:
             self.battle_logger.info(f"Decision time: {decision_time:.3f}s")
             
-            # Parse action type
-            action_str = str(action)
-            if "move" in action_str:
-                move_name = action_str.split("move ")[-1] if "move " in action_str else "unknown"
-                self.battle_logger.info(f"Selected action: /choose move {move_name}")
-            elif "switch" in action_str:
-                pokemon_name = action_str.split("switch ")[-1] if "switch " in action_str else "unknown"
-                self.battle_logger.info(f"Selected action: /choose switch {pokemon_name}")
+            # Action type
+            if description['kind'] in ('move', 'switch'):
+                self.battle_logger.info(f"Selected action: /choose {description['kind']} {description['id']}")
             else:
-                self.battle_logger.info(f"Selected action: {action_str}")
+                self.battle_logger.info(f"Selected action: {description['id']}")
             
             self.battle_logger.info(f"Strategy info: {{'reason': 'strategy_pipeline'}}")
         
         if battle.turn % 10 == 0:  # Log every 10 turns
             self.main_logger.info(f"Turn {battle.turn}: {action} (Decision time: {decision_time:.3f}s)")
+        
+        if self.trace_logger:
+            self.trace_decision(battle, description, decision_time, candidates)
+        
+        if timer:
+            timer.mark('logging')
+            self.record_latency(battle, timer.finish())
+            self.decision_timer = None
+
+    def create_order(self, order, *args, **kwargs):
+        """Player.create_order, timed as the 'order' phase of the current decision"""
+        start = time.perf_counter()
+        result = super().create_order(order, *args, **kwargs)
+        if self.decision_timer:
+            self.decision_timer.add('order', time.perf_counter() - start)
+        return result
+
+    def record_latency(self, battle: AbstractBattle, phases: Dict[str, float]):
+        stats = self.battle_latency.get(battle.battle_tag)
+        if stats is None:
+            stats = self.battle_latency[battle.battle_tag] = LatencyStats()
+        stats.record(phases)
+        PROCESS_LATENCY.record(phases)
+
+    def latency_summary(self, battle_tag: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """Per-phase latency for one battle, or for all of this agent's unfinished battles"""
+        if battle_tag is not None:
+            stats = self.battle_latency.get(battle_tag)
+            return stats.summary() if stats else {}
+        combined = LatencyStats()
+        for stats in self.battle_latency.values():
+            combined.merge(stats)
+        return combined.summary()
+
+    def trace_decision(self, battle: AbstractBattle, description: Dict[str, Any], decision_time: float, candidates: Optional[np.ndarray] = None):
+        """Append one structured record for this decision to the trace file
+        
+        candidates are the ranked actions the decision was made from; paths that
+        did not rank actions (forced switches, high damage, search, rollouts)
+        record None rather than paying for a second evaluation.
+        """
+        my_pokemon, opp_pokemon = get_active_pokemon(battle)
+        
+        def active_state(pokemon: Optional[Pokemon]) -> Optional[Dict[str, Any]]:
+            if not pokemon:
+                return None
+            return {
+                'species': pokemon.species,
+                'hp': round(pokemon.current_hp_fraction, 4),
+                'status': pokemon.status.name.lower() if pokemon.status else None
+            }
+        
+        self.trace_logger.info({
+            'battle': battle.battle_tag,
+            'agent': self.username,
+            'turn': battle.turn,
+            'mode': self.decision_mode,
+            'time': round(decision_time, 6),
+            'timestamp': round(time.time(), 3),
+            'our': active_state(my_pokemon),
+            'opp': active_state(opp_pokemon),
+            'action': description,
+            'candidates': [
+                dict(describe_action(entry['action']), utility=round(float(entry['utility']), 3))
+                for entry in candidates
+            ] if candidates is not None else None
+        })
 
     def _battle_finished_callback(self, battle: AbstractBattle):
         """Battle finished callback"""
@@ -583,6 +2694,14 @@ class CustomAgent(Player):
             self.battle_logger.info(f"Battle duration: {time.time() - getattr(self, 'battle_start_time', time.time()):.2f}s")
             self.battle_logger.info(f"Total turns: {battle.turn}")
         
+        # Tail latency is what costs timer losses; the mean hides it
+        latency = self.battle_latency.pop(battle.battle_tag, None)
+        if latency:
+            total = latency.histograms['total'].summary()
+            self.main_logger.info(f"Decision latency: p50 {total['p50']:.4f}s, p95 {total['p95']:.4f}s, p99 {total['p99']:.4f}s, max {total['max']:.4f}s")
+            if self.battle_logger:
+                self.battle_logger.info(f"Decision latency by phase: {latency.summary()}")
+        
         # Rename log file based on result
         self.rename_battle_log_file(battle)
         
@@ -592,8 +2711,18 @@ class CustomAgent(Player):
         
         self.main_logger.info(f"Battle ended: {'Victory' if won else 'Defeat'} (Win rate: {win_rate:.2f}, Avg decision time: {avg_decision_time:.3f}s)")
         
+        # Release this battle's damage cache entries
+        self.damage_cache.invalidate(battle.battle_tag)
+        self.main_logger.info(f"Damage cache: {self.damage_cache.stats()}")
+        if self.decision_mode == 'search':
+            self.main_logger.info(f"Transposition table: {self.transposition_table.stats()}")
+        
         # Save performance stats
-        self.save_performance_stats()
+        self.save_performance_stats(battle)
+        if self.profiler is not None:
+            profile_path = self.profiler.export()
+            if profile_path:
+                self.main_logger.info(f"Profile updated: {os.path.basename(profile_path)} ({self.profiler.decisions} decisions)")
         
         super()._battle_finished_callback(battle)
 
@@ -604,9 +2733,6 @@ class CustomAgent(Player):
         
         old_file_path = os.path.join(self.results_dir, f'{self.battle_id}.log')
         
-        if not os.path.exists(old_file_path):
-            return
-        
         # Determine result prefix
         if battle.won is True:
             result_prefix = "battle_win"
@@ -625,29 +2751,26 @@ class CustomAgent(Player):
         new_filename = f"{result_prefix}_{suffix}.log"
         new_file_path = os.path.join(self.results_dir, new_filename)
         
-        try:
-            # Rename file
-            os.rename(old_file_path, new_file_path)
-            self.main_logger.info(f"Log file renamed: {os.path.basename(old_file_path)} -> {os.path.basename(new_file_path)}")
-        except OSError as e:
-            self.main_logger.error(f"Failed to rename log file: {e}")
+        # The writer thread flushes pending lines, renames the file and closes it
+        LOG_PIPELINE.rename(old_file_path, new_file_path)
+        self.main_logger.info(f"Log file renamed: {os.path.basename(old_file_path)} -> {os.path.basename(new_file_path)}")
+        self.battle_logger = None
+        self.current_battle_id = None
 
-    def save_performance_stats(self):
-        """Save performance statistics"""
-        stats_file = os.path.join(self.results_dir, 'simplified_performance.json')
-        
-        win_rate = self.performance_stats['wins'] / self.performance_stats['total_battles'] if self.performance_stats['total_battles'] > 0 else 0
-        avg_decision_time = self.performance_stats['total_decision_time'] / self.performance_stats['total_turns'] if self.performance_stats['total_turns'] > 0 else 0
-        
-        stats = {
-            'total_battles': self.performance_stats['total_battles'],
-            'wins': self.performance_stats['wins'],
-            'losses': self.performance_stats['losses'],
-            'win_rate': win_rate,
-            'total_turns': self.performance_stats['total_turns'],
-            'avg_decision_time': avg_decision_time,
-            'last_updated': datetime.now().isoformat()
-        }
-        
-        with open(stats_file, 'w', encoding='utf-8') as f:
-            json.dump(stats, f, indent=2, ensure_ascii=False)
+    def save_performance_stats(self, battle: AbstractBattle):
+        """Append this battle's row to the performance store"""
+        decision_times = self.battle_decision_times.pop(battle.battle_tag, [])
+        if self.performance_store is None:
+            return
+        self.performance_store.record({
+            'agent': self.username,
+            'battle_tag': battle.battle_tag,
+            'opponent': battle.opponent_username,
+            'won': None if battle.won is None else int(battle.won),
+            'turns': battle.turn,
+            'decisions': len(decision_times),
+            'total_decision_time': sum(decision_times),
+            'max_decision_time': max(decision_times, default=0.0),
+            'pid': os.getpid(),
+            'finished_at': datetime.now().isoformat()
+        })
@@ -16,70 +16,55 @@ sys.path.append(str(Path(__file__).parent))
 
 from comprehensive_evaluation import ExperimentRunner, ExperimentConfig
 from experiment_config import CONFIG_MANAGER, QUICK_CONFIG, DEFAULT_CONFIG, COMPREHENSIVE_CONFIG, STABILITY_CONFIG
+from offline_simulator import BACKENDS, DEFAULT_BACKEND
 
-def run_quick_evaluation():
+def run_quick_evaluation(backend: str = DEFAULT_BACKEND, resume: bool = False):
     """运行快速评测（用于测试）"""
     print("🚀 启动快速评测...")
     print(f"配置: {QUICK_CONFIG.matches_per_pair} 局/配对, {len(QUICK_CONFIG.enabled_tiers)} 个tier")
     
     # 创建自定义配置
-    config = ExperimentConfig()
-    config.matches_per_pair = QUICK_CONFIG.matches_per_pair
-    config.tiers = QUICK_CONFIG.enabled_tiers
-    config.seeds = list(range(1000, 1000 + QUICK_CONFIG.seeds_count))
-    config.max_turns = QUICK_CONFIG.max_turns
-    config.results_dir = Path(QUICK_CONFIG.results_dir)
+    config = ExperimentConfig.from_settings(QUICK_CONFIG, backend)
+    config.resume = resume
     
     runner = ExperimentRunner(config)
     asyncio.run(runner.run_evaluation())
 
-def run_default_evaluation():
+def run_default_evaluation(backend: str = DEFAULT_BACKEND, resume: bool = False):
     """运行默认评测"""
     print("🚀 启动默认评测...")
     print(f"配置: {DEFAULT_CONFIG.matches_per_pair} 局/配对, {len(DEFAULT_CONFIG.enabled_tiers)} 个tier")
     
-    config = ExperimentConfig()
-    config.matches_per_pair = DEFAULT_CONFIG.matches_per_pair
-    config.tiers = DEFAULT_CONFIG.enabled_tiers
-    config.seeds = list(range(1000, 1000 + DEFAULT_CONFIG.seeds_count))
-    config.max_turns = DEFAULT_CONFIG.max_turns
-    config.results_dir = Path(DEFAULT_CONFIG.results_dir)
+    config = ExperimentConfig.from_settings(DEFAULT_CONFIG, backend)
+    config.resume = resume
     
     runner = ExperimentRunner(config)
     asyncio.run(runner.run_evaluation())
 
-def run_comprehensive_evaluation():
+def run_comprehensive_evaluation(backend: str = DEFAULT_BACKEND, resume: bool = False):
     """运行全面评测"""
     print("🚀 启动全面评测...")
     print(f"配置: {COMPREHENSIVE_CONFIG.matches_per_pair} 局/配对, {len(COMPREHENSIVE_CONFIG.enabled_tiers)} 个tier")
     print("⚠️  注意：全面评测可能需要较长时间")
     
-    config = ExperimentConfig()
-    config.matches_per_pair = COMPREHENSIVE_CONFIG.matches_per_pair
-    config.tiers = COMPREHENSIVE_CONFIG.enabled_tiers
-    config.seeds = list(range(1000, 1000 + COMPREHENSIVE_CONFIG.seeds_count))
-    config.max_turns = COMPREHENSIVE_CONFIG.max_turns
-    config.results_dir = Path(COMPREHENSIVE_CONFIG.results_dir)
+    config = ExperimentConfig.from_settings(COMPREHENSIVE_CONFIG, backend)
+    config.resume = resume
     
     runner = ExperimentRunner(config)
     asyncio.run(runner.run_evaluation())
 
-def run_stability_test():
+def run_stability_test(backend: str = DEFAULT_BACKEND, resume: bool = False):
     """运行稳定性测试"""
     print("🚀 启动稳定性测试...")
     print(f"配置: {STABILITY_CONFIG.matches_per_pair} 局/配对, 专注于稳定性指标")
     
-    config = ExperimentConfig()
-    config.matches_per_pair = STABILITY_CONFIG.matches_per_pair
-    config.tiers = STABILITY_CONFIG.enabled_tiers
-    config.seeds = list(range(1000, 1000 + STABILITY_CONFIG.seeds_count))
-    config.max_turns = STABILITY_CONFIG.max_turns
-    config.results_dir = Path(STABILITY_CONFIG.results_dir)
+    config = ExperimentConfig.from_settings(STABILITY_CONFIG, backend)
+    config.resume = resume
     
     runner = ExperimentRunner(config)
     asyncio.run(runner.run_evaluation())
 
-def run_custom_evaluation(config_file: str):
+def run_custom_evaluation(config_file: str, backend: str = DEFAULT_BACKEND, resume: bool = False):
     """运行自定义配置评测"""
     print(f"🚀 启动自定义评测: {config_file}")
     
@@ -95,12 +80,8 @@ def run_custom_evaluation(config_file: str):
                 print(f"  - {error}")
             return
         
-        config = ExperimentConfig()
-        config.matches_per_pair = custom_config.matches_per_pair
-        config.tiers = custom_config.enabled_tiers
-        config.seeds = list(range(1000, 1000 + custom_config.seeds_count))
-        config.max_turns = custom_config.max_turns
-        config.results_dir = Path(custom_config.results_dir)
+        config = ExperimentConfig.from_settings(custom_config, backend)
+        config.resume = resume
         
         runner = ExperimentRunner(config)
         asyncio.run(runner.run_evaluation())
@@ -169,6 +150,8 @@ def show_help():
   --stability          稳定性测试 (100局/配对, 专注稳定性)
   --custom <文件>      自定义配置评测
   --create-config      交互式创建自定义配置
+  --backend <后端>     对战后端: showdown (本地服务器, 默认) 或 offline (进程内模拟)
+  --resume             从任务账本恢复中断的评测，跳过已完成的对战
   --help               显示此帮助信息
 
 示例:
@@ -176,6 +159,8 @@ def show_help():
   python run_evaluation.py --default                  # 标准评测
   python run_evaluation.py --create-config            # 创建自定义配置
   python run_evaluation.py --custom my_config.json    # 使用自定义配置
+  python run_evaluation.py --quick --backend offline  # 无需服务器的离线评测
+  python run_evaluation.py --stability --resume       # 继续中断的稳定性测试
 
 评测指标:
   1. 胜率 (Win Rate) - 直接对战效果
@@ -199,6 +184,10 @@ def main():
     parser.add_argument("--custom", type=str, help="自定义配置文件")
     parser.add_argument("--create-config", action="store_true", help="创建自定义配置")
     parser.add_argument("--help-detailed", action="store_true", help="显示详细帮助")
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help="对战后端: showdown (本地服务器) 或 offline (进程内模拟)")
+    parser.add_argument("--resume", action="store_true",
+                        help="从结果目录中的任务账本恢复，跳过已完成的对战")
     
     args = parser.parse_args()
     
@@ -211,15 +200,15 @@ def main():
         return
     
     if args.quick:
-        run_quick_evaluation()
+        run_quick_evaluation(args.backend, args.resume)
     elif args.default:
-        run_default_evaluation()
+        run_default_evaluation(args.backend, args.resume)
     elif args.comprehensive:
-        run_comprehensive_evaluation()
+        run_comprehensive_evaluation(args.backend, args.resume)
     elif args.stability:
-        run_stability_test()
+        run_stability_test(args.backend, args.resume)
     elif args.custom:
-        run_custom_evaluation(args.custom)
+        run_custom_evaluation(args.custom, args.backend, args.resume)
     else:
         print("请选择评测类型，使用 --help 查看选项")
         print("推荐使用: python run_evaluation.py --default")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+多进程分片循环对战
+
+poke_env.cross_evaluate 在单个进程、单个事件循环里跑完所有对局，所有玩家的决策逻辑
+共用一个 CPU 核。这里把 (玩家, 对手, 第几局) 矩阵按局拆成 N 份，交给 N 个工作进程；
+每个进程用 roster_factory 重新构造自己的玩家并在自己的事件循环中对战，最后把胜负
+计数合并成与 cross_evaluate 相同结构的结果字典，可直接交给 rank_players_by_victories。
+
+roster_factory(backend, name_suffix) 必须是可 pickle 的模块级函数（或其 functools.partial），
+返回的玩家用户名为原用户名加 name_suffix。showdown 后端下每个分片使用不同后缀登录，
+避免同名账号互相顶替；合并时按分片记录的映射还原为原用户名。
+
+用法:
+    from functools import partial
+    from sharded_evaluation import sharded_cross_evaluate
+
+    results = sharded_cross_evaluate(
+        partial(build_roster, "ajhz632"), ["ajhz632", "simple-uber", ...],
+        n_challenges=3, workers=8, backend="offline",
+    )
+"""
+
+import asyncio
+import multiprocessing
+import os
+import random
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from poke_env.player.player import Player
+
+import offline_simulator
+
+# 工作进程构造玩家的工厂: (backend, name_suffix) -> 玩家列表
+RosterFactory = Callable[[str, str], List[Player]]
+
+# 每个分片的离线 battle_tag 编号区间大小
+SHARD_BATTLE_ID_SPAN = 1_000_000
+
+Pair = Tuple[str, str]
+
+
+def shard_suffix(shard: int, backend: str) -> str:
+    """分片玩家的用户名后缀；离线后端不登录服务器，保留原用户名"""
+    return "" if backend == "offline" else f"{shard}"
+
+
+def plan_shards(usernames: Sequence[str], n_challenges: int, workers: int) -> List[Dict[Pair, int]]:
+    """把每一局对战轮流分配给各分片，返回每个分片 (挑战方, 应战方) -> 局数"""
+    units = [
+        (p1, p2)
+        for i, p1 in enumerate(usernames)
+        for j, p2 in enumerate(usernames)
+        if j > i
+        for _ in range(n_challenges)
+    ]
+    shards = [Counter() for _ in range(max(1, min(workers, len(units))))]
+    for index, pair in enumerate(units):
+        shards[index % len(shards)][pair] += 1
+    return [dict(shard) for shard in shards if shard]
+
+
+async def _play_shard(players: Dict[str, Player], assignment: Dict[Pair, int], backend: str,
+                      seed: Optional[int]) -> Dict[Pair, Tuple[int, int, int]]:
+    rng = random.Random(seed) if seed is not None else None
+    tallies = {}
+    for (name_1, name_2), n_battles in assignment.items():
+        p1, p2 = players[name_1], players[name_2]
+        if backend == "offline":
+            await offline_simulator.battle_against(p1, p2, n_battles=n_battles, rng=rng)
+        else:
+            await p1.battle_against(p2, n_battles=n_battles)
+        tallies[(name_1, name_2)] = (p1.n_won_battles, p2.n_won_battles, p1.n_finished_battles)
+        p1.reset_battles()
+        p2.reset_battles()
+    return tallies
+
+
+def _run_shard(roster_factory: RosterFactory, assignment: Dict[Pair, int], shard: int, backend: str,
+               seed: Optional[int]) -> Dict[Pair, Tuple[int, int, int]]:
+    """工作进程入口：构造本分片的玩家并跑完分配到的对局"""
+    suffix = shard_suffix(shard, backend)
+    offline_simulator.set_battle_id_base(shard * SHARD_BATTLE_ID_SPAN)
+
+    players = {}
+    for player in roster_factory(backend, suffix):
+        name = player.username
+        players[name[: len(name) - len(suffix)] if suffix else name] = player
+
+    shard_seed = seed + shard if seed is not None else None
+    return asyncio.run(_play_shard(players, assignment, backend, shard_seed))
+
+
+def merge_tallies(usernames: Sequence[str],
+                  tallies: Sequence[Dict[Pair, Tuple[int, int, int]]]) -> Dict[str, Dict[str, Optional[float]]]:
+    """合并各分片的胜负计数，结构与 poke_env.cross_evaluate 相同"""
+    totals: Dict[Pair, List[int]] = {}
+    for shard_tallies in tallies:
+        for pair, counts in shard_tallies.items():
+            total = totals.setdefault(pair, [0, 0, 0])
+            for k, value in enumerate(counts):
+                total[k] += value
+
+    results: Dict[str, Dict[str, Optional[float]]] = {
+        p1: {p2: None for p2 in usernames} for p1 in usernames
+    }
+    for (p1, p2), (won_1, won_2, finished) in totals.items():
+        if finished:
+            results[p1][p2] = won_1 / finished
+            results[p2][p1] = won_2 / finished
+    return results
+
+
+def sharded_cross_evaluate(roster_factory: RosterFactory, usernames: Sequence[str], n_challenges: int,
+                           workers: Optional[int] = None,
+                           backend: str = offline_simulator.DEFAULT_BACKEND,
+                           seed: Optional[int] = None) -> Dict[str, Dict[str, Optional[float]]]:
+    """在多个进程中完成循环对战；workers 默认为 CPU 核数"""
+    if backend not in offline_simulator.BACKENDS:
+        raise ValueError(f"未知的对战后端: {backend}，可选: {', '.join(offline_simulator.BACKENDS)}")
+    shards = plan_shards(usernames, n_challenges, workers or os.cpu_count() or 1)
+
+    # poke_env 在后台线程运行自己的事件循环，fork 出的子进程会继承其锁状态，因此用 spawn
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=context) as executor:
+        futures = [
+            executor.submit(_run_shard, roster_factory, assignment, shard, backend, seed)
+            for shard, assignment in enumerate(shards, 1)
+        ]
+        tallies = [future.result() for future in futures]
+
+    return merge_tallies(usernames, tallies)